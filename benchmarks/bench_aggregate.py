@@ -0,0 +1,46 @@
+"""
+Compare counting a batch by governorate, birth year bucket and gender with
+np.bincount over the engine's columns against counting its per-ID results, and
+the size of the aggregate response against the batch response.
+
+    python -m benchmarks.bench_aggregate [count]
+"""
+import sys
+from collections import Counter
+
+import orjson
+
+from benchmarks.utils import best_of, sample_ids, setup_django
+
+
+def run(count: int = 1000) -> dict:
+    setup_django()
+    from national_ids.services import aggregate_national_ids, extract_national_ids
+
+    ids = sample_ids(count)
+
+    def per_result():
+        governorates, years, genders = Counter(), Counter(), Counter()
+        for result in extract_national_ids(ids):
+            if result['valid']:
+                governorates[result['data']['governorate']] += 1
+                years[result['data']['date_of_birth'].year // 10 * 10] += 1
+                genders[result['data']['gender']] += 1
+        return governorates, years, genders
+
+    return {
+        'count': count,
+        'per_result_seconds': best_of(per_result),
+        'bincount_seconds': best_of(lambda: aggregate_national_ids(ids)),
+        'batch_bytes': len(orjson.dumps({'results': extract_national_ids(ids)})),
+        'aggregate_bytes': len(orjson.dumps(aggregate_national_ids(ids))),
+    }
+
+
+if __name__ == '__main__':
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    print(f"{result['count']} IDs")
+    print(f"count per-ID results: {result['per_result_seconds'] * 1e3:.2f} ms")
+    print(f"bincount aggregation: {result['bincount_seconds'] * 1e3:.2f} ms")
+    print(f"batch response:       {result['batch_bytes']:,} bytes")
+    print(f"aggregate response:   {result['aggregate_bytes']:,} bytes")
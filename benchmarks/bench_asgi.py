@@ -0,0 +1,214 @@
+"""
+Send concurrent extract requests through Django's WSGI handler with the sync view
+(one thread per in-flight request, as a threaded WSGI server would), through the
+ASGI handler with the same sync view, and through the ASGI handler with the async
+view, and compare p50/p99 latency and requests per second. Runs in-process, without
+a server, against a throwaway test database.
+
+    python -m benchmarks.bench_asgi [requests] [concurrency]
+"""
+import asyncio
+import importlib
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import setup_django
+
+PATH = '/api/v1/national-ids/egyptian-id/extract/'
+BODY = json.dumps({'national_id': '29001010123456'}).encode()
+
+
+def _use_async_views(enabled: bool) -> None:
+    from django.conf import settings
+    from django.urls import clear_url_caches
+    import core.urls
+    import national_ids.urls
+
+    settings.NATIONAL_ID_ASYNC_VIEWS = enabled
+    importlib.reload(national_ids.urls)
+    importlib.reload(core.urls)
+    clear_url_caches()
+
+
+def _summary(latencies, elapsed: float, errors: int) -> dict:
+    latencies = sorted(latencies)
+    return {
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_seconds': statistics.median(latencies),
+        'p99_seconds': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        'errors': errors,
+    }
+
+
+def run_wsgi(plain_key: str, requests: int, concurrency: int) -> dict:
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+
+    def call(_):
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': PATH,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(BODY)),
+            'HTTP_X_API_KEY': plain_key,
+            'wsgi.input': io.BytesIO(BODY),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+        }
+        statuses = []
+        start = time.perf_counter()
+        body = handler(environ, lambda status, headers: statuses.append(status))
+        b''.join(body)
+        body.close()
+        return time.perf_counter() - start, statuses[0].startswith('200')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - start
+    return _summary([latency for latency, _ in results], elapsed, sum(1 for _, ok in results if not ok))
+
+
+def run_asgi(plain_key: str, requests: int, concurrency: int) -> dict:
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': PATH,
+        'raw_path': PATH.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', b'testserver'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(BODY)).encode()),
+            (b'x-api-key', plain_key.encode()),
+        ],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+
+    async def call():
+        sent_body = False
+        statuses = []
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {'type': 'http.request', 'body': BODY, 'more_body': False}
+            # The client stays connected, Django stops listening once the response is sent
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        start = time.perf_counter()
+        await handler(dict(scope), receive, send)
+        return time.perf_counter() - start, statuses[0] == 200
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited():
+            async with semaphore:
+                return await call()
+
+        return await asyncio.gather(*(limited() for _ in range(requests)))
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    return _summary([latency for latency, _ in results], elapsed, sum(1 for _, ok in results if not ok))
+
+
+# Each request writes a usage row and the user's balance, and the limit lives in the cache
+DATABASE_PER_REQUEST = {
+    'API_USAGE_LOGGING': {'SINK': 'sync'},
+    'TOKEN_LEASING': {'ENABLED': False},
+    'RATE_LIMITING': {'BACKEND': 'cache'},
+}
+# Usage is queued, tokens come from a worker lease and the limit is in memory, so a
+# warm request does no blocking I/O at all
+IN_MEMORY = {
+    'API_USAGE_LOGGING': {'SINK': 'buffered'},
+    'TOKEN_LEASING': {'ENABLED': True},
+    'RATE_LIMITING': {'BACKEND': 'local'},
+}
+
+
+def run(requests: int = 2000, concurrency: int = 32) -> dict:
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+    from users.leasing import get_lease_pool
+    from users.usage import get_usage_sink
+    from core.utils.custom_throttles import EgyptianIDThrottle
+    from users.models import APIKey, User
+
+    setup_test_environment()
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    # Measure the throttle's cost without ever refusing a request
+    EgyptianIDThrottle.rate = '100000000/hour'
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(
+            email='bench@example.com', first_name='Bench', last_name='User', tokens_balance=10 ** 9
+        )
+        _, plain_key = APIKey.create_key(user, 'Bench Key')
+        connection.close()
+
+        results = {}
+        for config_name, config in (('database per request', DATABASE_PER_REQUEST), ('in memory', IN_MEMORY)):
+            config = {name: {**getattr(settings, name), **overrides} for name, overrides in config.items()}
+            with override_settings(**config):
+                for name, async_views, runner in (
+                    ('WSGI, sync view', False, run_wsgi),
+                    ('ASGI, sync view', False, run_asgi),
+                    ('ASGI, async view', True, run_asgi),
+                ):
+                    _use_async_views(async_views)
+                    runner(plain_key, min(requests, 100), concurrency)
+                    results[(config_name, name)] = runner(plain_key, requests, concurrency)
+                get_usage_sink().close()
+                get_lease_pool().release_all()
+        _use_async_views(False)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {'requests': requests, 'concurrency': concurrency, 'results': results}
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    result = run(*args)
+    print(f"{result['requests']} extract requests, {result['concurrency']} in flight")
+    print(f"{'configuration':>20}  {'path':>18}  {'req/s':>8}  {'p50':>9}  {'p99':>9}  {'errors':>6}")
+    for (config_name, name), stats in result['results'].items():
+        print(
+            f"{config_name:>20}  {name:>18}  {stats['requests_per_second']:>8.0f}"
+            f"  {stats['p50_seconds'] * 1e3:>6.2f} ms  {stats['p99_seconds'] * 1e3:>6.2f} ms  {stats['errors']:>6}"
+        )
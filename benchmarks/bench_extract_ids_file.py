@@ -0,0 +1,55 @@
+"""
+Throughput of `manage.py extract_ids_file` by number of worker processes and
+output format, over a generated file of IDs with the usual share of invalid ones.
+
+    python -m benchmarks.bench_extract_ids_file [ids] [max workers]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from io import StringIO
+
+from benchmarks.utils import sample_ids, setup_django
+
+
+def run(count: int = 2_000_000, max_workers: int = None) -> dict:
+    setup_django()
+    from django.core.management import call_command
+
+    max_workers = max_workers or os.cpu_count() or 1
+    worker_counts = sorted({1, *(2 ** power for power in range(1, 8) if 2 ** power <= max_workers), max_workers})
+    directory = tempfile.mkdtemp()
+    input_path = os.path.join(directory, 'ids.txt')
+    with open(input_path, 'w') as input_file:
+        # Repeating a sample keeps generation quick, every row is still extracted
+        block = '\n'.join(sample_ids(100_000)) + '\n'
+        for _ in range(max(count // 100_000, 1)):
+            input_file.write(block)
+    rows = max(count // 100_000, 1) * 100_000
+
+    results = {}
+    for output_format in ('csv', 'ndjson', 'npz'):
+        for workers in worker_counts:
+            output = os.path.join(directory, f'out.{output_format}')
+            start = time.perf_counter()
+            call_command('extract_ids_file', input_path, output, workers=workers, stdout=StringIO())
+            results[(output_format, workers)] = time.perf_counter() - start
+            os.unlink(output)
+    shutil.rmtree(directory)
+    return {'rows': rows, 'cpus': os.cpu_count(), 'results': results}
+
+
+if __name__ == '__main__':
+    result = run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else None,
+    )
+    print(f"{result['rows']} IDs, {result['cpus']} CPUs")
+    for (output_format, workers), seconds in result['results'].items():
+        single = result['results'][(output_format, 1)]
+        print(
+            f"{output_format:>6}  {workers:>3} workers  {seconds:>7.2f} s  "
+            f"{result['rows'] / seconds:>10,.0f} IDs/s  {single / seconds:>5.2f}x"
+        )
@@ -0,0 +1,81 @@
+"""
+Compare the fused single-pass parser with the previous two-phase path, where the
+serializer validated the ID with separate int() slices and the extractor parsed it again.
+
+    python -m benchmarks.bench_fused_parser [count]
+"""
+import sys
+from datetime import date
+
+from benchmarks.utils import best_of, sample_ids, setup_django
+
+GOVERNORATE_CODES = None
+
+
+def two_phase(id_value):
+    """Reference copy of the validation + extraction done before the fused parser."""
+    if not id_value.isdigit():
+        return None
+    century = int(id_value[0])
+    if century not in [2, 3]:
+        return None
+    if (1900 if century == 2 else 2000) + int(id_value[1:3]) > date.today().year:
+        return None
+    if int(id_value[3:5]) not in range(1, 13):
+        return None
+    if int(id_value[5:7]) not in range(1, 32):
+        return None
+    try:
+        year = (1900 if int(id_value[0]) == 2 else 2000) + int(id_value[1:3])
+        if date(year, int(id_value[3:5]), int(id_value[5:7])) > date.today():
+            return None
+    except ValueError:
+        return None
+    if id_value[7:9] not in GOVERNORATE_CODES:
+        return None
+
+    year = (1900 if int(id_value[0]) == 2 else 2000) + int(id_value[1:3])
+    return {
+        "national_id": id_value,
+        "date_of_birth": date(year, int(id_value[3:5]), int(id_value[5:7])),
+        "governorate": GOVERNORATE_CODES.get(id_value[7:9], "Unknown"),
+        "gender": "male" if int(id_value[12]) % 2 != 0 else "female",
+    }
+
+
+def run(count: int = 100_000) -> dict:
+    global GOVERNORATE_CODES
+    setup_django()
+    from national_ids.constants import EGYPTIAN_GOVERNORATE_CODES
+    from national_ids.parsing import InvalidNationalID, parse_national_id
+
+    GOVERNORATE_CODES = EGYPTIAN_GOVERNORATE_CODES
+    ids = [id_value for id_value in sample_ids(count) if len(id_value) == 14]
+
+    def fused():
+        for id_value in ids:
+            try:
+                parse_national_id(id_value).as_data()
+            except InvalidNationalID:
+                pass
+
+    def legacy():
+        for id_value in ids:
+            two_phase(id_value)
+
+    two_phase_seconds = best_of(legacy)
+    fused_seconds = best_of(fused)
+    return {
+        'count': len(ids),
+        'two_phase_seconds': two_phase_seconds,
+        'fused_seconds': fused_seconds,
+        'speedup': two_phase_seconds / fused_seconds,
+    }
+
+
+if __name__ == '__main__':
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
+    print(f"{result['count']} IDs")
+    print(f"two-phase validate + extract: {result['two_phase_seconds'] * 1e9 / result['count']:.0f} ns/ID")
+    print(f"fused parser:                 {result['fused_seconds'] * 1e9 / result['count']:.0f} ns/ID")
+    print(f"speedup:                      {result['speedup']:.2f}x")
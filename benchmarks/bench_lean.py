@@ -0,0 +1,117 @@
+"""
+Send the same extract requests, one at a time, through Django's WSGI handler to the
+DRF view and to the lean view, and report the time per request and what the lean
+view saves. Runs in-process, without a server, against a throwaway test database.
+
+    python -m benchmarks.bench_lean [requests]
+"""
+import importlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_asgi import DATABASE_PER_REQUEST, IN_MEMORY, PATH
+from benchmarks.utils import sample_ids, setup_django
+
+
+def _use_lean_view(enabled: bool) -> None:
+    from django.conf import settings
+    from django.urls import clear_url_caches
+    import core.urls
+    import national_ids.urls
+
+    settings.NATIONAL_ID_LEAN_VIEW = enabled
+    importlib.reload(national_ids.urls)
+    importlib.reload(core.urls)
+    clear_url_caches()
+
+
+def run_requests(plain_key: str, bodies) -> float:
+    """Seconds per request over all bodies, sent one after the other."""
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    start = time.perf_counter()
+    for body in bodies:
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': PATH,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'HTTP_X_API_KEY': plain_key,
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+        }
+        response = handler(environ, lambda status, headers: None)
+        b''.join(response)
+        response.close()
+    return (time.perf_counter() - start) / len(bodies)
+
+
+def run(requests: int = 5000) -> dict:
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+    from core.utils.custom_throttles import EgyptianIDThrottle
+    from users.leasing import get_lease_pool
+    from users.models import APIKey, User
+    from users.usage import get_usage_sink
+
+    setup_test_environment()
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    EgyptianIDThrottle.rate = '100000000/hour'
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(
+            email='bench@example.com', first_name='Bench', last_name='User', tokens_balance=10 ** 9
+        )
+        _, plain_key = APIKey.create_key(user, 'Bench Key')
+        # Mostly valid IDs, some invalid, with repeats served from the result cache
+        bodies = [json.dumps({'national_id': id_value}).encode() for id_value in sample_ids(requests // 4)] * 4
+
+        results = {}
+        for config_name, config in (('database per request', DATABASE_PER_REQUEST), ('in memory', IN_MEMORY)):
+            config = {name: {**getattr(settings, name), **overrides} for name, overrides in config.items()}
+            with override_settings(**config):
+                timings = {}
+                for name, lean in (('DRF view', False), ('lean view', True)):
+                    _use_lean_view(lean)
+                    run_requests(plain_key, bodies[:200])
+                    timings[name] = run_requests(plain_key, bodies)
+                get_usage_sink().close()
+                get_lease_pool().release_all()
+            results[config_name] = {
+                **timings,
+                'saved_seconds': timings['DRF view'] - timings['lean view'],
+                'speedup': timings['DRF view'] / timings['lean view'],
+            }
+        _use_lean_view(False)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {'requests': len(bodies), 'results': results}
+
+
+if __name__ == '__main__':
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
+    print(f"{result['requests']} extract requests, one at a time")
+    print(f"{'configuration':>20}  {'DRF view':>11}  {'lean view':>11}  {'saved':>11}  {'speedup':>7}")
+    for config_name, stats in result['results'].items():
+        print(
+            f"{config_name:>20}  {stats['DRF view'] * 1e6:>8.0f} µs  {stats['lean view'] * 1e6:>8.0f} µs"
+            f"  {stats['saved_seconds'] * 1e6:>8.0f} µs  {stats['speedup']:>6.2f}x"
+        )
@@ -0,0 +1,101 @@
+"""
+Measure what metrics cost: one counter increment and one histogram observation,
+and the time per extract request through Django's WSGI handler with metrics off
+and on. Runs in-process against a throwaway test database.
+
+prometheus_client picks its multiprocess mode on import, so run it once more with
+PROMETHEUS_MULTIPROC_DIR set to an empty directory to measure that backend:
+
+    python -m benchmarks.bench_metrics [requests]
+    PROMETHEUS_MULTIPROC_DIR=$(mktemp -d) python -m benchmarks.bench_metrics [requests]
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from benchmarks.bench_asgi import IN_MEMORY
+from benchmarks.bench_lean import run_requests
+from benchmarks.utils import best_of, sample_ids, setup_django
+
+BACKEND = 'multiprocess' if os.environ.get('PROMETHEUS_MULTIPROC_DIR') else 'local'
+BACKENDS = {
+    'off': {'ENABLED': False, 'BACKEND': BACKEND},
+    BACKEND: {'ENABLED': True, 'BACKEND': BACKEND},
+}
+
+
+def update_cost(number: int = 200_000) -> dict:
+    from django.test.utils import override_settings
+    from core.utils.metrics import REQUEST_SECONDS, REQUESTS
+
+    def increments():
+        for _ in range(number):
+            REQUESTS.labels('national_ids:extract-egyptian-id', '200', 'standard').inc()
+
+    def observations():
+        for _ in range(number):
+            REQUEST_SECONDS.labels('national_ids:extract-egyptian-id').observe(0.0007)
+
+    with override_settings(METRICS=BACKENDS[BACKEND]):
+        return {
+            BACKEND: {
+                'counter_seconds': best_of(increments) / number,
+                'histogram_seconds': best_of(observations) / number,
+            }
+        }
+
+
+def run(requests: int = 4000, rounds: int = 5) -> dict:
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+    from core.utils.custom_throttles import EgyptianIDThrottle
+    from users.leasing import get_lease_pool
+    from users.models import APIKey, User
+    from users.usage import get_usage_sink
+
+    setup_test_environment()
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    EgyptianIDThrottle.rate = '100000000/hour'
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(
+            email='bench@example.com', first_name='Bench', last_name='User', tokens_balance=10 ** 9
+        )
+        _, plain_key = APIKey.create_key(user, 'Bench Key')
+        bodies = [json.dumps({'national_id': id_value}).encode() for id_value in sample_ids(requests // 4)] * 4
+
+        config = {name: {**getattr(settings, name), **overrides} for name, overrides in IN_MEMORY.items()}
+        results = {}
+        with override_settings(**config):
+            # Rounds alternate between backends, so drift affects them all alike
+            for _ in range(rounds):
+                for name, metrics in BACKENDS.items():
+                    with override_settings(METRICS=metrics):
+                        run_requests(plain_key, bodies[:200])
+                        seconds = run_requests(plain_key, bodies)
+                    results[name] = min(results.get(name, seconds), seconds)
+            get_usage_sink().close()
+            get_lease_pool().release_all()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {'requests': len(bodies), 'updates': update_cost(), 'results': results}
+
+
+if __name__ == '__main__':
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else 4000)
+    for name, costs in result['updates'].items():
+        print(
+            f"{name:>12}: counter inc {costs['counter_seconds'] * 1e9:>5.0f} ns, "
+            f"histogram observe {costs['histogram_seconds'] * 1e9:>5.0f} ns"
+        )
+    print(f"{result['requests']} extract requests, one at a time")
+    baseline = result['results']['off']
+    for name, seconds in result['results'].items():
+        print(f"{name:>12}  {seconds * 1e6:>7.0f} µs  {(seconds - baseline) * 1e6:>+6.0f} µs")
@@ -0,0 +1,96 @@
+"""
+Compare the cost of rendering response bodies with DRF's JSONRenderer and with
+FastJSONRenderer, for the envelopes the API actually returns, and check that both
+produce the same bytes.
+
+    python -m benchmarks.bench_renderer [batch_size]
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.utils import best_of, sample_ids, setup_django
+
+
+def responses(batch_size: int) -> dict:
+    from core.base.renderers import Envelope
+    from national_ids.services import extract_national_id, extract_national_ids
+    from national_ids.views import INSUFFICIENT_TOKENS
+    from rest_framework.exceptions import ErrorDetail
+
+    def envelope(success, payload, message):
+        return Envelope({
+            'success': success,
+            'message': message,
+            'data': payload if success else None,
+            'errors': None if success else payload,
+        })
+
+    results = extract_national_ids(sample_ids(batch_size))
+    valid = sum(1 for result in results if result['valid'])
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    usage = [
+        {
+            'id': index,
+            'ip_address': '127.0.0.1',
+            'user_agent': 'Bench/1.0',
+            'tokens_used': 1,
+            'response_status': '200',
+            'created_at': start + timedelta(seconds=index, microseconds=index),
+        }
+        for index in range(100)
+    ]
+    return {
+        'extract': envelope(True, extract_national_id('29001010123456'), 'ID validation completed successfully'),
+        'validation error': envelope(
+            False,
+            {'national_id': [ErrorDetail('National ID must be exactly 14 digits', code='invalid')]},
+            'ID validation failed',
+        ),
+        'insufficient tokens': envelope(False, INSUFFICIENT_TOKENS, 'ID validation failed'),
+        f'batch of {batch_size}': envelope(
+            True,
+            {
+                'results': results,
+                'total': len(results),
+                'valid': valid,
+                'invalid': len(results) - valid,
+                'tokens_used': valid,
+            },
+            'Batch ID validation completed successfully',
+        ),
+        'usage page of 100': envelope(
+            True, {'results': usage, 'next': None, 'previous': None}, 'Operation completed successfully'
+        ),
+    }
+
+
+def run(batch_size: int = 1000) -> dict:
+    setup_django()
+    from core.base.renderers import FastJSONRenderer
+    from rest_framework.renderers import JSONRenderer
+
+    drf, fast = JSONRenderer(), FastJSONRenderer()
+    results = {}
+    for name, data in responses(batch_size).items():
+        identical = drf.render(data) == fast.render(data)
+        number = 20 if name.startswith(('batch', 'usage')) else 5000
+        drf_seconds = best_of(lambda: drf.render(data), number=number) / number
+        fast_seconds = best_of(lambda: fast.render(data), number=number) / number
+        results[name] = {
+            'bytes': len(drf.render(data)),
+            'drf_seconds': drf_seconds,
+            'fast_seconds': fast_seconds,
+            'speedup': drf_seconds / fast_seconds,
+            'identical': identical,
+        }
+    return {'batch_size': batch_size, 'results': results}
+
+
+if __name__ == '__main__':
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    print(f"{'response':>20}  {'bytes':>8}  {'DRF':>11}  {'orjson':>11}  {'speedup':>7}  identical")
+    for name, stats in result['results'].items():
+        print(
+            f"{name:>20}  {stats['bytes']:>8}  {stats['drf_seconds'] * 1e6:>8.2f} µs"
+            f"  {stats['fast_seconds'] * 1e6:>8.2f} µs  {stats['speedup']:>6.1f}x  {stats['identical']}"
+        )
@@ -0,0 +1,125 @@
+"""
+Compare the full settings (core.settings) with the API worker profile
+(core.settings_api): import and warm-up time and resident memory of a fresh worker,
+and the time per extract request through Django's WSGI handler with and without the
+profile's middleware. Each profile is measured in its own interpreter.
+
+    python -m benchmarks.bench_settings_profiles [requests]
+"""
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = ['core.settings', 'core.settings_api']
+
+
+def _rss_bytes() -> int:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def start_worker(profile: str) -> dict:
+    """Load the profile the way a worker does, in this (fresh) interpreter."""
+    from benchmarks.utils import setup_django
+
+    start = time.perf_counter()
+    setup_django(profile)
+    from core.warmup import warm_up
+    warm_up()
+    return {'import_seconds': time.perf_counter() - start, 'rss_bytes': _rss_bytes()}
+
+
+def measure_requests(requests: int) -> dict:
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+    from benchmarks.bench_asgi import IN_MEMORY
+    from benchmarks.bench_lean import run_requests
+    from benchmarks.utils import sample_ids
+    from core.utils.custom_throttles import EgyptianIDThrottle
+    from users.models import APIKey, User
+
+    setup_test_environment()
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    EgyptianIDThrottle.rate = '100000000/hour'
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(
+            email='bench@example.com', first_name='Bench', last_name='User', tokens_balance=10 ** 9
+        )
+        _, plain_key = APIKey.create_key(user, 'Bench Key')
+        bodies = [json.dumps({'national_id': id_value}).encode() for id_value in sample_ids(requests // 4)] * 4
+
+        # Billing in memory, so the middleware is a visible share of the request
+        config = {name: {**getattr(settings, name), **overrides} for name, overrides in IN_MEMORY.items()}
+        with override_settings(**config):
+            run_requests(plain_key, bodies[:200])
+            request_seconds = run_requests(plain_key, bodies)
+            with override_settings(MIDDLEWARE=[]):
+                run_requests(plain_key, bodies[:200])
+                bare_seconds = run_requests(plain_key, bodies)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {
+        'middleware': len(settings.MIDDLEWARE),
+        'installed_apps': len(settings.INSTALLED_APPS),
+        'modules': len(sys.modules),
+        'request_seconds': request_seconds,
+        'middleware_seconds': request_seconds - bare_seconds,
+    }
+
+
+def _worker(profile: str, requests: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_settings_profiles', '--worker', profile, str(requests)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(requests: int = 4000, starts: int = 3) -> dict:
+    results = {}
+    for profile in PROFILES:
+        # Best of several fresh interpreters, once the bytecode is cached
+        _worker(profile, 0)
+        cold = [_worker(profile, 0) for _ in range(starts)]
+        results[profile] = {
+            **_worker(profile, requests),
+            'import_seconds': min(start['import_seconds'] for start in cold),
+            'rss_bytes': min(start['rss_bytes'] for start in cold),
+        }
+    return {'requests': requests, 'results': results}
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--worker']:
+        profile, requests = sys.argv[2], int(sys.argv[3])
+        result = start_worker(profile)
+        if requests:
+            result.update(measure_requests(requests))
+        print(json.dumps(result))
+        sys.exit()
+
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else 4000)
+    print(f"{result['requests']} extract requests per profile, one at a time")
+    print(
+        f"{'profile':>18}  {'apps':>4}  {'middleware':>10}  {'modules':>7}  {'import':>9}  {'RSS':>8}"
+        f"  {'request':>9}  {'middleware':>10}"
+    )
+    for profile, stats in result['results'].items():
+        print(
+            f"{profile:>18}  {stats['installed_apps']:>4}  {stats['middleware']:>10}  {stats['modules']:>7}"
+            f"  {stats['import_seconds'] * 1e3:>6.0f} ms  {stats['rss_bytes'] / 2 ** 20:>5.1f} MB"
+            f"  {stats['request_seconds'] * 1e6:>6.0f} µs  {stats['middleware_seconds'] * 1e6:>7.0f} µs"
+        )
@@ -0,0 +1,100 @@
+"""
+Time one throttle check of a user already at their limit with DRF's UserRateThrottle
+(a list of request timestamps in the cache) and with EgyptianIDThrottle on each rate
+limit backend (constant state per user), then let several forked workers hit one
+user at once and count how many requests each backend lets through.
+
+    python -m benchmarks.bench_throttle [calls] [workers]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+from benchmarks.utils import best_of, setup_django
+
+RATES = ('1000/hour', '100000/hour')
+
+
+def _shared_limit_worker(backend, limit, calls, allowed):
+    count = sum(1 for _ in range(calls) if not backend.hit('throttle_user_1', limit, 3600))
+    with allowed.get_lock():
+        allowed.value += count
+
+
+def run(calls: int = 20000, workers: int = 4) -> dict:
+    setup_django()
+    from django.core.cache import cache
+    from django.test.utils import override_settings
+    from rest_framework.throttling import UserRateThrottle
+    from core.utils.custom_throttles import EgyptianIDThrottle
+    from core.utils.rate_limiting import LocalRateLimitBackend, MmapRateLimitBackend, get_rate_limit_backend
+
+    request = SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=1))
+    mmap_path = os.path.join(tempfile.mkdtemp(), 'rate_limits')
+    backends = {
+        'cache': {'BACKEND': 'cache', 'CACHE_ALIAS': 'default'},
+        'mmap': {'BACKEND': 'mmap', 'MMAP_PATH': mmap_path, 'MMAP_SLOTS': 65536},
+        'local': {'BACKEND': 'local'},
+    }
+
+    checks = []
+    for rate in RATES:
+        limit = int(rate.split('/')[0])
+        drf = type('DRFThrottle', (UserRateThrottle,), {'rate': rate})
+        engine = type('EngineThrottle', (EgyptianIDThrottle,), {'rate': rate})
+
+        def check(throttle_class):
+            throttle_class().allow_request(request, None)
+
+        # Fill the history up to the limit so every timed call sees a full window
+        cache.clear()
+        throttle = drf()
+        cache.set(throttle.get_cache_key(request, None), [throttle.timer()] * limit, throttle.duration)
+        timings = {'drf': best_of(lambda: check(drf), number=calls) / calls}
+
+        for name, config in backends.items():
+            with override_settings(RATE_LIMITING=config):
+                get_rate_limit_backend().clear()
+                for _ in range(limit):
+                    check(engine)
+                timings[name] = best_of(lambda: check(engine), number=calls) / calls
+        checks.append({'rate': rate, 'seconds': timings})
+
+    # Each worker alone would make the whole limit; a shared backend lets it through once
+    limit = 1000
+    context = multiprocessing.get_context('fork')
+    shared = {}
+    for name, backend in (
+        ('mmap', MmapRateLimitBackend(os.path.join(tempfile.mkdtemp(), 'rate_limits'))),
+        ('local', LocalRateLimitBackend()),
+    ):
+        allowed = context.Value('i', 0)
+        processes = [
+            context.Process(target=_shared_limit_worker, args=(backend, limit, limit, allowed))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        shared[name] = allowed.value
+
+    return {'calls': calls, 'workers': workers, 'limit': limit, 'checks': checks, 'allowed': shared}
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    result = run(*args)
+    print(f"Throttle check of a user at their limit, best of {result['calls']} calls")
+    print(f"{'rate':>12}  {'DRF':>10}  {'cache':>10}  {'mmap':>10}  {'local':>10}")
+    for check in result['checks']:
+        seconds = check['seconds']
+        print(
+            f"{check['rate']:>12}  "
+            + "  ".join(f"{seconds[name] * 1e6:>7.1f} us" for name in ('drf', 'cache', 'mmap', 'local'))
+        )
+    print(f"\n{result['workers']} workers hitting one user with a limit of {result['limit']}:")
+    for name, allowed in result['allowed'].items():
+        print(f"  {name:>5}: {allowed} requests allowed")
@@ -0,0 +1,119 @@
+"""
+Hammer one user with parallel charges and check that the final balance is exact.
+Compares the previous read-modify-write save(), the single conditional UPDATE and
+per-worker token leasing, then sends parallel extract requests through the full API stack. Runs against a
+throwaway test database.
+
+    python -m benchmarks.bench_token_deduction [requests] [threads]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import setup_django
+
+
+def legacy_deduct(user, amount):
+    """Reference copy of User.deduct_tokens before the conditional UPDATE."""
+    if user.tokens_balance >= amount:
+        user.tokens_balance -= amount
+        user.save(update_fields=['tokens_balance'])
+        return True
+    return False
+
+
+def run(requests: int = 800, threads: int = 8) -> dict:
+    setup_django()
+    from django.core.cache import cache
+    from django.db import close_old_connections, connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from users.leasing import TokenLeasePool
+    from users.models import APIKey, User
+
+    setup_test_environment()
+    # Every request past the balance is an expected 402
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    if connection.vendor == 'sqlite':
+        # Concurrent writers need a file database, in-memory ones refuse instead of waiting
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(email='bench@example.com', first_name='Bench', last_name='User')
+
+        def hammer(charge, lease_pool=None):
+            User.objects.filter(pk=user.pk).update(tokens_balance=requests // 2)
+
+            def call(_):
+                try:
+                    return charge(User.objects.get(pk=user.pk))
+                finally:
+                    close_old_connections()
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                charged = sum(pool.map(call, range(requests)))
+            seconds = time.perf_counter() - start
+            if lease_pool is not None:
+                lease_pool.release_all()
+            balance = User.objects.get(pk=user.pk).tokens_balance
+            return seconds, charged, balance
+
+        legacy = hammer(lambda u: legacy_deduct(u, 1))
+        atomic = hammer(lambda u: u.deduct_tokens(1))
+        lease_pool = TokenLeasePool(min_size=10, max_size=100, target_seconds=0.1, ttl=30)
+        leased = hammer(lambda u: lease_pool.charge(u.pk, 1), lease_pool)
+
+        # Full requests, kept under the hourly throttle of one user
+        cache.clear()
+        User.objects.filter(pk=user.pk).update(tokens_balance=requests // 2)
+        _, plain_key = APIKey.create_key(user, 'Bench Key')
+        url = reverse('national_ids:extract-egyptian-id')
+
+        def post(_):
+            try:
+                return Client().post(url, {'national_id': '29001010123456'}, HTTP_X_API_KEY=plain_key).status_code
+            finally:
+                close_old_connections()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            statuses = list(pool.map(post, range(requests)))
+        api_seconds = time.perf_counter() - start
+        api_balance = User.objects.get(pk=user.pk).tokens_balance
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    initial = requests // 2
+    return {
+        'requests': requests,
+        'threads': threads,
+        'initial_balance': initial,
+        'legacy': {'seconds': legacy[0], 'charged': legacy[1], 'balance': legacy[2],
+                   'lost_updates': legacy[1] - (initial - legacy[2])},
+        'atomic': {'seconds': atomic[0], 'charged': atomic[1], 'balance': atomic[2],
+                   'lost_updates': atomic[1] - (initial - atomic[2])},
+        'leased': {'seconds': leased[0], 'charged': leased[1], 'balance': leased[2],
+                   'lost_updates': leased[1] - (initial - leased[2])},
+        'api': {'seconds': api_seconds, 'ok': statuses.count(200), 'payment_required': statuses.count(402),
+                'balance': api_balance},
+    }
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    result = run(*args)
+    print(f"{result['requests']} charges of 1 token, {result['threads']} threads, "
+          f"starting balance {result['initial_balance']}")
+    for name in ('legacy', 'atomic', 'leased'):
+        stats = result[name]
+        print(f"{name:7s} {stats['seconds'] * 1e6 / result['requests']:.0f} us/charge, "
+              f"{stats['charged']} charged, final balance {stats['balance']}, "
+              f"{stats['lost_updates']} lost updates")
+    api = result['api']
+    print(f"api     {result['requests'] / api['seconds']:.0f} req/s, {api['ok']} x 200, "
+          f"{api['payment_required']} x 402, final balance {api['balance']}")
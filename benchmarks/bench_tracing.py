@@ -0,0 +1,91 @@
+"""
+Measure what request tracing costs: a `stage()` block with tracing disabled and
+enabled, and the time per extract request through Django's WSGI handler with
+tracing off, on, and on with a span file. Runs in-process against a throwaway
+test database.
+
+    python -m benchmarks.bench_tracing [requests]
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from benchmarks.bench_asgi import IN_MEMORY
+from benchmarks.bench_lean import run_requests
+from benchmarks.utils import best_of, sample_ids, setup_django
+
+
+def stage_cost(number: int = 200_000) -> dict:
+    from core.utils.tracing import Trace, _current_trace, stage
+
+    def blocks():
+        for _ in range(number):
+            with stage('extract'):
+                pass
+
+    disabled = best_of(blocks) / number
+    token = _current_trace.set(Trace())
+    try:
+        enabled = best_of(blocks, repeat=1) / number
+    finally:
+        _current_trace.reset(token)
+    return {'disabled_seconds': disabled, 'enabled_seconds': enabled}
+
+
+def run(requests: int = 4000, rounds: int = 5) -> dict:
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+    from core.utils.custom_throttles import EgyptianIDThrottle
+    from users.leasing import get_lease_pool
+    from users.models import APIKey, User
+    from users.usage import get_usage_sink
+
+    setup_test_environment()
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    EgyptianIDThrottle.rate = '100000000/hour'
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(
+            email='bench@example.com', first_name='Bench', last_name='User', tokens_balance=10 ** 9
+        )
+        _, plain_key = APIKey.create_key(user, 'Bench Key')
+        bodies = [json.dumps({'national_id': id_value}).encode() for id_value in sample_ids(requests // 4)] * 4
+
+        config = {name: {**getattr(settings, name), **overrides} for name, overrides in IN_MEMORY.items()}
+        span_path = os.path.join(tempfile.mkdtemp(), 'spans.json')
+        configurations = {
+            'tracing off': {'ENABLED': False, 'SPAN_FILE': ''},
+            'Server-Timing': {'ENABLED': True, 'SPAN_FILE': ''},
+            'Server-Timing + span file': {'ENABLED': True, 'SPAN_FILE': span_path},
+        }
+        results = {}
+        with override_settings(**config):
+            # Rounds alternate between configurations, so drift affects them all alike
+            for _ in range(rounds):
+                for name, tracing in configurations.items():
+                    with override_settings(REQUEST_TRACING=tracing):
+                        run_requests(plain_key, bodies[:200])
+                        seconds = run_requests(plain_key, bodies)
+                    results[name] = min(results.get(name, seconds), seconds)
+            get_usage_sink().close()
+            get_lease_pool().release_all()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {'requests': len(bodies), 'stage': stage_cost(), 'results': results}
+
+
+if __name__ == '__main__':
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else 4000)
+    print(f"stage() block, tracing disabled: {result['stage']['disabled_seconds'] * 1e9:.0f} ns")
+    print(f"stage() block, tracing enabled:  {result['stage']['enabled_seconds'] * 1e9:.0f} ns")
+    print(f"{result['requests']} extract requests, one at a time")
+    baseline = result['results']['tracing off']
+    for name, seconds in result['results'].items():
+        print(f"{name:>26}  {seconds * 1e6:>7.0f} µs  {(seconds - baseline) * 1e6:>+6.0f} µs")
@@ -0,0 +1,78 @@
+"""
+Page through a seeded APIUsage table with the keyset cursor of the usage endpoint and
+compare it with OFFSET pagination at the same depths. Keyset pages should take the
+same time at any depth. Runs against a throwaway test database.
+
+    python -m benchmarks.bench_usage_pagination [rows] [page_size]
+"""
+import os
+import sys
+import tempfile
+from datetime import timedelta
+
+from benchmarks.utils import best_of, setup_django
+
+
+def run(rows: int = 200_000, page_size: int = 100) -> dict:
+    setup_django()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from django.utils import timezone
+    from users.models import APIKey, APIUsage, User
+    from users.serializers import encode_cursor
+
+    setup_test_environment()
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(email='bench@example.com', first_name='Bench', last_name='User')
+        api_key, plain_key = APIKey.create_key(user, 'Bench Key')
+        other_key, _ = APIKey.create_key(
+            User.objects.create_user(email='other@example.com', first_name='Other', last_name='User'), 'Other Key'
+        )
+        start = timezone.now() - timedelta(days=30)
+        step = timedelta(days=30) / rows
+        APIUsage.objects.bulk_create(
+            (
+                APIUsage(
+                    api_key=api_key if i % 2 else other_key,
+                    ip_address='127.0.0.1',
+                    user_agent='bench',
+                    tokens_used=1,
+                    response_status='200',
+                    created_at=start + step * i,
+                )
+                for i in range(rows * 2)
+            ),
+            batch_size=5000,
+        )
+
+        client = Client(HTTP_X_API_KEY=plain_key)
+        url = reverse('users:usage-list')
+        ordered = APIUsage.objects.filter(api_key=api_key).order_by('-created_at', '-id')
+        results = []
+        for depth in (0, rows // 100, rows // 10, rows // 2, rows - page_size):
+            params = {'limit': page_size}
+            if depth:
+                anchor = ordered.values('created_at', 'id')[depth - 1]
+                params['cursor'] = encode_cursor(anchor['created_at'], anchor['id'])
+
+            keyset_seconds = best_of(lambda: client.get(url, params), number=5) / 5
+            offset_seconds = best_of(lambda: list(ordered.values('id')[depth:depth + page_size]), number=5) / 5
+            results.append({'depth': depth, 'keyset_seconds': keyset_seconds, 'offset_seconds': offset_seconds})
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {'rows': rows, 'page_size': page_size, 'pages': results}
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    result = run(*args)
+    print(f"{result['rows']} usage rows of the caller, {result['page_size']} per page")
+    print(f"{'depth':>8}  {'keyset (API)':>14}  {'OFFSET (query only)':>20}")
+    for page in result['pages']:
+        print(f"{page['depth']:>8}  {page['keyset_seconds'] * 1e3:>11.2f} ms  {page['offset_seconds'] * 1e3:>17.2f} ms")
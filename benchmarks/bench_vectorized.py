@@ -0,0 +1,40 @@
+"""
+Compare the vectorized engine with the per-object extractor.
+
+    python -m benchmarks.bench_vectorized [count]
+"""
+import sys
+
+from benchmarks.utils import best_of, sample_ids, setup_django
+
+
+def run(count: int = 100_000) -> dict:
+    setup_django()
+    from national_ids.serializers import EgyptianIDSerializer
+    from national_ids.services import EgyptianIDExtractor
+    from national_ids.vectorized import extract_columns
+
+    ids = sample_ids(count)
+
+    def per_object():
+        for id_value in ids:
+            serializer = EgyptianIDSerializer(data={'national_id': id_value})
+            if serializer.is_valid():
+                EgyptianIDExtractor(id_value).get_data()
+
+    per_object_seconds = best_of(per_object, repeat=1)
+    vectorized_seconds = best_of(lambda: extract_columns(ids), repeat=3)
+    return {
+        'count': count,
+        'per_object_seconds': per_object_seconds,
+        'vectorized_seconds': vectorized_seconds,
+        'speedup': per_object_seconds / vectorized_seconds,
+    }
+
+
+if __name__ == '__main__':
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
+    print(f"{result['count']} IDs")
+    print(f"per-object extractor: {result['per_object_seconds'] * 1e6 / result['count']:.2f} us/ID")
+    print(f"vectorized engine:    {result['vectorized_seconds'] * 1e6 / result['count']:.2f} us/ID")
+    print(f"speedup:              {result['speedup']:.1f}x")
@@ -0,0 +1,242 @@
+"""
+Benchmark suite to catch performance regressions before a deploy.
+
+Micro-benchmarks time ID validation and extraction over a realistic mix of valid
+and invalid IDs. Macro-benchmarks drive the extract and batch endpoints through the
+test client with authentication, throttling, token deduction and usage logging, as
+configured in the settings, against a throwaway test database. Every result is the
+best time per operation over several rounds.
+
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --compare baseline.json [--threshold 0.15]
+
+With --compare, the exit status is 1 when any benchmark got slower than the
+baseline by more than the threshold.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.utils import best_of, sample_ids, setup_django
+
+# name -> (unit, function building the operation to time and the units it handles)
+BENCHMARKS: Dict[str, Tuple[str, Callable[[int], Tuple[Callable[[], object], int]]]] = {}
+
+
+def benchmark(name: str, unit: str):
+    def register(build):
+        BENCHMARKS[name] = (unit, build)
+        return build
+    return register
+
+
+@benchmark('micro.serializer.validate_national_id', 'ID')
+def bench_validate_national_id(count: int):
+    from rest_framework.exceptions import ValidationError
+    from national_ids.serializers import EgyptianIDSerializer
+
+    serializer = EgyptianIDSerializer()
+    ids = sample_ids(count)
+
+    def validate():
+        for id_value in ids:
+            try:
+                serializer.validate_national_id(id_value)
+            except ValidationError:
+                pass
+
+    return validate, len(ids)
+
+
+@benchmark('micro.serializer.is_valid', 'ID')
+def bench_serializer_is_valid(count: int):
+    from national_ids.serializers import EgyptianIDSerializer
+
+    payloads = [{'national_id': id_value} for id_value in sample_ids(count)]
+
+    def validate():
+        for payload in payloads:
+            EgyptianIDSerializer(data=payload).is_valid()
+
+    return validate, len(payloads)
+
+
+@benchmark('micro.extractor.get_data', 'ID')
+def bench_extractor_get_data(count: int):
+    from national_ids.services import EgyptianIDExtractor
+
+    # Only IDs of the right shape reach an extractor, invalid ones take the lenient path
+    ids = [id_value for id_value in sample_ids(count) if len(id_value) == 14 and id_value.isdigit()]
+
+    def extract():
+        for id_value in ids:
+            try:
+                EgyptianIDExtractor(id_value).get_data()
+            except (ValueError, KeyError):
+                pass
+
+    return extract, len(ids)
+
+
+@benchmark('micro.services.extract_national_ids', 'ID')
+def bench_extract_national_ids(count: int):
+    from national_ids.services import extract_national_ids
+
+    ids = sample_ids(count)
+    return lambda: extract_national_ids(ids), len(ids)
+
+
+def _post_all(url: str, payloads: List[dict]) -> Callable[[], None]:
+    """POST every payload with the API key of a user with enough tokens for any run."""
+    from rest_framework.test import APIClient
+    from users.models import APIKey, User
+
+    user = User.objects.filter(email='bench@example.com').first() or User.objects.create_user(
+        email='bench@example.com', first_name='Bench', last_name='User', tokens_balance=10 ** 9
+    )
+    _, plain_key = APIKey.create_key(user, 'Bench Key')
+    client = APIClient()
+    client.credentials(HTTP_X_API_KEY=plain_key)
+
+    def post():
+        for payload in payloads:
+            response = client.post(url, payload, format='json')
+            if response.status_code >= 402:
+                raise RuntimeError(f"Benchmark request failed with {response.status_code}")
+    return post
+
+
+@benchmark('macro.api.extract', 'request')
+def bench_api_extract(count: int):
+    from django.urls import reverse
+
+    payloads = [{'national_id': id_value} for id_value in sample_ids(max(count // 100, 50))]
+    return _post_all(reverse('national_ids:extract-egyptian-id'), payloads), len(payloads)
+
+
+@benchmark('macro.api.extract_batch_100', 'request')
+def bench_api_extract_batch(count: int):
+    from django.urls import reverse
+
+    payloads = [{'national_ids': sample_ids(100, seed=seed)} for seed in range(max(count // 2000, 5))]
+    return _post_all(reverse('national_ids:extract-egyptian-id-batch'), payloads), len(payloads)
+
+
+def run(count: int = 10_000, repeat: int = 5, only: List[str] = None) -> dict:
+    setup_django()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from core.utils.custom_throttles import EgyptianIDThrottle
+    from core.utils.rate_limiting import get_rate_limit_backend
+
+    setup_test_environment()
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    # Time the throttle check, never its refusal
+    EgyptianIDThrottle.rate = '100000000/hour'
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0)
+    results = {}
+    try:
+        for name, (unit, build) in BENCHMARKS.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            operation, units = build(count)
+            operation()
+            seconds = best_of(operation, repeat=repeat)
+            results[name] = {'seconds': seconds / units, 'unit': unit, 'units': units, 'repeat': repeat}
+            get_rate_limit_backend().clear()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {'meta': _meta(count, repeat), 'results': results}
+
+
+def _meta(count: int, repeat: int) -> dict:
+    import django
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'count': count,
+        'repeat': repeat,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[dict]:
+    """Each benchmark of both runs, with its ratio to the baseline and whether it regressed."""
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        ratio = result['seconds'] / before['seconds']
+        rows.append({
+            'name': name,
+            'baseline_seconds': before['seconds'],
+            'seconds': result['seconds'],
+            'ratio': ratio,
+            'regressed': ratio > 1 + threshold,
+        })
+    return rows
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    if seconds >= 1e-6:
+        return f"{seconds * 1e6:.2f} µs"
+    return f"{seconds * 1e9:.0f} ns"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--count', type=int, default=10_000, help='IDs per micro-benchmark round')
+    parser.add_argument('--repeat', type=int, default=5, help='rounds per benchmark, the best one counts')
+    parser.add_argument('--only', action='append', help='only run benchmarks whose name starts with this')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='compare with the results saved in this file')
+    parser.add_argument('--threshold', type=float, default=0.15, help='slowdown that counts as a regression')
+    args = parser.parse_args(argv)
+
+    result = run(args.count, args.repeat, args.only)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(result, output, indent=2)
+
+    if not args.compare:
+        for name, stats in result['results'].items():
+            print(f"{name:<40}  {_format_seconds(stats['seconds']):>10} per {stats['unit']}")
+        return 0
+
+    with open(args.compare) as baseline_file:
+        baseline = json.load(baseline_file)
+    rows = compare(result, baseline, args.threshold)
+    print(f"Compared with {baseline['meta'].get('commit') or args.compare}, threshold {args.threshold:.0%}")
+    for row in rows:
+        flag = 'REGRESSED' if row['regressed'] else ''
+        print(
+            f"{row['name']:<40}  {_format_seconds(row['baseline_seconds']):>10}  {_format_seconds(row['seconds']):>10}"
+            f"  {row['ratio']:>6.2f}x  {flag}"
+        )
+    return 1 if any(row['regressed'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import os
+import random
+import time
+from typing import Callable, List
+
+
+def setup_django(settings_module: str = 'core.settings') -> None:
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def best_of(func: Callable[[], object], number: int = 1, repeat: int = 5) -> float:
+    """Return the best wall time in seconds of `number` calls, over `repeat` runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def sample_ids(count: int, invalid_ratio: float = 0.1, seed: int = 0) -> List[str]:
+    """Generate a realistic mix of valid IDs and the common kinds of invalid ones."""
+    rng = random.Random(seed)
+    governorates = ['01', '02', '12', '21', '88']
+    invalid = ['123', '2900101012345a', '19001010123456', '29013010123456', '29001099123456']
+    ids = []
+    for _ in range(count):
+        if rng.random() < invalid_ratio:
+            ids.append(rng.choice(invalid))
+            continue
+        century = rng.choice('23')
+        year = rng.randint(40, 99) if century == '2' else rng.randint(0, 20)
+        ids.append(
+            f"{century}{year:02d}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+            f"{rng.choice(governorates)}{rng.randint(0, 99999):05d}"
+        )
+    return ids
@@ -0,0 +1,27 @@
+#!/bin/sh
+# Prepare the database and static files, then serve the app in SERVER_MODE:
+#   wsgi (default)  preforked gunicorn workers running core.wsgi
+#   asgi            preforked gunicorn workers running core.asgi on uvicorn
+#   dev             Django's development server
+set -e
+
+# Always with the full settings: API workers (DJANGO_SETTINGS_MODULE=core.settings_api)
+# have neither the static files app nor every app's migrations
+python manage.py collectstatic --noinput --settings=core.settings
+python manage.py migrate --noinput --settings=core.settings
+
+case "${SERVER_MODE:-wsgi}" in
+    wsgi)
+        exec gunicorn core.wsgi:application -c compose/django/gunicorn.conf.py
+        ;;
+    asgi)
+        exec gunicorn core.asgi:application -c compose/django/gunicorn.conf.py
+        ;;
+    dev)
+        exec python manage.py runserver 0.0.0.0:5000
+        ;;
+    *)
+        echo "Unknown SERVER_MODE: ${SERVER_MODE}, use wsgi, asgi or dev" >&2
+        exit 1
+        ;;
+esac
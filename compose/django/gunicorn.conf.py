@@ -0,0 +1,111 @@
+"""
+Gunicorn configuration for production serving, used by compose/django/entrypoint.sh.
+
+The application is imported and warmed up once in the master (core.warmup) and then
+forked, so workers share its memory copy-on-write and accept traffic warm. Workers
+are recycled after MAX_REQUESTS requests, and flush their usage events and return
+leased tokens on the way out. Metrics default to the multiprocess backend, whose
+files of the previous run the master clears on start, and the master reclaims the
+token leases of workers killed before they could return them.
+
+    SERVER_MODE=wsgi gunicorn core.wsgi:application -c compose/django/gunicorn.conf.py
+    SERVER_MODE=asgi gunicorn core.asgi:application -c compose/django/gunicorn.conf.py
+"""
+import gc
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+elif threads > 1:
+    worker_class = 'gthread'
+else:
+    worker_class = 'sync'
+
+# Keep each sync worker's connection open between requests (with health checks, see
+# core.settings), so the one opened by post_fork is the one its requests use
+if worker_class != 'uvicorn.workers.UvicornWorker':
+    os.environ.setdefault('POSTGRES_CONN_MAX_AGE', '60')
+
+# Preforked workers each count their own metrics, so sum them with prometheus_client's
+# multiprocess mode: the directory must be set before the app is imported
+os.environ.setdefault('METRICS_BACKEND', 'multiprocess')
+if os.environ['METRICS_BACKEND'] == 'multiprocess':
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'nid_prometheus'))
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+preload_app = True
+
+# Recycle workers gracefully, staggered so they do not all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', None)
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # prometheus_client's multiprocess files of an earlier run would be summed into this one
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith('.db'):
+                os.unlink(os.path.join(directory, name))
+
+
+def when_ready(server):
+    from core.warmup import warm_up
+
+    # Runs once in the master after the app is preloaded, so workers fork warm
+    warm_up()
+    # Everything the preloaded app allocated is never collected, so the collector
+    # of a worker never writes to (and unshares) those pages
+    gc.freeze()
+    server.log.info(f"Preloaded application, {gc.get_freeze_count()} objects frozen")
+
+
+def post_fork(server, worker):
+    from core.warmup import warm_up_worker
+
+    # ASGI workers reach the database from executor threads, not from this one
+    if worker_class != 'uvicorn.workers.UvicornWorker':
+        warm_up_worker()
+
+
+def worker_exit(server, worker):
+    from core.warmup import shutdown_worker
+
+    shutdown_worker()
+
+
+def child_exit(server, worker):
+    from django.conf import settings
+    from django.db import connections
+    from users.leasing import reclaim_leases, worker_name
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        # Counters of the dead worker are kept, only its live gauges are dropped
+        multiprocess.mark_process_dead(worker.pid)
+
+    # A worker that exited cleanly has released its leases, one killed has not
+    if settings.TOKEN_LEASING['ENABLED']:
+        try:
+            leases, tokens = reclaim_leases(worker=worker_name(worker.pid))
+            if leases:
+                server.log.warning(f"Reclaimed {tokens} tokens of {leases} leases of worker {worker.pid}")
+        except Exception as e:
+            server.log.error(f"Failed to reclaim token leases of worker {worker.pid}: {e}")
+        finally:
+            # Workers forked later must not inherit the master's connection
+            connections.close_all()
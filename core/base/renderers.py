@@ -0,0 +1,140 @@
+"""
+JSON rendering with orjson, byte-for-byte identical to DRF's JSONRenderer.
+
+The unified response envelope is written straight to bytes: its head
+(`{"success":...,"message":...,"data":`) and tail are encoded once per message and
+reused, and only the payload between them is encoded per response. Constant
+payloads, such as the 402 body, are wrapped in `PreEncodedDict` and encoded once.
+Dates such as `date_of_birth`, datetimes, UUIDs and strings are formatted by orjson
+itself; anything else goes through DRF's JSONEncoder.default.
+
+Whatever orjson would encode differently from the standard library is left to
+DRF's renderer: indented or non-compact output, floats in exponent notation, NaN and
+infinities (which orjson writes as null, and DRF refuses in strict mode), ints beyond
+64 bits and non-string dict keys.
+"""
+import math
+import re
+from typing import Dict, Tuple
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.utils.tracing import stage
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_PASSTHROUGH_DATACLASS
+
+# orjson writes 1e16 and 0.00001 where Python writes 1e+16 and 1e-05. Both patterns
+# start with a literal, which keeps the scan fast, and may also match inside a
+# string, which only costs a slower render.
+_EXPONENT = re.compile(rb'e[-0-9]')
+_SMALL_FLOAT = re.compile(rb'0\.0000')
+_DIGITS = b'0123456789'
+
+# Encoded envelope heads are kept for this many distinct messages
+MAX_HEADS = 256
+
+_encoder = JSONEncoder()
+
+
+class _Fallback(Exception):
+    """orjson's output would differ from DRF's, render with DRF instead."""
+
+
+class Envelope(dict):
+    """The `{success, message, data, errors}` dict built by UnifiedResponseMixin."""
+
+
+class PreEncodedDict(dict):
+    """A constant response payload, encoded on first render. Must not be modified."""
+
+    encoded = None
+
+
+def _has_non_finite(data) -> bool:
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(_has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_has_non_finite(value) for value in data)
+    return False
+
+
+def _default(obj):
+    value = _encoder.default(obj)
+    # Such as a NaN numpy scalar or Decimal
+    if _has_non_finite(value):
+        raise _Fallback
+    return value
+
+
+def _dumps(data) -> bytes:
+    content = orjson.dumps(data, default=_default, option=OPTIONS)
+    if _EXPONENT.search(content):
+        raise _Fallback
+    # Only walked when there is a null that could have been a NaN or an infinity
+    if b'null' in content and _has_non_finite(data):
+        raise _Fallback
+    for match in _SMALL_FLOAT.finditer(content):
+        # Not the fraction of a number (or a time) such as 10.00001
+        if match.start() == 0 or content[match.start() - 1] not in _DIGITS:
+            raise _Fallback
+    # Escaped by DRF since they end a line in JavaScript
+    if b'\xe2\x80' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson, and pre-encodes envelopes and constant payloads."""
+
+    _heads: Dict[Tuple[bool, str], Tuple[bytes, bytes]] = {}
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with stage('render'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if data is None:
+            return b''
+        if (
+            self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            if type(data) is Envelope and len(data) == 4 and type(data['message']) is str:
+                return self._render_envelope(data)
+            return self._render_payload(data)
+        except (_Fallback, TypeError, orjson.JSONEncodeError):
+            return super().render(data, accepted_media_type, renderer_context)
+
+    def _render_envelope(self, envelope: Envelope) -> bytes:
+        success = envelope['success'] is True
+        head, tail = self._envelope_fragments(success, envelope['message'])
+        payload = envelope['data'] if success else envelope['errors']
+        if (envelope['errors'] if success else envelope['data']) is not None:
+            raise _Fallback
+        return b''.join((head, self._render_payload(payload), tail))
+
+    def _render_payload(self, data) -> bytes:
+        if type(data) is PreEncodedDict:
+            if data.encoded is None:
+                data.encoded = super().render(data)
+            return data.encoded
+        return _dumps(data)
+
+    def _envelope_fragments(self, success: bool, message: str) -> Tuple[bytes, bytes]:
+        fragments = self._heads.get((success, message))
+        if fragments is None:
+            # Cut out of DRF's own rendering of the envelope, so the bytes are the same
+            content = super().render({'success': success, 'message': message, 'data': None, 'errors': None})
+            suffix = b'null,"errors":null}' if success else b'null}'
+            fragments = (content[:-len(suffix)], b',"errors":null}' if success else b'}')
+            if len(self._heads) < MAX_HEADS:
+                self._heads[(success, message)] = fragments
+        return fragments
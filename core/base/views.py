@@ -1,6 +1,12 @@
-from rest_framework import status
+from asyncio import iscoroutine
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import exceptions, status
 from rest_framework.views import APIView
 
+from core.base.renderers import Envelope
+
 class UnifiedResponseMixin:
     """
     Mixin to format responses for all views, providing a consistent
@@ -14,12 +20,12 @@ class UnifiedResponseMixin:
             status.HTTP_204_NO_CONTENT,
             status.HTTP_202_ACCEPTED,
         ]
-        response.data = {
+        response.data = Envelope({
             'success': is_success,
             'message': success_message if is_success else error_message,
             'data': response.data if is_success else None,
             'errors': response.data if not is_success else None,
-        }
+        })
         return response
 
 class UnifiedResponseAPIView(UnifiedResponseMixin, APIView):
@@ -28,8 +34,104 @@ class UnifiedResponseAPIView(UnifiedResponseMixin, APIView):
     
     def finalize_response(self, request, response, *args, **kwargs):
         response = super().finalize_response(request, response, *args, **kwargs)
+        if isinstance(response, StreamingHttpResponse):
+            # Streamed bodies are written as they are produced and cannot be wrapped
+            return response
         return self.format_response(
             response, 
             success_message=self.success_message, 
             error_message=self.error_message
-        )
\ No newline at end of file
+        )
+
+
+class AsyncUnifiedResponseAPIView(UnifiedResponseAPIView):
+    """
+    UnifiedResponseAPIView with `async def` handlers, for ASGI deployments.
+
+    Authentication, permissions, throttling and the handler run on the event loop.
+    Authenticators and throttles with an `aauthenticate` / `aallow_request` method
+    are awaited, any others run in a thread. The response is rendered here and
+    returned as a plain HttpResponse, which Django would otherwise render in a thread.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if iscoroutine(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self._rendered(self.response)
+
+    async def ainitial(self, request, *args, **kwargs):
+        """Same steps as APIView.initial, awaiting authentication and throttling."""
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        await self.acheck_throttles(request)
+
+    async def aperform_authentication(self, request):
+        """Same as Request._authenticate, so request.user is never resolved synchronously."""
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
+
+    async def acheck_throttles(self, request):
+        throttle_durations = []
+        for throttle in self.get_throttles():
+            if hasattr(throttle, 'aallow_request'):
+                allowed = await throttle.aallow_request(request, self)
+            else:
+                allowed = await sync_to_async(throttle.allow_request)(request, self)
+            if not allowed:
+                throttle_durations.append(throttle.wait())
+
+        if throttle_durations:
+            durations = [duration for duration in throttle_durations if duration is not None]
+            self.throttled(request, max(durations, default=None))
+
+    def _rendered(self, response):
+        if isinstance(response, StreamingHttpResponse) or not hasattr(response, 'render'):
+            return response
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        rendered.cookies = response.cookies
+        return rendered
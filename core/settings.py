@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 import environ
 
 env = environ.Env()
@@ -54,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.utils.tracing.RequestTracingMiddleware',
+    'core.utils.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,6 +100,9 @@ if USE_DOCKER:
             'PASSWORD': env('POSTGRES_PASSWORD'),
             'HOST': env('POSTGRES_HOST'),
             'PORT': env('POSTGRES_PORT', default=5432),
+            # Keep connections open between requests of a worker, 0 closes them after each one
+            'CONN_MAX_AGE': env.int('POSTGRES_CONN_MAX_AGE', default=0),
+            'CONN_HEALTH_CHECKS': True,
         }
     }
 else:
@@ -133,10 +139,134 @@ REST_FRAMEWORK = {
         
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.base.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema"
 }
 
+# Authenticated API keys are cached per process for up to TTL seconds. Key and user
+# changes are broadcast to other workers through the SHARED_CACHE_ALIAS cache.
+# Rejected keys are remembered for NEGATIVE_TTL seconds to shield the database.
+API_KEY_CACHE = {
+    'TTL': env.int('API_KEY_CACHE_TTL', default=60),
+    'MAXSIZE': env.int('API_KEY_CACHE_MAXSIZE', default=10000),
+    'SHARED_CACHE_ALIAS': env('API_KEY_CACHE_SHARED_ALIAS', default='default'),
+    'SYNC_INTERVAL': env.float('API_KEY_CACHE_SYNC_INTERVAL', default=1.0),
+    'WARM_UP': env.bool('API_KEY_CACHE_WARM_UP', default=False),
+    'NEGATIVE_TTL': env.int('API_KEY_NEGATIVE_CACHE_TTL', default=30),
+    'NEGATIVE_MAXSIZE': env.int('API_KEY_NEGATIVE_CACHE_MAXSIZE', default=10000),
+}
+
+# Throttling state: 'cache' keeps a sliding-window counter in the CACHE_ALIAS cache
+# (shared by every node using it), 'mmap' keeps GCRA state in a memory-mapped file
+# at MMAP_PATH shared by every worker on the host, 'local' keeps it per worker
+RATE_LIMITING = {
+    'BACKEND': env('RATE_LIMIT_BACKEND', default='cache'),
+    'CACHE_ALIAS': env('RATE_LIMIT_CACHE_ALIAS', default='default'),
+    'MMAP_PATH': env('RATE_LIMIT_MMAP_PATH', default=os.path.join(tempfile.gettempdir(), 'nid_rate_limits')),
+    'MMAP_SLOTS': env.int('RATE_LIMIT_MMAP_SLOTS', default=65536),
+}
+
+# Token leasing: each worker reserves a block of a user's tokens with one UPDATE and
+# spends it in memory. Blocks are sized to about TARGET_SECONDS of the user's traffic,
+# between MIN_SIZE and MAX_SIZE, and returned after TTL seconds or at shutdown. What
+# each lease has left is written to its row every CHECKPOINT_INTERVAL seconds, so the
+# tokens of a worker that dies are reclaimed (`manage.py reclaim_token_leases`).
+# Disabled by default, every request is then charged against the database.
+TOKEN_LEASING = {
+    'ENABLED': env.bool('TOKEN_LEASING_ENABLED', default=False),
+    'MIN_SIZE': env.int('TOKEN_LEASING_MIN_SIZE', default=10),
+    'MAX_SIZE': env.int('TOKEN_LEASING_MAX_SIZE', default=1000),
+    'TARGET_SECONDS': env.float('TOKEN_LEASING_TARGET_SECONDS', default=2.0),
+    'TTL': env.int('TOKEN_LEASING_TTL', default=30),
+    'CHECKPOINT_INTERVAL': env.float('TOKEN_LEASING_CHECKPOINT_INTERVAL', default=1.0),
+}
+
+# API usage recording: 'sync' inserts every event in the request, 'buffered' queues
+# events and bulk inserts them from a background thread, 'jsonl' appends them to
+# rotated files under JSONL_DIR for `manage.py import_api_usage`
+API_USAGE_LOGGING = {
+    'SINK': env('API_USAGE_SINK', default='sync'),
+    'BUFFER_SIZE': env.int('API_USAGE_BUFFER_SIZE', default=500),
+    'FLUSH_INTERVAL': env.float('API_USAGE_FLUSH_INTERVAL', default=1.0),
+    'MAX_PENDING': env.int('API_USAGE_MAX_PENDING', default=100000),
+    'JSONL_DIR': env('API_USAGE_JSONL_DIR', default=str(BASE_DIR / 'logs' / 'usage')),
+    'JSONL_MAX_BYTES': env.int('API_USAGE_JSONL_MAX_BYTES', default=64 * 1024 * 1024),
+}
+
+# Hourly APIUsage rollups cover hours that ended at least SETTLE_SECONDS ago, so
+# events still queued by buffered sinks land before their hour is rolled up
+API_USAGE_ROLLUP = {
+    'SETTLE_SECONDS': env.int('API_USAGE_ROLLUP_SETTLE_SECONDS', default=300),
+}
+
+# Raw APIUsage rows older than DAYS (and already rolled up) are deleted in batches
+# of BATCH_SIZE by `manage.py prune_api_usage`, 0 keeps them forever
+API_USAGE_RETENTION = {
+    'DAYS': env.int('API_USAGE_RETENTION_DAYS', default=90),
+    'BATCH_SIZE': env.int('API_USAGE_RETENTION_BATCH_SIZE', default=10000),
+}
+
+# Maximum page size of the usage history endpoint
+USAGE_PAGE_MAX_SIZE = env.int('USAGE_PAGE_MAX_SIZE', default=1000)
+
+# Serve the extract and batch endpoints with async views, for ASGI deployments
+# (under WSGI every async view would run in its own event loop)
+NATIONAL_ID_ASYNC_VIEWS = env.bool('NATIONAL_ID_ASYNC_VIEWS', default=False)
+
+# Serve the extract endpoint with a plain Django view that skips DRF's request
+# handling for JSON requests carrying an API key (national_ids.lean)
+NATIONAL_ID_LEAN_VIEW = env.bool('NATIONAL_ID_LEAN_VIEW', default=False)
+
+# Per-stage request tracing: with ENABLED, responses carry a Server-Timing header with
+# the time and database queries of each stage (authentication, throttle, extraction,
+# token charge, usage logging, rendering), and with SPAN_FILE each request is also
+# appended to that file as Chrome trace events. Disabled, it costs next to nothing.
+REQUEST_TRACING = {
+    'ENABLED': env.bool('REQUEST_TRACING_ENABLED', default=False),
+    'SPAN_FILE': env('REQUEST_TRACING_SPAN_FILE', default=''),
+}
+
+# Prometheus metrics at /metrics: requests, latencies per endpoint and stage, token
+# charge failures, usage writes, throttle and cache lookups. The local backend only
+# exports the process that answers the scrape; multiprocess sums every preforked
+# worker through the files of prometheus_client in PROMETHEUS_MULTIPROC_DIR.
+METRICS = {
+    'ENABLED': env.bool('METRICS_ENABLED', default=False),
+    'BACKEND': env('METRICS_BACKEND', default='local'),
+}
+
+# Maximum number of IDs accepted by the batch extraction endpoint
+NATIONAL_ID_BATCH_MAX_SIZE = env.int('NATIONAL_ID_BATCH_MAX_SIZE', default=1000)
+
+# Number of IDs validated, billed and written per chunk by the streaming endpoint
+NATIONAL_ID_STREAM_CHUNK_SIZE = env.int('NATIONAL_ID_STREAM_CHUNK_SIZE', default=1000)
+
+# Extraction result cache: a per-process LRU, plus an optional shared tier
+# backed by one of the CACHES aliases so workers share results
+NATIONAL_ID_RESULT_CACHE = {
+    'LOCAL_MAXSIZE': env.int('NATIONAL_ID_CACHE_LOCAL_MAXSIZE', default=10000),
+    'LOCAL_TTL': env.int('NATIONAL_ID_CACHE_LOCAL_TTL', default=3600),
+    'SHARED_CACHE_ALIAS': env('NATIONAL_ID_CACHE_SHARED_ALIAS', default=None),
+    'SHARED_TTL': env.int('NATIONAL_ID_CACHE_SHARED_TTL', default=86400),
+}
+
+# Idempotency-Key support on the extract, batch and aggregate endpoints: first
+# responses are kept TTL seconds in the CACHE_ALIAS cache (use a shared cache when
+# running several workers), duplicates wait up to WAIT_TIMEOUT seconds (async views)
+# or SYNC_WAIT_TIMEOUT seconds (sync views, the wait holds a worker) for a request
+# still running, whose claim on the key expires after LOCK_TTL seconds
+IDEMPOTENCY = {
+    'CACHE_ALIAS': env('IDEMPOTENCY_CACHE_ALIAS', default='default'),
+    'TTL': env.int('IDEMPOTENCY_TTL', default=86400),
+    'LOCK_TTL': env.int('IDEMPOTENCY_LOCK_TTL', default=60),
+    'WAIT_TIMEOUT': env.float('IDEMPOTENCY_WAIT_TIMEOUT', default=10.0),
+    'SYNC_WAIT_TIMEOUT': env.float('IDEMPOTENCY_SYNC_WAIT_TIMEOUT', default=1.0),
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
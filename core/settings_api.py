@@ -0,0 +1,43 @@
+"""
+Settings for API workers: the full settings with only what the API endpoints use.
+
+API requests authenticate with an X-API-Key header and get JSON back, so workers
+serving them need no sessions, CSRF, messages, clickjacking or CORS middleware and
+no admin, sessions, messages or static files apps. The admin, the browsable API and
+management commands such as migrate and collectstatic keep running with
+`core.settings`.
+
+    DJANGO_SETTINGS_MODULE=core.settings_api gunicorn core.wsgi:application ...
+"""
+from core.settings import *  # noqa: F401,F403
+from core.settings import REST_FRAMEWORK
+
+INSTALLED_APPS = [
+    # The user model builds on auth, which needs contenttypes
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+
+    'rest_framework',
+
+    'national_ids',
+    'users',
+]
+
+MIDDLEWARE = [
+    # Remove themselves unless REQUEST_TRACING and METRICS are enabled
+    'core.utils.tracing.RequestTracingMiddleware',
+    'core.utils.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    # Validates the Host header against ALLOWED_HOSTS
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'core.urls_api'
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_AUTHENTICATION_CLASSES": ("core.utils.custom_authentication.APIKeyAuthentication",),
+    "DEFAULT_RENDERER_CLASSES": ("core.base.renderers.FastJSONRenderer",),
+}
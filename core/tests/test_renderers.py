@@ -0,0 +1,152 @@
+import dataclasses
+import datetime
+import decimal
+import uuid
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.base.renderers import Envelope, FastJSONRenderer, PreEncodedDict
+from national_ids.services import extract_national_id, extract_national_ids
+from users.models import APIKey, APIUsage, User
+
+
+def envelope(success, payload, message='Operation completed successfully'):
+    return Envelope({
+        'success': success,
+        'message': message,
+        'data': payload if success else None,
+        'errors': None if success else payload,
+    })
+
+
+class TestFastJSONRenderer(TestCase):
+    """Every body must be the bytes DRF's JSONRenderer would have written."""
+
+    def assert_identical(self, data, accepted_media_type=None, renderer_context=None):
+        expected = JSONRenderer().render(data, accepted_media_type, renderer_context)
+        assert FastJSONRenderer().render(data, accepted_media_type, renderer_context) == expected
+
+    def test_extraction_results(self):
+        result = extract_national_id('29001010123456')
+        self.assert_identical(result)
+        self.assert_identical(envelope(True, result))
+        self.assert_identical(envelope(True, {'results': extract_national_ids(['29001010123456', '123'])}))
+        assert (True, 'Operation completed successfully') in FastJSONRenderer._heads
+
+    def test_error_envelopes(self):
+        errors = {'national_id': [ErrorDetail('Invalid national ID format', code='invalid')]}
+        self.assert_identical(envelope(False, errors, message='ID validation failed'))
+        self.assert_identical(envelope(False, {'detail': ErrorDetail('Request was throttled.')}))
+
+    def test_pre_encoded_payload(self):
+        payload = PreEncodedDict({'success': False, 'message': 'Insufficient tokens', 'data': None, 'errors': []})
+        self.assert_identical(envelope(False, payload))
+        self.assert_identical(envelope(False, payload))
+        assert payload.encoded == JSONRenderer().render(dict(payload))
+
+    def test_datetimes(self):
+        moment = datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc)
+        self.assert_identical({
+            'utc': moment,
+            'cairo': moment.astimezone(ZoneInfo('Africa/Cairo')),
+            'naive': moment.replace(tzinfo=None, microsecond=0),
+            'date': moment.date(),
+            'time': moment.time(),
+            'duration': datetime.timedelta(hours=1, microseconds=5),
+        })
+
+    def test_floats(self):
+        values = [0.1, 1.5, -0.0, 1e15, 1e16, 1e-4, 9.9e-5, 2.5e-7, 1.7976931348623157e308, 12345.678]
+        self.assert_identical({'values': values})
+        for value in values:
+            self.assert_identical(envelope(True, {'value': value}))
+
+    def test_non_finite_floats(self):
+        for value in (float('nan'), float('inf'), -float('inf'), np.float64('nan'), decimal.Decimal('NaN')):
+            for data in ({'value': value}, envelope(True, {'values': [None, value]})):
+                with pytest.raises(ValueError):
+                    JSONRenderer().render(data)
+                with pytest.raises(ValueError):
+                    FastJSONRenderer().render(data)
+
+        class Lenient(FastJSONRenderer):
+            strict = False
+
+        data = envelope(True, {'values': [None, float('nan'), float('inf')]})
+        assert Lenient().render(data) == JSONRenderer.render(Lenient(), data)
+        assert b'NaN,Infinity' in Lenient().render(data)
+
+    def test_strings(self):
+        self.assert_identical({'text': 'محافظة القاهرة \t \n \x00 \x1f \x7f " \\ \U0001f600'})
+        self.assert_identical(envelope(True, {'text': 'line\u2028separator'}, message='quoted "\u2029"'))
+
+    def test_other_types(self):
+        @dataclasses.dataclass
+        class Point:
+            x: int
+
+        self.assert_identical({
+            'big': 2 ** 70,
+            'keys': {1: 'one', True: 'yes', None: 'none'},
+            'decimal': decimal.Decimal('1.25'),
+            'uuid': uuid.UUID(int=1),
+            'lazy': gettext_lazy('Operation failed'),
+            'array': np.arange(3),
+            'scalar': np.int64(7),
+            'tuple': (1, 2),
+            'nested': [[{}], []],
+        })
+        with pytest.raises(TypeError):
+            FastJSONRenderer().render({'point': Point(1)})
+
+    def test_indent_and_empty(self):
+        data = envelope(True, extract_national_id('29001010123456'))
+        self.assert_identical(data, 'application/json; indent=4')
+        self.assert_identical(data, renderer_context={'indent': 2})
+        assert FastJSONRenderer().render(None) == b''
+
+
+@pytest.mark.django_db
+class TestRenderedResponses(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=2
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+
+    def assert_rendered_by_drf(self, response):
+        assert response.content == JSONRenderer().render(response.data)
+
+    def test_extract(self):
+        url = reverse('national_ids:extract-egyptian-id')
+        self.assert_rendered_by_drf(self.client.post(url, {'national_id': '29001010123456'}, format='json'))
+        self.assert_rendered_by_drf(self.client.post(url, {'national_id': '123'}, format='json'))
+
+    def test_batch_and_insufficient_tokens(self):
+        url = reverse('national_ids:extract-egyptian-id-batch')
+        ids = ['29001010123456', '123', '30101011234567']
+        self.assert_rendered_by_drf(self.client.post(url, {'national_ids': ids[:2]}, format='json'))
+
+        response = self.client.post(url, {'national_ids': ids}, format='json')
+        assert response.status_code == 402
+        self.assert_rendered_by_drf(response)
+
+    def test_usage_history(self):
+        self.client.post(reverse('national_ids:extract-egyptian-id'), {'national_id': '29001010123456'}, format='json')
+        assert APIUsage.objects.exists()
+
+        self.assert_rendered_by_drf(self.client.get(reverse('users:usage-list')))
@@ -0,0 +1,72 @@
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import settings as full_settings
+from core import settings_api
+from users.models import APIKey, User
+
+API_PROFILE = {
+    'MIDDLEWARE': settings_api.MIDDLEWARE,
+    'ROOT_URLCONF': settings_api.ROOT_URLCONF,
+}
+
+
+class TestAPISettingsProfile(TestCase):
+
+    def test_system_checks_pass(self):
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'check', '--settings=core.settings_api'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        assert result.returncode == 0, result.stderr
+
+    def test_only_api_apps_and_middleware(self):
+        assert 'django.contrib.admin' not in settings_api.INSTALLED_APPS
+        assert 'django.contrib.sessions' not in settings_api.INSTALLED_APPS
+        assert not any('csrf' in name or 'sessions' in name for name in settings_api.MIDDLEWARE)
+        assert set(settings_api.INSTALLED_APPS) <= set(full_settings.INSTALLED_APPS)
+
+
+@pytest.mark.django_db
+@override_settings(**API_PROFILE)
+class TestAPIProfileRequests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=100
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+
+    def test_extract(self):
+        response = self.client.post(
+            reverse('national_ids:extract-egyptian-id'), {'national_id': '29001010123456'}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['data']['governorate'] == 'Cairo'
+        assert 'X-Frame-Options' not in response
+        assert not response.cookies
+
+    def test_same_body_as_full_profile(self):
+        url = reverse('national_ids:extract-egyptian-id-batch')
+        payload = {'national_ids': ['29001010123456', '123']}
+        api_response = self.client.post(url, payload, format='json')
+        with override_settings(MIDDLEWARE=full_settings.MIDDLEWARE, ROOT_URLCONF=full_settings.ROOT_URLCONF):
+            full_response = self.client.post(url, payload, format='json')
+
+        assert api_response.content == full_response.content
+
+    def test_no_admin(self):
+        assert self.client.get('/admin/').status_code == status.HTTP_404_NOT_FOUND
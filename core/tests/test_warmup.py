@@ -0,0 +1,88 @@
+import importlib
+import pytest
+from unittest.mock import patch
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.warmup import shutdown_worker, warm_up, warm_up_worker
+from users.leasing import get_lease_pool
+from users.models import APIKey, APIUsage, TokenLease, User
+from users.usage import UsageEvent, get_usage_sink
+
+BUFFERED = {
+    'SINK': 'buffered',
+    'BUFFER_SIZE': 500,
+    'FLUSH_INTERVAL': 60,
+    'MAX_PENDING': 1000,
+    'JSONL_DIR': '',
+    'JSONL_MAX_BYTES': 0,
+}
+LEASING = {'ENABLED': True, 'MIN_SIZE': 10, 'MAX_SIZE': 100, 'TARGET_SECONDS': 2.0, 'TTL': 30, 'CHECKPOINT_INTERVAL': 1.0}
+
+
+@pytest.mark.django_db
+class TestWarmUp(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=25
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+
+    def test_importing_the_application_does_not_warm_up(self):
+        with patch('core.warmup.warm_up') as warm_up:
+            for module in ('core.wsgi', 'core.asgi'):
+                importlib.reload(importlib.import_module(module))
+        warm_up.assert_not_called()
+
+    def test_warm_up_closes_connections_before_fork(self):
+        with patch('core.warmup.connections.close_all') as close_all:
+            warm_up()
+        close_all.assert_called_once()
+
+    @override_settings(API_KEY_CACHE={
+        'TTL': 60, 'MAXSIZE': 100, 'SHARED_CACHE_ALIAS': None, 'SYNC_INTERVAL': 1.0, 'WARM_UP': True,
+    })
+    def test_warm_up_caches_api_keys(self):
+        from core.utils.api_key_cache import get_api_key_cache
+
+        with patch('core.warmup.connections.close_all'):
+            warm_up()
+        assert get_api_key_cache().get(self.api_key.key_hash) is not None
+
+    def test_warm_up_worker_opens_persistent_connections(self):
+        with patch.dict(connection.settings_dict, CONN_MAX_AGE=60):
+            with patch.object(connection, 'ensure_connection') as ensure_connection:
+                warm_up_worker()
+        ensure_connection.assert_called_once()
+
+    def test_warm_up_worker_skips_per_request_connections(self):
+        with patch.dict(connection.settings_dict, CONN_MAX_AGE=0):
+            with patch.object(connection, 'ensure_connection') as ensure_connection:
+                warm_up_worker()
+        ensure_connection.assert_not_called()
+
+    @override_settings(API_USAGE_LOGGING=BUFFERED, TOKEN_LEASING=LEASING)
+    def test_shutdown_flushes_usage_and_returns_leases(self):
+        get_usage_sink().record(UsageEvent(
+            api_key_id=self.api_key.pk,
+            ip_address='127.0.0.1',
+            user_agent='TestAgent/1.0',
+            tokens_used=1,
+            response_status='200',
+            created_at=timezone.now(),
+        ))
+        get_lease_pool().charge(self.user.pk, 1)
+
+        with patch('core.warmup.connections.close_all'):
+            shutdown_worker()
+            shutdown_worker()
+
+        self.user.refresh_from_db()
+        assert APIUsage.objects.count() == 1
+        assert self.user.tokens_balance == 24
+        assert not TokenLease.objects.exists()
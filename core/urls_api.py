@@ -0,0 +1,13 @@
+"""
+URL configuration of API workers (core.settings_api): the API endpoints and
+metrics of core.urls without the admin.
+"""
+from django.urls import path, include
+
+from core.utils.metrics import metrics_view
+
+urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
+    path('api/v1/national-ids/', include('national_ids.urls')),
+    path('api/v1/users/', include('users.urls')),
+]
@@ -0,0 +1,200 @@
+"""
+Per-process cache of authenticated API keys.
+
+Entries map a key hash to its (user, APIKey) pair for a bounded TTL, so a revoked key
+stops working within API_KEY_CACHE['TTL'] seconds at worst. Saves and deletes of keys
+and users invalidate the affected entries locally and bump a generation counter in a
+shared Django cache, which every worker checks at most every SYNC_INTERVAL seconds.
+
+Rejected key hashes are remembered for NEGATIVE_TTL seconds, so a client retrying a
+wrong or revoked key is refused without querying the database each time.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.utils.caching import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class APIKeyCache:
+    generation_key = 'auth:api_keys:generation'
+
+    def __init__(
+        self,
+        ttl: float,
+        maxsize: int,
+        shared_alias: Optional[str] = None,
+        sync_interval: float = 1.0,
+        negative_ttl: float = 0,
+        negative_maxsize: int = 0,
+    ):
+        self.enabled = ttl > 0 and maxsize > 0
+        # _keys_by_user follows the entries, so it never outgrows them
+        self.entries = LRUCache(maxsize, ttl, on_remove=self._unindex)
+        self.negative_enabled = negative_ttl > 0 and negative_maxsize > 0
+        self.rejected = LRUCache(negative_maxsize, negative_ttl)
+        self.shared_alias = shared_alias
+        self.sync_interval = sync_interval
+        self._keys_by_user: Dict[Any, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._generation = None
+        self._next_sync = 0.0
+
+    @classmethod
+    def from_settings(cls) -> 'APIKeyCache':
+        config = settings.API_KEY_CACHE
+        return cls(
+            ttl=config['TTL'],
+            maxsize=config['MAXSIZE'],
+            shared_alias=config['SHARED_CACHE_ALIAS'],
+            sync_interval=config['SYNC_INTERVAL'],
+            negative_ttl=config.get('NEGATIVE_TTL', 0),
+            negative_maxsize=config.get('NEGATIVE_MAXSIZE', 0),
+        )
+
+    def get(self, key_hash: str) -> Optional[Tuple[Any, Any]]:
+        """Return a private copy of the cached (user, api_key) pair, or None."""
+        if not self.enabled:
+            return None
+        self._sync()
+        entry = self.entries.get(key_hash)
+        if entry is None:
+            return None
+        user, api_key = entry
+        if api_key.expires_at is not None and api_key.expires_at < timezone.now():
+            self.entries.delete(key_hash)
+            return None
+        return self._copy(user, api_key)
+
+    def set(self, key_hash: str, user: Any, api_key: Any) -> None:
+        if not self.enabled:
+            return
+        user, api_key = self._copy(user, api_key)
+        self.entries.set(key_hash, (user, api_key))
+        # Indexed after the entry is stored, so a concurrent removal can only leave a stale hash behind
+        with self._lock:
+            self._keys_by_user[user.pk].add(key_hash)
+
+    def is_rejected(self, key_hash: str) -> bool:
+        """Whether the key hash was recently rejected and should be refused without a query."""
+        if not self.negative_enabled:
+            return False
+        self._sync()
+        return self.rejected.get(key_hash) is not None
+
+    def reject(self, key_hash: str) -> None:
+        if self.negative_enabled:
+            self.rejected.set(key_hash, True)
+
+    def discard_rejection(self, key_hash: str) -> None:
+        self.rejected.delete(key_hash)
+
+    def invalidate_key(self, key_hash: str) -> None:
+        self.entries.delete(key_hash)
+        self.rejected.delete(key_hash)
+        self._publish()
+
+    def invalidate_user(self, user_id: Any) -> None:
+        with self._lock:
+            key_hashes = self._keys_by_user.pop(user_id, set())
+        for key_hash in key_hashes:
+            self.entries.delete(key_hash)
+        self._publish()
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.rejected.clear()
+        with self._lock:
+            self._keys_by_user.clear()
+
+    def warm_up(self) -> int:
+        """Preload active, unexpired keys so the first requests of a worker skip the database."""
+        if not self.enabled:
+            return 0
+        from users.models import APIKey
+
+        api_keys = APIKey.objects.select_related('user').active()[:self.entries.maxsize]
+        count = 0
+        for api_key in api_keys:
+            self.set(api_key.key_hash, api_key.user, api_key)
+            count += 1
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'keys': self.entries.stats(),
+            'rejected': self.rejected.stats(),
+        }
+
+    def _copy(self, user: Any, api_key: Any) -> Tuple[Any, Any]:
+        # Requests mutate these instances (e.g. token balances), so never hand out the cached ones
+        user = copy.copy(user)
+        api_key = copy.copy(api_key)
+        api_key.user = user
+        return user, api_key
+
+    def _unindex(self, key_hash: str, entry: Tuple[Any, Any]) -> None:
+        user_id = entry[0].pk
+        with self._lock:
+            key_hashes = self._keys_by_user.get(user_id)
+            if key_hashes is not None:
+                key_hashes.discard(key_hash)
+                if not key_hashes:
+                    del self._keys_by_user[user_id]
+
+    def _sync(self) -> None:
+        """Drop every local entry when another worker has published an invalidation."""
+        if self.shared_alias is None or time.monotonic() < self._next_sync:
+            return
+        self._next_sync = time.monotonic() + self.sync_interval
+        try:
+            generation = caches[self.shared_alias].get(self.generation_key, 0)
+        except Exception as e:
+            logger.error(f"Failed to read API key cache generation: {e}")
+            return
+        if generation != self._generation:
+            if self._generation is not None:
+                self.clear()
+            self._generation = generation
+
+    def _publish(self) -> None:
+        if self.shared_alias is None:
+            return
+        shared = caches[self.shared_alias]
+        try:
+            try:
+                shared.incr(self.generation_key)
+            except ValueError:
+                if not shared.add(self.generation_key, 1, None):
+                    shared.incr(self.generation_key)
+        except Exception as e:
+            logger.error(f"Failed to publish API key cache invalidation: {e}")
+
+
+_api_key_cache: Optional[APIKeyCache] = None
+
+
+def get_api_key_cache() -> APIKeyCache:
+    """Return the process-wide API key cache, configured from settings on first use."""
+    global _api_key_cache
+    if _api_key_cache is None:
+        _api_key_cache = APIKeyCache.from_settings()
+    return _api_key_cache
+
+
+@receiver(setting_changed)
+def _reset_api_key_cache(setting, **kwargs):
+    global _api_key_cache
+    if setting == 'API_KEY_CACHE':
+        _api_key_cache = None
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a max size, a per-entry TTL and hit/miss counters.
+    `on_remove(key, value)` is called, outside the lock, for every entry that expires,
+    is evicted or deleted.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        on_remove: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_remove = on_remove
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if not expires_at or time.monotonic() < expires_at:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+        if self.on_remove is not None:
+            self.on_remove(key, value)
+        return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        evicted: List[Tuple[Hashable, Any]] = []
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted_key, (evicted_value, _) = self._data.popitem(last=False)
+                evicted.append((evicted_key, evicted_value))
+                self.evictions += 1
+        if self.on_remove is not None:
+            for evicted_key, evicted_value in evicted:
+                self.on_remove(evicted_key, evicted_value)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        if entry is not _MISSING and self.on_remove is not None:
+            self.on_remove(key, entry[0])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -1,24 +1,57 @@
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from users.models import APIKey
-from django.utils import timezone
-from django.db.models import Q
+from core.utils.api_key_cache import get_api_key_cache
+from core.utils.metrics import CACHE_LOOKUPS
+from core.utils.tracing import stage
 
 class APIKeyAuthentication(BaseAuthentication):
     def authenticate(self, request):
+        with stage('auth'):
+            hashed_key, cached = self._lookup_cached(request)
+            if cached is not None:
+                return cached
+
+            try:
+                api_key_obj = APIKey.objects.select_related('user').active().get(key_hash=hashed_key)
+            except APIKey.DoesNotExist:
+                self._reject(hashed_key)
+
+            return self._remember(hashed_key, api_key_obj)
+
+    async def aauthenticate(self, request):
+        """Same as authenticate, with the database lookup on the async ORM."""
+        with stage('auth'):
+            hashed_key, cached = self._lookup_cached(request)
+            if cached is not None:
+                return cached
+
+            try:
+                api_key_obj = await APIKey.objects.select_related('user').active().aget(key_hash=hashed_key)
+            except APIKey.DoesNotExist:
+                self._reject(hashed_key)
+
+            return self._remember(hashed_key, api_key_obj)
+
+    def _lookup_cached(self, request):
         api_key = request.headers.get('X-API-Key')
         if not api_key:
             raise AuthenticationFailed('No API key provided')
 
         hashed_key = APIKey.hash_key(api_key)
-        
-        try:
-            api_key_obj = APIKey.objects.select_related('user').get(
-                Q(key_hash=hashed_key) &
-                Q(is_active=True) &
-                (Q(expires_at__gte=timezone.now()) | Q(expires_at__isnull=True))
-            )
-        except APIKey.DoesNotExist:
+
+        key_cache = get_api_key_cache()
+        cached = key_cache.get(hashed_key)
+        if key_cache.enabled:
+            CACHE_LOOKUPS.labels('api_key', 'miss' if cached is None else 'hit').inc()
+        if cached is None and key_cache.is_rejected(hashed_key):
             raise AuthenticationFailed('Invalid or inactive API key')
+        return hashed_key, cached
+
+    def _reject(self, hashed_key):
+        get_api_key_cache().reject(hashed_key)
+        raise AuthenticationFailed('Invalid or inactive API key')
 
+    def _remember(self, hashed_key, api_key_obj):
+        get_api_key_cache().set(hashed_key, api_key_obj.user, api_key_obj)
         return (api_key_obj.user, api_key_obj)
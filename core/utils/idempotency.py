@@ -0,0 +1,225 @@
+"""
+Idempotency keys for retry-safe extraction and billing.
+
+A client sends an `Idempotency-Key` header (1 to 255 characters) and reuses it
+when it retries. The first response for each key and user is kept in one of
+Django's CACHES for IDEMPOTENCY['TTL'] seconds, and retries get it back, with an
+`Idempotent-Replayed: true` header, without extracting, charging or logging again.
+
+The first request claims its key with an atomic cache add(). A duplicate arriving
+while it runs polls for its response until the claim is released, for up to
+IDEMPOTENCY['WAIT_TIMEOUT'] seconds in async views and SYNC_WAIT_TIMEOUT seconds in
+sync ones, where the wait holds a worker, then gets a 409 with `Retry-After`.
+A key reused for another endpoint or payload gets a 422.
+Only successes and rejected payloads (400) are kept: a 402 or 429 depends on the
+balance or rate limit of the moment and a server error may be transient, so
+retrying those runs the request again.
+
+Keys are only shared between workers when CACHE_ALIAS is a shared cache (Redis,
+Memcached...), Django's default local-memory cache keeps them per process.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from core.utils.metrics import CACHE_LOOKUPS
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Seconds a duplicate that gave up waiting is told to wait before retrying
+RETRY_AFTER = 1
+# Error responses a retry would get again, as well as every 2xx
+REPLAYABLE_ERRORS = frozenset({status.HTTP_400_BAD_REQUEST})
+
+# (request fingerprint, status code, response data)
+StoredResponse = Tuple[str, int, Any]
+
+
+def _error(message: str, status_code: int, headers=None) -> Response:
+    return Response([{'field': HEADER, 'message': message}], status=status_code, headers=headers)
+
+
+def _replayable(status_code: int) -> bool:
+    return 200 <= status_code < 300 or status_code in REPLAYABLE_ERRORS
+
+
+class IdempotencyStore:
+    """First responses per (user, key) in a Django cache, with a claim per key while it runs."""
+    key_prefix = 'idempotency'
+    poll_interval = 0.05
+
+    def __init__(
+        self,
+        alias: str = 'default',
+        ttl: float = 86400,
+        lock_ttl: float = 60,
+        wait_timeout: float = 10,
+        sync_wait_timeout: float = 1,
+    ):
+        self.alias = alias
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.sync_wait_timeout = sync_wait_timeout
+
+    @classmethod
+    def from_settings(cls) -> 'IdempotencyStore':
+        config = settings.IDEMPOTENCY
+        return cls(
+            alias=config['CACHE_ALIAS'],
+            ttl=config['TTL'],
+            lock_ttl=config['LOCK_TTL'],
+            wait_timeout=config['WAIT_TIMEOUT'],
+            sync_wait_timeout=config['SYNC_WAIT_TIMEOUT'],
+        )
+
+    def run(self, request: Request, handler: Callable[[], Response]) -> Response:
+        """The handler's response, or the stored one when the request carries a key already answered."""
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler()
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            return _error(f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters", status.HTTP_400_BAD_REQUEST)
+
+        response_key, lock_key = self._keys(request, key)
+        fingerprint = self._fingerprint(request)
+        deadline = time.monotonic() + self.sync_wait_timeout
+        while True:
+            stored, claimed = self._claim(response_key, lock_key, fingerprint)
+            if claimed:
+                break
+            if stored is not None:
+                return self._replay(stored, fingerprint)
+            if time.monotonic() >= deadline:
+                return self._in_progress()
+            time.sleep(self.poll_interval)
+
+        CACHE_LOOKUPS.labels('idempotency', 'miss').inc()
+        cache = caches[self.alias]
+        try:
+            response = handler()
+            if _replayable(response.status_code):
+                cache.set(response_key, (fingerprint, response.status_code, response.data), self.ttl)
+        finally:
+            cache.delete(lock_key)
+        return response
+
+    async def arun(self, request: Request, handler: Callable[[], Awaitable[Response]]) -> Response:
+        """Same as run() for async handlers, the cache calls and the wait do not block the event loop."""
+        key = request.headers.get(HEADER)
+        if key is None:
+            return await handler()
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            return _error(f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters", status.HTTP_400_BAD_REQUEST)
+
+        response_key, lock_key = self._keys(request, key)
+        fingerprint = self._fingerprint(request)
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            # Django's async cache methods are each a thread hop, so claim in one
+            stored, claimed = await sync_to_async(self._claim, thread_sensitive=False)(
+                response_key, lock_key, fingerprint
+            )
+            if claimed:
+                break
+            if stored is not None:
+                return self._replay(stored, fingerprint)
+            if time.monotonic() >= deadline:
+                return self._in_progress()
+            await asyncio.sleep(self.poll_interval)
+
+        CACHE_LOOKUPS.labels('idempotency', 'miss').inc()
+        cache = caches[self.alias]
+        try:
+            response = await handler()
+            if _replayable(response.status_code):
+                await cache.aset(response_key, (fingerprint, response.status_code, response.data), self.ttl)
+        finally:
+            await cache.adelete(lock_key)
+        return response
+
+    def _claim(self, response_key: str, lock_key: str, fingerprint: str) -> Tuple[Optional[StoredResponse], bool]:
+        """
+        (stored response, False) when answered, (None, True) when claimed, (None, False)
+        when in progress. A claim released without a stored response (a 402, 429 or
+        server error) is claimed again, so that request runs again.
+        """
+        cache = caches[self.alias]
+        stored = cache.get(response_key)
+        if stored is None and cache.add(lock_key, fingerprint, self.lock_ttl):
+            # The first request may have finished between the two calls
+            stored = cache.get(response_key)
+            if stored is None:
+                return None, True
+            cache.delete(lock_key)
+        return stored, False
+
+    def _keys(self, request: Request, key: str) -> Tuple[str, str]:
+        # Hashed so any header value makes a valid key for every cache backend
+        digest = hashlib.sha256(f"{request.user.pk}:{key}".encode()).hexdigest()
+        return f"{self.key_prefix}:{digest}", f"{self.key_prefix}:{digest}:lock"
+
+    def _fingerprint(self, request: Request) -> str:
+        payload = json.dumps(request.data, sort_keys=True, default=str)
+        return hashlib.sha256(f"{request.method}:{request.path}:{payload}".encode()).hexdigest()
+
+    def _replay(self, stored: StoredResponse, fingerprint: str) -> Response:
+        stored_fingerprint, status_code, data = stored
+        if stored_fingerprint != fingerprint:
+            return _error(
+                f"{HEADER} was already used for another request", status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        CACHE_LOOKUPS.labels('idempotency', 'hit').inc()
+        return Response(data, status=status_code, headers={REPLAYED_HEADER: 'true'})
+
+    def _in_progress(self) -> Response:
+        return _error(
+            f"A request with this {HEADER} is still being processed",
+            status.HTTP_409_CONFLICT,
+            headers={'Retry-After': str(RETRY_AFTER)},
+        )
+
+
+def idempotent(post):
+    """Answer retries of a view's sync or async post() from the idempotency store."""
+    if asyncio.iscoroutinefunction(post):
+        @functools.wraps(post)
+        async def async_wrapper(view, request, *args, **kwargs):
+            return await get_idempotency_store().arun(request, lambda: post(view, request, *args, **kwargs))
+        return async_wrapper
+
+    @functools.wraps(post)
+    def wrapper(view, request, *args, **kwargs):
+        return get_idempotency_store().run(request, lambda: post(view, request, *args, **kwargs))
+    return wrapper
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """Return the process-wide idempotency store, configured from settings on first use."""
+    global _store
+    if _store is None:
+        _store = IdempotencyStore.from_settings()
+    return _store
+
+
+@receiver(setting_changed)
+def _reset_idempotency_store(setting, **kwargs):
+    global _store
+    if setting == 'IDEMPOTENCY':
+        _store = None
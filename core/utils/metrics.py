@@ -0,0 +1,144 @@
+"""
+Prometheus metrics with prometheus_client, exported in the text format at /metrics.
+
+Backends, picked by METRICS['BACKEND']:
+
+- ``local``: prometheus_client's default registry, a scrape only sees the process
+  that answers it
+- ``multiprocess``: prometheus_client's multiprocess mode, every process writes its
+  samples to files in the PROMETHEUS_MULTIPROC_DIR directory and a scrape sums the
+  files of all processes, so it covers every preforked worker whichever one answers.
+  The variable must be set in the environment before the process starts, see
+  compose/django/gunicorn.conf.py for clearing the directory and dead workers
+
+Stage latencies come from the stages of core.utils.tracing: when request tracing is
+disabled, MetricsMiddleware times the stages of each request itself.
+"""
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+from core.utils.tracing import Trace, _current_trace
+
+# Seconds, for requests answered in well under a millisecond up to slow batches
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+
+REQUESTS = Counter(
+    'nid_requests_total', 'Requests by endpoint, response status and API key tier', ('endpoint', 'status', 'tier')
+)
+REQUEST_SECONDS = Histogram(
+    'nid_request_duration_seconds', 'Request latency by endpoint', ('endpoint',), buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    'nid_request_stage_duration_seconds', 'Time spent in each stage of a request', ('stage',), buckets=STAGE_BUCKETS
+)
+TOKEN_DEDUCTION_FAILURES = Counter(
+    'nid_token_deduction_failures_total', 'Token charges refused for an insufficient balance', ('mode',)
+)
+USAGE_WRITE_SECONDS = Histogram(
+    'nid_usage_write_duration_seconds', 'Time to write usage events, by usage sink', ('sink',), buckets=STAGE_BUCKETS
+)
+THROTTLE_CHECKS = Counter('nid_throttle_checks_total', 'Rate limit checks by result', ('result',))
+CACHE_LOOKUPS = Counter('nid_cache_lookups_total', 'Cache lookups by cache and result', ('cache', 'result'))
+
+
+def api_key_tier(request) -> str:
+    """
+    Tier of the request's API key: ``staff`` or ``standard`` by its owner, and
+    ``anonymous`` when no key was authenticated. Request.auth is the APIKey, set by
+    DRF and by the lean view.
+    """
+    api_key = getattr(request, 'auth', None)
+    user = getattr(api_key, 'user', None)
+    if user is None:
+        return 'anonymous'
+    return 'staff' if user.is_staff else 'standard'
+
+
+def get_registry() -> CollectorRegistry:
+    """The registry a scrape exports for METRICS['BACKEND']."""
+    backend = settings.METRICS['BACKEND']
+    if backend == 'local':
+        return REGISTRY
+    if backend == 'multiprocess':
+        if not os.path.isdir(os.environ.get('PROMETHEUS_MULTIPROC_DIR', '')):
+            raise ImproperlyConfigured(
+                "The multiprocess metrics backend needs PROMETHEUS_MULTIPROC_DIR set to a directory "
+                "before the process starts"
+            )
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    raise ImproperlyConfigured(f"Unknown metrics backend: {backend}")
+
+
+@require_GET
+def metrics_view(request):
+    if not settings.METRICS['ENABLED']:
+        raise Http404
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Count and time every request, see module docstring."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS['ENABLED']:
+            raise MiddlewareNotUsed
+        # Fail on startup rather than on the first scrape
+        get_registry()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        trace = _current_trace.get()
+        if trace is not None:
+            response = self.get_response(request)
+        else:
+            trace = Trace()
+            token = _current_trace.set(trace)
+            try:
+                response = self.get_response(request)
+            finally:
+                _current_trace.reset(token)
+        self._observe(request, response, trace, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        trace = _current_trace.get()
+        if trace is not None:
+            response = await self.get_response(request)
+        else:
+            trace = Trace()
+            token = _current_trace.set(trace)
+            try:
+                response = await self.get_response(request)
+            finally:
+                _current_trace.reset(token)
+        self._observe(request, response, trace, time.perf_counter() - start)
+        return response
+
+    def _observe(self, request, response, trace: Trace, seconds: float) -> None:
+        match = request.resolver_match
+        endpoint = match.view_name if match is not None else 'unmatched'
+        REQUESTS.labels(endpoint, str(response.status_code), api_key_tier(request)).inc()
+        REQUEST_SECONDS.labels(endpoint).observe(seconds)
+        for span in trace.spans:
+            STAGE_SECONDS.labels(span.name).observe(span.end - span.start)
@@ -0,0 +1,225 @@
+"""
+Rate limiter with constant state per key.
+
+Backends, picked by RATE_LIMITING['BACKEND']:
+
+- ``cache``: sliding-window counter in one of Django's CACHES, two integers per key
+  updated with atomic incr(), so every node sharing the cache shares the limit
+- ``mmap``: GCRA over a fixed-size table in a memory-mapped file, so every worker
+  on one host shares the limit without a network round trip
+- ``local``: GCRA in a dict, limits are per worker process
+
+GCRA keeps a single "theoretical arrival time" per key: each request pushes it
+`period / limit` seconds ahead, and a request is refused when that would put it
+more than `period` ahead of now. Bursts of up to `limit` requests are allowed.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+def gcra(tat: float, now: float, limit: int, period: float):
+    """Return (new_tat, wait). A wait of 0 means the request is allowed and new_tat must be stored."""
+    interval = period / limit
+    new_tat = max(tat, now) + interval
+    if new_tat - now > period:
+        return tat, new_tat - now - period
+    return new_tat, 0.0
+
+
+class LocalRateLimitBackend:
+    """GCRA state in this process only."""
+    max_keys = 100_000
+
+    def __init__(self):
+        self._tats: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, period: float, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        with self._lock:
+            tat, wait = gcra(self._tats.get(key, 0.0), now, limit, period)
+            if not wait:
+                self._tats[key] = tat
+                if len(self._tats) > self.max_keys:
+                    # A key whose arrival time has passed is the same as an unknown one
+                    self._tats = {k: v for k, v in self._tats.items() if v > now}
+        return wait
+
+    async def ahit(self, key: str, limit: int, period: float, now: Optional[float] = None) -> float:
+        return self.hit(key, limit, period, now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tats.clear()
+
+
+class MmapRateLimitBackend:
+    """
+    GCRA state shared by every process on the host through a memory-mapped file.
+
+    The file is an open-addressing table of `slots` entries of (key fingerprint,
+    arrival time). A key probes `probes` consecutive slots; when they are all taken
+    by other keys, the one with the oldest arrival time is reused. Probe ranges are
+    locked with fcntl byte-range locks across processes and a thread lock within one.
+    """
+    slot = struct.Struct('<Qd')
+    probes = 8
+
+    def __init__(self, path: str, slots: int = 65536):
+        if fcntl is None:
+            raise RuntimeError("The mmap rate limit backend needs fcntl (Unix only)")
+        self.path = path
+        self.slots = slots
+        self.size = slots * self.slot.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            self._map = mmap.mmap(fd, self.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, period: float, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        fingerprint = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        first = fingerprint % self.slots
+        indexes = [(first + i) % self.slots for i in range(self.probes)]
+
+        with self._lock:
+            self._lock_range(first, fcntl.LOCK_EX)
+            try:
+                target, tat = None, 0.0
+                oldest, oldest_tat = indexes[0], float('inf')
+                for index in indexes:
+                    stored, stored_tat = self.slot.unpack_from(self._map, index * self.slot.size)
+                    if stored == fingerprint:
+                        target, tat = index, stored_tat
+                        break
+                    if stored_tat < oldest_tat:
+                        oldest, oldest_tat = index, stored_tat
+                if target is None:
+                    target = oldest
+
+                tat, wait = gcra(tat, now, limit, period)
+                if not wait:
+                    self.slot.pack_into(self._map, target * self.slot.size, fingerprint, tat)
+            finally:
+                self._lock_range(first, fcntl.LOCK_UN)
+        return wait
+
+    async def ahit(self, key: str, limit: int, period: float, now: Optional[float] = None) -> float:
+        # Only contends with other workers for microseconds, so it runs on the event loop
+        return self.hit(key, limit, period, now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._map[:] = bytes(self.size)
+
+    def _lock_range(self, first: int, operation: int) -> None:
+        # A probe range that wraps around locks to the end of the file and from the start
+        end = first + self.probes
+        fcntl.lockf(self._fd, operation, (min(end, self.slots) - first) * self.slot.size, first * self.slot.size)
+        if end > self.slots:
+            fcntl.lockf(self._fd, operation, (end - self.slots) * self.slot.size, 0)
+
+
+class CacheRateLimitBackend:
+    """
+    Sliding-window counter in a Django cache. The previous window's count is
+    weighted by how much of it still overlaps the sliding window.
+    """
+    key_prefix = 'ratelimit'
+
+    def __init__(self, alias: str = 'default'):
+        self.alias = alias
+
+    def hit(self, key: str, limit: int, period: float, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        cache = caches[self.alias]
+        window = int(now // period)
+        current_key = f"{self.key_prefix}:{key}:{window}"
+        previous = cache.get(f"{self.key_prefix}:{key}:{window - 1}", 0)
+
+        # Count first and undo a refused request, so concurrent workers never overshoot
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            if cache.add(current_key, 1, int(period * 2) + 1):
+                current = 1
+            else:
+                current = cache.incr(current_key)
+
+        elapsed = now - window * period
+        weight = 1 - elapsed / period
+        if previous * weight + current <= limit:
+            return 0.0
+
+        cache.decr(current_key)
+        if previous:
+            # Time until enough of the previous window slides out to fit this request
+            excess = previous * weight + current - limit
+            return min(excess * period / previous, period - elapsed)
+        return period - elapsed
+
+    async def ahit(self, key: str, limit: int, period: float, now: Optional[float] = None) -> float:
+        # Django's async cache methods are each a thread hop, so do all three calls in one
+        return await sync_to_async(self.hit, thread_sensitive=False)(key, limit, period, now)
+
+    def clear(self) -> None:
+        caches[self.alias].clear()
+
+
+def build_rate_limit_backend():
+    config = settings.RATE_LIMITING
+    backend = config['BACKEND']
+    if backend == 'cache':
+        return CacheRateLimitBackend(config['CACHE_ALIAS'])
+    if backend == 'mmap':
+        return MmapRateLimitBackend(config['MMAP_PATH'], config['MMAP_SLOTS'])
+    if backend == 'local':
+        return LocalRateLimitBackend()
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+_backend = None
+_backend_pid: Optional[int] = None
+_backend_lock = threading.Lock()
+
+
+def get_rate_limit_backend():
+    """Return this process's rate limit backend, configured from settings on first use."""
+    global _backend, _backend_pid
+    backend = _backend
+    if backend is None or _backend_pid != os.getpid():
+        with _backend_lock:
+            if _backend is None or _backend_pid != os.getpid():
+                _backend = build_rate_limit_backend()
+                _backend_pid = os.getpid()
+            backend = _backend
+    return backend
+
+
+@receiver(setting_changed)
+def _reset_rate_limit_backend(setting, **kwargs):
+    global _backend
+    if setting == 'RATE_LIMITING':
+        _backend = None
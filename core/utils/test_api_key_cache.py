@@ -0,0 +1,211 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from core.utils.api_key_cache import APIKeyCache, get_api_key_cache
+from core.utils.custom_authentication import APIKeyAuthentication
+from users.models import User, APIKey
+
+
+@pytest.mark.django_db
+class TestCachedAPIKeyAuthentication(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_api_key_cache().clear()
+        self.factory = APIRequestFactory()
+        self.auth = APIKeyAuthentication()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=10
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+
+    def _authenticate(self):
+        return self.auth.authenticate(self.factory.get('/', HTTP_X_API_KEY=self.plain_key))
+
+    def test_second_lookup_skips_database(self):
+        self._authenticate()
+
+        with self.assertNumQueries(0):
+            user, api_key = self._authenticate()
+
+        assert user == self.user
+        assert api_key == self.api_key
+
+    def test_cached_instances_are_copies(self):
+        first_user, _ = self._authenticate()
+        first_user.tokens_balance = 0
+
+        second_user, second_key = self._authenticate()
+
+        assert second_user.tokens_balance == 10
+        assert second_key.user is second_user
+
+    def test_revoking_key_invalidates_entry(self):
+        self._authenticate()
+
+        self.api_key.is_active = False
+        self.api_key.save()
+
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate()
+
+    def test_user_change_invalidates_entry(self):
+        self._authenticate()
+
+        self.user.first_name = 'Changed'
+        self.user.save()
+
+        user, _ = self._authenticate()
+        assert user.first_name == 'Changed'
+
+    def test_token_charges_ignore_cached_balance(self):
+        self._authenticate()
+        User.objects.filter(pk=self.user.pk).update(tokens_balance=0)
+
+        user, _ = self._authenticate()
+
+        assert user.tokens_balance == 10
+        assert user.deduct_tokens(1) is False
+
+    def test_expired_entry_not_served(self):
+        self.api_key.expires_at = timezone.now() + timedelta(minutes=1)
+        self.api_key.save()
+        self._authenticate()
+
+        later = timezone.now() + timedelta(minutes=2)
+        with patch('core.utils.api_key_cache.timezone.now', return_value=later):
+            assert get_api_key_cache().get(self.api_key.key_hash) is None
+
+    @override_settings(API_KEY_CACHE={
+        'TTL': 0, 'MAXSIZE': 100, 'SHARED_CACHE_ALIAS': None, 'SYNC_INTERVAL': 1.0, 'WARM_UP': False,
+    })
+    def test_disabled_cache_always_queries(self):
+        self._authenticate()
+
+        with self.assertNumQueries(1):
+            self._authenticate()
+
+    def test_warm_up_loads_active_keys(self):
+        APIKey.create_key(self.user, 'Inactive Key', is_active=False)
+        key_cache = APIKeyCache(ttl=60, maxsize=100)
+
+        assert key_cache.warm_up() == 1
+        assert key_cache.get(self.api_key.key_hash) is not None
+
+
+@pytest.mark.django_db
+class TestAPIKeyCacheInvalidationChannel(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User'
+        )
+        self.api_key, _ = APIKey.create_key(self.user, 'Test Key')
+
+    def test_invalidation_reaches_other_workers(self):
+        worker_a = APIKeyCache(ttl=60, maxsize=100, shared_alias='default', sync_interval=0)
+        worker_b = APIKeyCache(ttl=60, maxsize=100, shared_alias='default', sync_interval=0)
+        worker_b.get('unused')
+        worker_b.set(self.api_key.key_hash, self.user, self.api_key)
+
+        worker_a.invalidate_key(self.api_key.key_hash)
+
+        assert worker_b.get(self.api_key.key_hash) is None
+
+    def test_entries_expire_after_ttl(self):
+        key_cache = APIKeyCache(ttl=30, maxsize=100)
+        with patch('core.utils.caching.time.monotonic', return_value=0.0):
+            key_cache.set(self.api_key.key_hash, self.user, self.api_key)
+        with patch('core.utils.caching.time.monotonic', return_value=31.0):
+            assert key_cache.get(self.api_key.key_hash) is None
+
+    def test_user_index_follows_entries(self):
+        other = User.objects.create_user(email='other@example.com', first_name='Other', last_name='User')
+        other_key, _ = APIKey.create_key(other, 'Other Key')
+        key_cache = APIKeyCache(ttl=30, maxsize=1)
+        with patch('core.utils.caching.time.monotonic', return_value=0.0):
+            key_cache.set(self.api_key.key_hash, self.user, self.api_key)
+            key_cache.set(other_key.key_hash, other, other_key)
+        assert dict(key_cache._keys_by_user) == {other.pk: {other_key.key_hash}}
+
+        with patch('core.utils.caching.time.monotonic', return_value=31.0):
+            key_cache.get(other_key.key_hash)
+        assert not key_cache._keys_by_user
+
+
+@pytest.mark.django_db
+class TestNegativeAPIKeyCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_api_key_cache().clear()
+        self.factory = APIRequestFactory()
+        self.auth = APIKeyAuthentication()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User'
+        )
+
+    def _authenticate(self, plain_key):
+        return self.auth.authenticate(self.factory.get('/', HTTP_X_API_KEY=plain_key))
+
+    def test_repeated_unknown_key_skips_database(self):
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate('nid_unknown')
+
+        with self.assertNumQueries(0):
+            with pytest.raises(AuthenticationFailed):
+                self._authenticate('nid_unknown')
+
+        assert get_api_key_cache().stats()['rejected']['hits'] == 1
+
+    def test_created_key_clears_rejection(self):
+        plain_key = 'nid_future_key'
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate(plain_key)
+
+        with patch('users.models.secrets.token_urlsafe', return_value='future_key'):
+            _, created_key = APIKey.create_key(self.user, 'Test Key')
+
+        assert created_key == plain_key
+        user, _ = self._authenticate(plain_key)
+        assert user == self.user
+
+    def test_reactivated_key_clears_rejection(self):
+        api_key, plain_key = APIKey.create_key(self.user, 'Test Key', is_active=False)
+        with pytest.raises(AuthenticationFailed):
+            self._authenticate(plain_key)
+
+        api_key.is_active = True
+        api_key.save()
+
+        user, _ = self._authenticate(plain_key)
+        assert user == self.user
+
+    def test_rejections_expire_after_ttl(self):
+        key_cache = APIKeyCache(ttl=60, maxsize=100, negative_ttl=30, negative_maxsize=100)
+        with patch('core.utils.caching.time.monotonic', return_value=0.0):
+            key_cache.reject('hash')
+        with patch('core.utils.caching.time.monotonic', return_value=31.0):
+            assert not key_cache.is_rejected('hash')
+
+    def test_rejections_are_bounded(self):
+        key_cache = APIKeyCache(ttl=60, maxsize=100, negative_ttl=30, negative_maxsize=2)
+        for key_hash in ('a', 'b', 'c'):
+            key_cache.reject(key_hash)
+
+        assert not key_cache.is_rejected('a')
+        assert key_cache.is_rejected('c')
+        assert key_cache.stats()['rejected']['evictions'] == 1
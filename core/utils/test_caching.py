@@ -0,0 +1,44 @@
+from unittest.mock import patch
+from core.utils.caching import LRUCache
+
+
+class TestLRUCache:
+
+    def test_get_and_set(self):
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1)
+        assert lru.get('a') == 1
+        assert lru.get('b') is None
+        assert lru.stats()['hits'] == 1
+        assert lru.stats()['misses'] == 1
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        assert lru.get('b') is None
+        assert lru.get('a') == 1
+        assert lru.stats()['evictions'] == 1
+
+    def test_expired_entries_are_misses(self):
+        lru = LRUCache(maxsize=2, ttl=10)
+        with patch('core.utils.caching.time.monotonic', return_value=100.0):
+            lru.set('a', 1)
+        with patch('core.utils.caching.time.monotonic', return_value=111.0):
+            assert lru.get('a') is None
+        assert lru.stats()['expirations'] == 1
+
+    def test_on_remove(self):
+        removed = []
+        lru = LRUCache(maxsize=1, ttl=10, on_remove=lambda key, value: removed.append((key, value)))
+        with patch('core.utils.caching.time.monotonic', return_value=100.0):
+            lru.set('a', 1)
+            lru.set('b', 2)
+        with patch('core.utils.caching.time.monotonic', return_value=111.0):
+            lru.get('b')
+        lru.set('c', 3)
+        lru.delete('c')
+        lru.delete('c')
+        assert removed == [('a', 1), ('b', 2), ('c', 3)]
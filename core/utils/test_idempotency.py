@@ -0,0 +1,253 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from core.utils.idempotency import IdempotencyStore, get_idempotency_store
+from national_ids.tests.test_async_views import ASYNC_URLS
+from users.models import APIKey, APIUsage, User
+
+
+def fake_request(key='retry-1', user_pk=1, data=None):
+    return SimpleNamespace(
+        headers={'Idempotency-Key': key} if key is not None else {},
+        user=SimpleNamespace(pk=user_pk),
+        data={'national_id': '29001010123456'} if data is None else data,
+        method='POST',
+        path='/api/v1/national-ids/egyptian-id/extract/',
+    )
+
+
+class TestIdempotencyStore(TestCase):
+
+    def setUp(self):
+        self.store = IdempotencyStore(wait_timeout=5, sync_wait_timeout=5)
+        caches[self.store.alias].clear()
+        self.calls = 0
+
+    def handler(self, status_code=200):
+        def handle():
+            self.calls += 1
+            return Response({'calls': self.calls}, status=status_code)
+        return handle
+
+    def test_retry_gets_stored_response(self):
+        first = self.store.run(fake_request(), self.handler())
+        retry = self.store.run(fake_request(), self.handler())
+
+        assert self.calls == 1
+        assert retry.data == first.data == {'calls': 1}
+        assert retry['Idempotent-Replayed'] == 'true'
+        assert not first.has_header('Idempotent-Replayed')
+
+    def test_keys_are_per_user(self):
+        self.store.run(fake_request(user_pk=1), self.handler())
+        self.store.run(fake_request(user_pk=2), self.handler())
+
+        assert self.calls == 2
+
+    def test_without_key(self):
+        self.store.run(fake_request(key=None), self.handler())
+        self.store.run(fake_request(key=None), self.handler())
+
+        assert self.calls == 2
+
+    def test_server_errors_are_not_stored(self):
+        self.store.run(fake_request(), self.handler(500))
+        retry = self.store.run(fake_request(), self.handler())
+
+        assert self.calls == 2
+        assert retry.status_code == status.HTTP_200_OK
+
+    def test_key_reused_for_another_payload(self):
+        self.store.run(fake_request(), self.handler())
+        response = self.store.run(fake_request(data={'national_id': '123'}), self.handler())
+
+        assert self.calls == 1
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_invalid_key(self):
+        response = self.store.run(fake_request(key='k' * 256), self.handler())
+
+        assert self.calls == 0
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_rejected_payloads_are_stored(self):
+        self.store.run(fake_request(), self.handler(400))
+        retry = self.store.run(fake_request(), self.handler())
+
+        assert self.calls == 1
+        assert retry.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_balance_and_rate_limit_responses_are_not_stored(self):
+        for status_code in (402, 429):
+            self.store.run(fake_request(key=f'retry-{status_code}'), self.handler(status_code))
+            retry = self.store.run(fake_request(key=f'retry-{status_code}'), self.handler())
+
+            assert retry.status_code == status.HTTP_200_OK
+            assert not retry.has_header('Idempotent-Replayed')
+        assert self.calls == 4
+
+    def test_concurrent_duplicate_waits_for_first_response(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return self.handler()()
+
+        first = threading.Thread(target=self.store.run, args=(fake_request(), slow))
+        first.start()
+        started.wait(5)
+        threading.Timer(0.2, release.set).start()
+        duplicate = self.store.run(fake_request(), self.handler())
+        first.join()
+
+        assert self.calls == 1
+        assert duplicate.data == {'calls': 1}
+        assert duplicate['Idempotent-Replayed'] == 'true'
+
+    def test_async_duplicate_waits_for_first_response(self):
+        async def handle():
+            self.calls += 1
+            await asyncio.sleep(0.2)
+            return Response({'calls': self.calls})
+
+        async def both():
+            return await asyncio.gather(
+                self.store.arun(fake_request(), handle), self.store.arun(fake_request(), handle),
+            )
+
+        first, duplicate = asyncio.run(both())
+
+        assert self.calls == 1
+        assert duplicate.data == first.data == {'calls': 1}
+        assert duplicate['Idempotent-Replayed'] == 'true'
+
+    def test_duplicate_runs_when_first_response_is_not_stored(self):
+        started, release = threading.Event(), threading.Event()
+
+        def refused():
+            started.set()
+            release.wait(5)
+            return self.handler(402)()
+
+        first = threading.Thread(target=self.store.run, args=(fake_request(), refused))
+        first.start()
+        started.wait(5)
+        threading.Timer(0.2, release.set).start()
+        duplicate = self.store.run(fake_request(), self.handler())
+        first.join()
+
+        assert self.calls == 2
+        assert duplicate.status_code == status.HTTP_200_OK
+
+    def test_concurrent_duplicate_gives_up_after_wait_timeout(self):
+        self.store.sync_wait_timeout = 0.1
+        started, release = threading.Event(), threading.Event()
+
+        def stuck():
+            started.set()
+            release.wait(5)
+            return self.handler()()
+
+        first = threading.Thread(target=self.store.run, args=(fake_request(), stuck))
+        first.start()
+        started.wait(5)
+        try:
+            response = self.store.run(fake_request(), self.handler())
+        finally:
+            release.set()
+            first.join()
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response['Retry-After'] == '1'
+        assert self.calls == 1
+
+
+@pytest.mark.django_db
+@override_settings(RATE_LIMITING={'BACKEND': 'local'})
+class TestIdempotentEndpoints(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=10
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        caches[get_idempotency_store().alias].clear()
+
+    def _post_twice(self, name, payload, key='retry-1'):
+        url = reverse(f'national_ids:{name}')
+        return [
+            self.client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+            for _ in range(2)
+        ]
+
+    def test_extract_retry_is_not_charged_or_logged_again(self):
+        first, retry = self._post_twice('extract-egyptian-id', {'national_id': '29001010123456'})
+
+        self.user.refresh_from_db()
+        assert retry.status_code == first.status_code == status.HTTP_200_OK
+        assert retry.content == first.content
+        assert retry['Idempotent-Replayed'] == 'true'
+        assert self.user.tokens_balance == 9
+        assert APIUsage.objects.filter(api_key=self.api_key).count() == 1
+
+    def test_batch_retry_is_not_charged_or_logged_again(self):
+        first, retry = self._post_twice('extract-egyptian-id-batch', {'national_ids': ['29001010123456', '123']})
+
+        self.user.refresh_from_db()
+        assert retry.content == first.content
+        assert self.user.tokens_balance == 9
+        assert APIUsage.objects.filter(api_key=self.api_key).count() == 2
+
+    def test_async_views(self):
+        with override_settings(ROOT_URLCONF=ASYNC_URLS):
+            first, retry = self._post_twice('extract-egyptian-id-batch', {'national_ids': ['29001010123456']})
+
+        self.user.refresh_from_db()
+        assert retry.content == first.content
+        assert retry['Idempotent-Replayed'] == 'true'
+        assert self.user.tokens_balance == 9
+
+    def test_same_key_for_another_request(self):
+        url = reverse('national_ids:extract-egyptian-id')
+        self.client.post(url, {'national_id': '29001010123456'}, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        response = self.client.post(url, {'national_id': '30101011234567'}, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.user.refresh_from_db()
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert response.json()['errors'][0]['field'] == 'Idempotency-Key'
+        assert self.user.tokens_balance == 9
+
+    def test_requests_without_key_are_charged_each_time(self):
+        url = reverse('national_ids:extract-egyptian-id')
+        for _ in range(2):
+            self.client.post(url, {'national_id': '29001010123456'}, format='json')
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 8
+
+    def test_insufficient_tokens_retry_runs_again(self):
+        User.objects.filter(pk=self.user.pk).update(tokens_balance=0)
+        url = reverse('national_ids:extract-egyptian-id')
+        first = self.client.post(url, {'national_id': '29001010123456'}, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        User.objects.filter(pk=self.user.pk).update(tokens_balance=1)
+        retry = self.client.post(url, {'national_id': '29001010123456'}, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.user.refresh_from_db()
+        assert first.status_code == status.HTTP_402_PAYMENT_REQUIRED
+        assert retry.status_code == status.HTTP_200_OK
+        assert self.user.tokens_balance == 0
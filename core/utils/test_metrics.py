@@ -0,0 +1,144 @@
+import os
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from unittest import mock
+
+import pytest
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import CONTENT_TYPE_LATEST
+from rest_framework.test import APIClient
+
+from core.utils.metrics import MetricsMiddleware, get_registry
+from core.utils.rate_limiting import get_rate_limit_backend
+from national_ids.cache import get_extraction_cache
+from users.models import APIKey, User
+
+LOCAL = {'ENABLED': True, 'BACKEND': 'local'}
+MULTIPROCESS = {'ENABLED': True, 'BACKEND': 'multiprocess'}
+
+
+def samples(text):
+    """Exported samples as {'name{labels}': value}."""
+    return {
+        line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+        for line in text.decode().splitlines() if line and not line.startswith('#')
+    }
+
+
+def count_in_process(directory, amount):
+    """Count throttle checks in a new process writing to the multiprocess directory."""
+    subprocess.run(
+        [
+            sys.executable, '-c',
+            'import django; django.setup(); '
+            'from core.utils.metrics import THROTTLE_CHECKS; '
+            f'THROTTLE_CHECKS.labels("allowed").inc({amount})',
+        ],
+        env={**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory, 'DJANGO_SETTINGS_MODULE': 'core.settings'},
+        cwd=settings.BASE_DIR,
+        check=True,
+    )
+
+
+class TestBackends(TestCase):
+
+    @override_settings(METRICS={'ENABLED': False, 'BACKEND': 'local'})
+    def test_disabled(self):
+        assert self.client.get('/metrics').status_code == 404
+        with pytest.raises(MiddlewareNotUsed):
+            MetricsMiddleware(lambda request: None)
+
+    @override_settings(METRICS=MULTIPROCESS)
+    def test_multiprocess_sums_exited_processes(self):
+        directory = tempfile.mkdtemp()
+        count_in_process(directory, 1)
+        count_in_process(directory, 2)
+
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            response = self.client.get('/metrics')
+        assert response.status_code == 200
+        assert samples(response.content)['nid_throttle_checks_total{result="allowed"}'] == 3.0
+
+    @override_settings(METRICS=MULTIPROCESS)
+    def test_multiprocess_needs_directory(self):
+        with mock.patch.dict(os.environ, clear=True):
+            with pytest.raises(ImproperlyConfigured):
+                get_registry()
+
+    @override_settings(METRICS={'ENABLED': True, 'BACKEND': 'mmap'})
+    def test_unknown_backend(self):
+        with pytest.raises(ImproperlyConfigured):
+            get_registry()
+
+
+@pytest.mark.django_db
+@override_settings(RATE_LIMITING={'BACKEND': 'local'}, METRICS=LOCAL)
+class TestMetricsEndpoint(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=1
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        self.url = reverse('national_ids:extract-egyptian-id')
+        get_rate_limit_backend().clear()
+        get_extraction_cache().clear()
+        # The local backend's counts live as long as the process, so tests compare scrapes
+        self.before = self.scrape()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        assert response.status_code == 200
+        assert response['Content-Type'] == CONTENT_TYPE_LATEST
+        return samples(response.content)
+
+    def counted(self):
+        """Samples added since setUp."""
+        exported = Counter(self.scrape())
+        exported.subtract(self.before)
+        return exported
+
+    def test_request_metrics(self):
+        self.client.post(self.url, {'national_id': '29001010123456'}, format='json')
+        # Cached result, but no tokens left
+        self.client.post(self.url, {'national_id': '29001010123456'}, format='json')
+
+        exported = self.counted()
+        endpoint = 'endpoint="national_ids:extract-egyptian-id"'
+        assert exported[f'nid_requests_total{{{endpoint},status="200",tier="standard"}}'] == 1.0
+        assert exported[f'nid_requests_total{{{endpoint},status="402",tier="standard"}}'] == 1.0
+        assert exported[f'nid_request_duration_seconds_count{{{endpoint}}}'] == 2.0
+        for name in ('auth', 'throttle', 'extract', 'charge', 'usage', 'render'):
+            assert exported[f'nid_request_stage_duration_seconds_count{{stage="{name}"}}'] == 2.0
+        assert exported['nid_token_deduction_failures_total{mode="database"}'] == 1.0
+        assert exported['nid_usage_write_duration_seconds_count{sink="sync"}'] == 2.0
+        assert exported['nid_throttle_checks_total{result="allowed"}'] == 2.0
+        assert exported['nid_cache_lookups_total{cache="result_local",result="miss"}'] == 1.0
+        assert exported['nid_cache_lookups_total{cache="result_local",result="hit"}'] == 1.0
+
+    def test_unauthenticated_request(self):
+        self.client.credentials()
+        self.client.post(self.url, {'national_id': '29001010123456'}, format='json')
+
+        assert self.counted()[
+            'nid_requests_total{endpoint="national_ids:extract-egyptian-id",status="403",tier="anonymous"}'
+        ] == 1.0
+
+    def test_staff_tier(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.post(self.url, {'national_id': '29001010123456'}, format='json')
+
+        assert self.counted()[
+            'nid_requests_total{endpoint="national_ids:extract-egyptian-id",status="200",tier="staff"}'
+        ] == 1.0
@@ -0,0 +1,185 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.utils.custom_throttles import EgyptianIDThrottle
+from core.utils.rate_limiting import (
+    CacheRateLimitBackend,
+    LocalRateLimitBackend,
+    MmapRateLimitBackend,
+    gcra,
+    get_rate_limit_backend,
+)
+from users.models import APIKey, User
+
+
+class TestGCRA(TestCase):
+
+    def test_allows_a_full_burst_then_refuses(self):
+        tat, now = 0.0, 1000.0
+        for _ in range(10):
+            tat, wait = gcra(tat, now, 10, 60)
+            assert wait == 0
+        _, wait = gcra(tat, now, 10, 60)
+        assert wait == pytest.approx(6)
+
+    def test_refill_is_gradual(self):
+        tat, now = 0.0, 1000.0
+        for _ in range(10):
+            tat, _ = gcra(tat, now, 10, 60)
+        tat, wait = gcra(tat, now + 6, 10, 60)
+        assert wait == 0
+        _, wait = gcra(tat, now + 6, 10, 60)
+        assert wait > 0
+
+
+class RateLimitBackendTests:
+    """Shared checks, mixed into one TestCase per backend."""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def test_allows_limit_then_refuses(self):
+        backend = self.make_backend()
+        now = 1_000_000.0
+        assert all(backend.hit('user_1', 5, 60, now=now) == 0 for _ in range(5))
+        wait = backend.hit('user_1', 5, 60, now=now)
+        assert 0 < wait <= 60
+
+    def test_keys_are_independent(self):
+        backend = self.make_backend()
+        now = 1_000_000.0
+        for _ in range(3):
+            backend.hit('user_1', 3, 60, now=now)
+        assert backend.hit('user_1', 3, 60, now=now) > 0
+        assert backend.hit('user_2', 3, 60, now=now) == 0
+
+    def test_allows_again_after_the_period(self):
+        backend = self.make_backend()
+        now = 1_000_000.0
+        for _ in range(3):
+            backend.hit('user_1', 3, 60, now=now)
+        assert backend.hit('user_1', 3, 60, now=now) > 0
+        assert backend.hit('user_1', 3, 60, now=now + 121) == 0
+
+    def test_refused_requests_are_not_counted(self):
+        backend = self.make_backend()
+        now = 1_000_000.0
+        for _ in range(3):
+            backend.hit('user_1', 3, 60, now=now)
+        for _ in range(20):
+            backend.hit('user_1', 3, 60, now=now)
+        assert backend.hit('user_1', 3, 60, now=now + 121) == 0
+
+
+class TestLocalRateLimitBackend(RateLimitBackendTests, TestCase):
+
+    def make_backend(self):
+        return LocalRateLimitBackend()
+
+
+class TestCacheRateLimitBackend(RateLimitBackendTests, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def make_backend(self):
+        return CacheRateLimitBackend('default')
+
+    def test_previous_window_is_weighted(self):
+        backend = self.make_backend()
+        start = 1_000_020.0 - 1_000_020.0 % 60
+        for _ in range(10):
+            backend.hit('user_1', 10, 60, now=start + 59)
+        # Half of the previous window still overlaps, so 5 more requests fit
+        assert all(backend.hit('user_1', 10, 60, now=start + 90) == 0 for _ in range(5))
+        assert backend.hit('user_1', 10, 60, now=start + 90) > 0
+
+
+class TestMmapRateLimitBackend(RateLimitBackendTests, TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'rate_limits')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def make_backend(self):
+        return MmapRateLimitBackend(self.path, slots=64)
+
+    def test_state_is_shared_through_the_file(self):
+        first, second = self.make_backend(), self.make_backend()
+        now = 1_000_000.0
+        for _ in range(3):
+            first.hit('user_1', 3, 60, now=now)
+        assert second.hit('user_1', 3, 60, now=now) > 0
+
+    def test_state_is_shared_with_forked_workers(self):
+        backend = self.make_backend()
+        now = 1_000_000.0
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                for _ in range(3):
+                    MmapRateLimitBackend(self.path, slots=64).hit('user_1', 3, 60, now=now)
+            except BaseException:
+                code = 1
+            os._exit(code)
+        _, exit_status = os.waitpid(pid, 0)
+        assert exit_status == 0
+        assert backend.hit('user_1', 3, 60, now=now) > 0
+
+    def test_full_probe_range_reuses_the_oldest_slot(self):
+        backend = MmapRateLimitBackend(self.path, slots=1)
+        now = 1_000_000.0
+        backend.hit('user_1', 1, 60, now=now)
+        assert backend.hit('user_2', 1, 60, now=now) == 0
+
+
+@pytest.mark.django_db
+@override_settings(RATE_LIMITING={'BACKEND': 'local'})
+class TestEgyptianIDThrottleRateLimiting(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=100
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.url = reverse('national_ids:extract-egyptian-id')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        get_rate_limit_backend().clear()
+
+    def test_uses_configured_backend(self):
+        assert isinstance(get_rate_limit_backend(), LocalRateLimitBackend)
+
+    def test_requests_over_the_rate_are_throttled(self):
+        with patch.object(EgyptianIDThrottle, 'rate', '2/hour'):
+            for _ in range(2):
+                response = self.client.post(self.url, {'national_id': '29001010123456'})
+                assert response.status_code == status.HTTP_200_OK
+
+            response = self.client.post(self.url, {'national_id': '29001010123456'})
+            assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+            assert 0 < int(response['Retry-After']) <= 1800
+
+    def test_throttled_requests_are_not_billed(self):
+        with patch.object(EgyptianIDThrottle, 'rate', '1/hour'):
+            self.client.post(self.url, {'national_id': '29001010123456'})
+            self.client.post(self.url, {'national_id': '29001010123456'})
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 99
@@ -0,0 +1,122 @@
+import json
+import os
+import re
+import tempfile
+
+import pytest
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.utils.rate_limiting import get_rate_limit_backend
+from core.utils.tracing import Trace, _current_trace, current_trace, stage
+from users.models import APIKey, User
+
+TRACING = {'ENABLED': True, 'SPAN_FILE': ''}
+
+
+def metrics(header):
+    """Server-Timing header as {name: (duration in ms, description)}."""
+    parsed = {}
+    for metric in header.split(', '):
+        match = re.fullmatch(r'(\w+);dur=([\d.]+)(?:;desc="(.*)")?', metric)
+        assert match, metric
+        parsed[match.group(1)] = (float(match.group(2)), match.group(3))
+    return parsed
+
+
+class TestStage(TestCase):
+
+    def test_no_trace_is_a_shared_no_op(self):
+        assert current_trace() is None
+        assert stage('auth') is stage('extract')
+        with stage('auth'):
+            pass
+
+    def test_stages_nest_and_sum(self):
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            with stage('usage'):
+                with stage('charge'):
+                    trace.count_query(lambda *args: None, 'SELECT 1', None, False, {})
+            with stage('usage'):
+                trace.count_query(lambda *args: None, 'SELECT 1', None, False, {})
+        finally:
+            _current_trace.reset(token)
+        trace.finish()
+
+        parsed = metrics(trace.server_timing())
+        assert list(parsed) == ['usage', 'charge', 'total']
+        assert parsed['usage'][1] == '2 queries'
+        assert parsed['charge'][1] == '1 query'
+        assert parsed['total'][1] == '2 queries'
+        assert parsed['total'][0] >= parsed['usage'][0] >= parsed['charge'][0]
+
+
+@pytest.mark.django_db
+@override_settings(RATE_LIMITING={'BACKEND': 'local'})
+class TestRequestTracingMiddleware(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=100
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        self.url = reverse('national_ids:extract-egyptian-id')
+        get_rate_limit_backend().clear()
+
+    def test_disabled_by_default(self):
+        response = self.client.post(self.url, {'national_id': '29001010123456'}, format='json')
+
+        assert response.status_code == 200
+        assert 'Server-Timing' not in response
+
+    @override_settings(REQUEST_TRACING=TRACING)
+    def test_server_timing_per_stage(self):
+        response = self.client.post(self.url, {'national_id': '29001010123456'}, format='json')
+
+        assert response.status_code == 200
+        parsed = metrics(response['Server-Timing'])
+        assert list(parsed) == ['auth', 'throttle', 'extract', 'charge', 'usage', 'render', 'total']
+        # Key lookup, token UPDATE and usage INSERT
+        assert parsed['auth'][1] == '1 query'
+        assert parsed['charge'][1] == '1 query'
+        assert parsed['usage'][1] == '1 query'
+        assert parsed['extract'][1] is None
+        assert parsed['total'][0] >= sum(duration for name, (duration, _) in parsed.items() if name != 'total')
+
+    @override_settings(REQUEST_TRACING=TRACING)
+    def test_batch_stages(self):
+        response = self.client.post(
+            reverse('national_ids:extract-egyptian-id-batch'),
+            {'national_ids': ['29001010123456', '123']},
+            format='json',
+        )
+
+        assert list(metrics(response['Server-Timing'])) == [
+            'auth', 'throttle', 'validate', 'extract', 'charge', 'usage', 'render', 'total'
+        ]
+
+    def test_span_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'spans.json')
+        with override_settings(REQUEST_TRACING={'ENABLED': True, 'SPAN_FILE': path}):
+            self.client.post(self.url, {'national_id': '29001010123456'}, format='json')
+            self.client.post(self.url, {'national_id': '123'}, format='json')
+
+        with open(path) as span_file:
+            content = span_file.read()
+        # The JSON array format: opened once, closing bracket optional
+        events = json.loads(content.rstrip().rstrip(',') + ']')
+        roots = [event for event in events if event['name'] == f'POST {self.url}']
+        assert len(roots) == 2
+        assert {event['ph'] for event in events} == {'X'}
+        assert {'auth', 'throttle', 'extract', 'charge', 'usage', 'render'} <= {event['name'] for event in events}
+        assert roots[0]['args']['queries'] == 3
+        for event in events:
+            assert event['dur'] >= 0 and event['ts'] > 0
@@ -0,0 +1,242 @@
+"""
+Per-stage request tracing.
+
+With REQUEST_TRACING['ENABLED'], RequestTracingMiddleware starts a trace for every
+request. Code on the hot path wraps its stages in `stage('name')`, and each stage's
+wall time and database queries end up in the response's Server-Timing header:
+
+    Server-Timing: auth;dur=0.412;desc="1 query", throttle;dur=0.031, ..., total;dur=2.104;desc="3 queries"
+
+Stages may nest, and a stage entered more than once is reported once with its
+times summed. With SPAN_FILE set, every request is also appended to that file as
+Chrome trace events, which chrome://tracing and Perfetto open directly.
+
+When tracing is disabled the middleware removes itself, and `stage()` only reads a
+context variable and returns a shared no-op context manager. Queries are counted on
+the connections of the thread that handles the request.
+"""
+import os
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from typing import List, Optional
+
+import orjson
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+_current_trace: ContextVar[Optional['Trace']] = ContextVar('request_trace', default=None)
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'start', 'end', 'queries')
+
+    def __init__(self, trace: 'Trace', name: str):
+        self.trace = trace
+        self.name = name
+        self.start = self.end = 0.0
+        self.queries = 0
+
+    def __enter__(self):
+        self.trace.open_spans.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end = time.perf_counter()
+        self.trace.open_spans.remove(self)
+        self.trace.spans.append(self)
+        return False
+
+
+class Trace:
+    """The stages of one request, timed with perf_counter and anchored to wall time for spans."""
+
+    def __init__(self, name: str = 'request'):
+        self.name = name
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.spans: List[Span] = []
+        self.open_spans: List[Span] = []
+        self.queries = 0
+
+    def stage(self, name: str) -> Span:
+        return Span(self, name)
+
+    def count_query(self, execute, sql, params, many, context):
+        """Connection execute wrapper counting each query in the request and its open stages."""
+        self.queries += 1
+        for span in self.open_spans:
+            span.queries += 1
+        return execute(sql, params, many, context)
+
+    def finish(self) -> None:
+        self.end = time.perf_counter()
+
+    def server_timing(self) -> str:
+        stages = {}
+        for span in sorted(self.spans, key=lambda span: span.start):
+            duration, queries = stages.get(span.name, (0.0, 0))
+            stages[span.name] = (duration + span.end - span.start, queries + span.queries)
+        stages['total'] = ((self.end or time.perf_counter()) - self.start, self.queries)
+        return ', '.join(
+            _timing_metric(name, duration, queries) for name, (duration, queries) in stages.items()
+        )
+
+    def chrome_events(self) -> List[dict]:
+        """Complete ("X") trace events of the request and each of its stages, in microseconds."""
+        pid, tid = os.getpid(), threading.get_ident()
+
+        def event(name, start, end, queries):
+            return {
+                'name': name,
+                'cat': 'request',
+                'ph': 'X',
+                'ts': round((self.wall_start + start - self.start) * 1e6, 3),
+                'dur': round((end - start) * 1e6, 3),
+                'pid': pid,
+                'tid': tid,
+                'args': {'queries': queries},
+            }
+
+        events = [event(self.name, self.start, self.end or time.perf_counter(), self.queries)]
+        events.extend(event(span.name, span.start, span.end, span.queries) for span in self.spans)
+        return events
+
+
+def _timing_metric(name: str, duration: float, queries: int) -> str:
+    metric = f"{name};dur={duration * 1e3:.3f}"
+    if queries:
+        metric += f';desc="{queries} {"query" if queries == 1 else "queries"}"'
+    return metric
+
+
+def stage(name: str):
+    """Time the enclosed block as a stage of the current request, if it is being traced."""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_STAGE
+    return trace.stage(name)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class SpanFile:
+    """
+    Chrome trace file in the JSON array format, appended one event per line. The
+    closing bracket is optional in that format, so the file is valid at any time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+
+    def write(self, events: List[dict]) -> None:
+        data = b''.join(orjson.dumps(event) + b',\n' for event in events)
+        with self._lock:
+            if self._fd is None or self._pid != os.getpid():
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+                if os.fstat(self._fd).st_size == 0:
+                    os.write(self._fd, b'[\n')
+            # One write per request, so events of concurrent workers do not interleave
+            os.write(self._fd, data)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+_span_file = None
+_span_file_lock = threading.Lock()
+
+
+def get_span_file() -> Optional[SpanFile]:
+    """Return the configured span file, None when spans are not written."""
+    global _span_file
+    path = settings.REQUEST_TRACING['SPAN_FILE']
+    if not path:
+        return None
+    if _span_file is None or _span_file.path != path:
+        with _span_file_lock:
+            if _span_file is None or _span_file.path != path:
+                _span_file = SpanFile(path)
+    return _span_file
+
+
+@receiver(setting_changed)
+def _reset_span_file(setting, **kwargs):
+    global _span_file
+    if setting == 'REQUEST_TRACING' and _span_file is not None:
+        _span_file.close()
+        _span_file = None
+
+
+class RequestTracingMiddleware:
+    """Trace each request and report its stages in a Server-Timing header, see module docstring."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TRACING['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trace = Trace(f"{request.method} {request.path}")
+        token = _current_trace.set(trace)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(trace.count_query))
+                response = self.get_response(request)
+        finally:
+            _current_trace.reset(token)
+        return self._finish(trace, response)
+
+    async def __acall__(self, request):
+        trace = Trace(f"{request.method} {request.path}")
+        token = _current_trace.set(trace)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_trace.reset(token)
+        return self._finish(trace, response)
+
+    def _finish(self, trace: Trace, response):
+        trace.finish()
+        response['Server-Timing'] = trace.server_timing()
+        span_file = get_span_file()
+        if span_file is not None:
+            span_file.write(trace.chrome_events())
+        return response
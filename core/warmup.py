@@ -0,0 +1,59 @@
+"""
+Process warm-up and shutdown for preforked serving.
+
+`warm_up` runs once in gunicorn's master after it preloads the application
+(compose/django/gunicorn.conf.py), before any worker is forked, so what it loads is
+shared copy-on-write by every worker. Importing core.wsgi or core.asgi does not run
+it, so the development server and tools have no such side effect. It never leaves a database connection open, because
+a connection must not be shared across a fork. `warm_up_worker` runs in each worker
+before it accepts traffic, and `shutdown_worker` when it exits.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_IDS = ['29001010123456', '30101011234567', '123']
+
+
+def warm_up() -> None:
+    """Import everything a request touches and run each extraction path once."""
+    from django.urls import get_resolver
+    from national_ids.services import extract_national_id, extract_national_ids
+
+    start = time.perf_counter()
+    # The URLconf, and with it every view, serializer and DRF module, is otherwise
+    # imported by the first request of every worker
+    get_resolver().url_patterns
+    for id_value in SAMPLE_IDS:
+        extract_national_id(id_value)
+    extract_national_ids(SAMPLE_IDS)
+
+    keys = 0
+    if settings.API_KEY_CACHE['WARM_UP']:
+        from core.utils.api_key_cache import get_api_key_cache
+        keys = get_api_key_cache().warm_up()
+
+    connections.close_all()
+    logger.info(f"Warmed up in {(time.perf_counter() - start) * 1e3:.0f} ms, {keys} API keys cached")
+
+
+def warm_up_worker() -> None:
+    """Open this worker's persistent database connections before its first request."""
+    for connection in connections.all():
+        # With CONN_MAX_AGE 0 the first request would close it again
+        if connection.settings_dict['CONN_MAX_AGE'] != 0:
+            connection.ensure_connection()
+
+
+def shutdown_worker() -> None:
+    """Flush queued usage events and return leased tokens of an exiting worker."""
+    from users.leasing import release_lease_pool
+    from users.usage import close_usage_sink
+
+    close_usage_sink()
+    release_lease_pool()
+    connections.close_all()
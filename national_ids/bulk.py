@@ -0,0 +1,341 @@
+"""
+Offline extraction of ID files, for ``manage.py extract_ids_file``.
+
+The input file is memory-mapped and cut into chunks of whole records: lines of a
+newline-delimited file (optionally a single-column CSV), or records of a fixed
+width. Each chunk is read, validated and extracted in a worker process by the
+vectorized engine with the rules of EgyptianIDSerializer. As in
+extract_national_ids, rows the engine cannot decide go through the serializer.
+A worker only holds one chunk and its output, and chunks are written in input
+order.
+
+Output formats:
+
+- ``csv``: the columns of the streaming endpoint's CSV output
+- ``ndjson``: one result per line, as in the batch endpoint's ``results``
+- ``npz``: one NumPy array per column (see NPZ_COLUMNS) plus ``governorate_names``,
+  built from per-column part files once every chunk is written
+
+After every chunk, the input and output offsets are saved to a progress file
+next to the output, so an interrupted run resumes from the last written chunk.
+"""
+import csv
+import io
+import json
+import mmap
+import os
+import shutil
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from . import vectorized
+from .services import extract_national_id
+from .streaming import CSV_HEADER, CSVWriter
+
+INPUT_FORMATS = ('lines', 'fixed')
+
+NPZ_COLUMNS = {
+    # First 14 bytes of the ID as read, UTF-8 encoded
+    'national_id': 'S14',
+    'valid': '?',
+    # vectorized error codes, OK (0) for valid IDs
+    'error_code': 'u1',
+    # NaT for invalid IDs
+    'date_of_birth': 'M8[D]',
+    # Index into governorate_names, -1 for invalid IDs
+    'governorate': 'i1',
+    'is_male': '?',
+}
+
+
+class ChunkTask(NamedTuple):
+    path: str
+    input_size: int
+    start: int
+    end: int
+    input_format: str
+    record_width: int
+    output_format: str
+
+
+class ChunkResult(NamedTuple):
+    start: int
+    end: int
+    rows: int
+    # Encoded rows for csv and ndjson, {column: array} for npz
+    payload: Any
+
+
+def iter_chunks(data, start: int, chunk_size: int, input_format: str, record_width: int) -> Iterator[Tuple[int, int]]:
+    """(start, end) byte ranges of whole records from `start` to the end of `data`."""
+    size = len(data)
+    if input_format == 'fixed':
+        chunk_size = max(chunk_size // record_width, 1) * record_width
+    while start < size:
+        end = min(start + chunk_size, size)
+        if input_format == 'lines' and end < size:
+            newline = data.find(b'\n', end - 1)
+            end = size if newline < 0 else newline + 1
+        yield start, end
+        start = end
+
+
+def check_offset(data, offset: int, input_format: str, record_width: int) -> Optional[str]:
+    """Why `offset` is not at the start of a record, or None when it is."""
+    if not 0 <= offset <= len(data):
+        return f"Offset {offset} is outside the input file ({len(data)} bytes)"
+    if input_format == 'fixed' and offset % record_width:
+        return f"Offset {offset} is not a multiple of the record width {record_width}"
+    if input_format == 'lines' and offset and data[offset - 1:offset] != b'\n':
+        return f"Offset {offset} is not at the start of a line"
+    return None
+
+
+def read_ids(data: bytes, input_format: str, record_width: int, at_file_start: bool = False) -> List[str]:
+    """IDs of a chunk, stripped like the streaming endpoint strips plain text lines."""
+    if input_format == 'fixed':
+        values = [
+            data[index:index + record_width].decode('utf-8', errors='replace').strip()
+            for index in range(0, len(data), record_width)
+        ]
+    else:
+        values = [line.strip().strip('"') for line in data.decode('utf-8', errors='replace').split('\n')]
+        if at_file_start and values and values[0] == CSV_HEADER:
+            values[0] = ''
+    return [value for value in values if value]
+
+
+def process_chunk(task: ChunkTask) -> ChunkResult:
+    """Read, validate, extract and encode one chunk. Runs in the worker processes."""
+    data = _mapped_input(task.path, task.input_size)[task.start:task.end]
+    ids = read_ids(data, task.input_format, task.record_width, at_file_start=task.start == 0)
+    del data
+    columns = vectorized.extract_columns(ids)
+    payload = ENCODERS[task.output_format](ids, columns, _Fallbacks())
+    return ChunkResult(task.start, task.end, len(ids), payload)
+
+
+_input: Tuple[Optional[Tuple[str, int]], Optional[mmap.mmap]] = (None, None)
+
+
+def _mapped_input(path: str, size: int) -> mmap.mmap:
+    """The input file mapped once per worker, for all of its chunks."""
+    global _input
+    key, mapped = _input
+    if key != (path, size):
+        if mapped is not None:
+            mapped.close()
+        with open(path, 'rb') as input_file:
+            mapped = mmap.mmap(input_file.fileno(), size, access=mmap.ACCESS_READ)
+        _input = ((path, size), mapped)
+    return mapped
+
+
+class _Fallbacks(dict):
+    """extract_national_id results of the chunk's IDs the engine cannot decide, computed once per ID."""
+
+    def __missing__(self, id_value: str):
+        result = self[id_value] = extract_national_id(id_value)
+        return result
+
+
+def _results(ids: List[str], columns: vectorized.ExtractedColumns, fallbacks: _Fallbacks):
+    """(national_id, data, errors) per ID, data holding a date string or a date."""
+    names = vectorized.GOVERNORATE_NAMES
+    messages = vectorized.ERROR_MESSAGES
+    for id_value, code, year, month, day, governorate_index, is_male in zip(
+        ids,
+        columns.error_code.tolist(),
+        columns.year.tolist(),
+        columns.month.tolist(),
+        columns.day.tolist(),
+        columns.governorate_index.tolist(),
+        columns.is_male.tolist(),
+    ):
+        if code == vectorized.OK:
+            yield id_value, {
+                'national_id': id_value,
+                'date_of_birth': f'{year:04d}-{month:02d}-{day:02d}',
+                'governorate': names[governorate_index],
+                'gender': 'male' if is_male else 'female',
+            }, None
+        elif code == vectorized.INVALID_FORMAT:
+            yield (id_value, *fallbacks[id_value])
+        else:
+            yield id_value, None, [{'field': 'national_id', 'message': messages[code]}]
+
+
+def encode_csv(ids, columns, fallbacks) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [id_value, 'true', str(data['date_of_birth']), data['governorate'], data['gender'], '']
+        if errors is None else
+        [id_value, 'false', '', '', '', '; '.join(error['message'] for error in errors)]
+        for id_value, data, errors in _results(ids, columns, fallbacks)
+    )
+    return buffer.getvalue().encode()
+
+
+def encode_ndjson(ids, columns, fallbacks) -> bytes:
+    return b''.join(
+        orjson.dumps(
+            {'national_id': id_value, 'valid': errors is None, 'data': data, 'errors': errors},
+            option=orjson.OPT_APPEND_NEWLINE,
+        )
+        for id_value, data, errors in _results(ids, columns, fallbacks)
+    )
+
+
+def encode_npz(ids, columns, fallbacks) -> Dict[str, np.ndarray]:
+    valid = columns.valid.copy()
+    error_code = columns.error_code.copy()
+    dates = (
+        (columns.year - 1970).astype('M8[Y]').astype('M8[M]') + (columns.month - 1)
+    ).astype('M8[D]') + (columns.day - 1)
+    governorate = columns.governorate_index.astype(np.int8)
+    is_male = columns.is_male.copy()
+
+    # Rows the serializer accepted although the engine could not read them
+    for index in np.flatnonzero(error_code == vectorized.INVALID_FORMAT).tolist():
+        data, errors = fallbacks[ids[index]]
+        if errors is None:
+            valid[index], error_code[index] = True, vectorized.OK
+            dates[index] = np.datetime64(data['date_of_birth'], 'D')
+            governorate[index] = vectorized.GOVERNORATE_NAMES.index(data['governorate'])
+            is_male[index] = data['gender'] == 'male'
+
+    dates[~valid] = np.datetime64('NaT')
+    governorate[~valid] = -1
+    is_male &= valid
+    return {
+        'national_id': np.array([id_value.encode() for id_value in ids], dtype=NPZ_COLUMNS['national_id']),
+        'valid': valid,
+        'error_code': error_code,
+        'date_of_birth': dates,
+        'governorate': governorate,
+        'is_male': is_male,
+    }
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson,
+    'npz': encode_npz,
+}
+
+
+class StreamOutput:
+    """CSV or NDJSON rows appended to the output file."""
+
+    def __init__(self, path: Path, output_format: str):
+        self.path = path
+        self.output_format = output_format
+        self._file = None
+
+    def open(self, state: Optional[Dict[str, Any]]) -> None:
+        if state is None:
+            self._file = open(self.path, 'wb')
+            if self.output_format == 'csv':
+                self._file.write(CSVWriter().header().encode())
+        else:
+            # Drop whatever was written after the last saved chunk
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(state['output_offset'])
+            self._file.seek(state['output_offset'])
+
+    def write(self, result: ChunkResult) -> None:
+        self._file.write(result.payload)
+        self._file.flush()
+
+    def state(self) -> Dict[str, Any]:
+        return {'output_offset': self._file.tell()}
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+    def finish(self) -> None:
+        self.close()
+
+
+class NPZOutput:
+    """Columns appended to raw part files, gathered into the .npz file by finish()."""
+
+    def __init__(self, path: Path, output_format: str = 'npz'):
+        self.path = path
+        self.parts = path.with_name(path.name + '.parts')
+        self.rows = 0
+        self._files = {}
+
+    def open(self, state: Optional[Dict[str, Any]]) -> None:
+        if state is None and self.parts.exists():
+            shutil.rmtree(self.parts)
+        self.parts.mkdir(parents=True, exist_ok=True)
+        self.rows = state['rows'] if state else 0
+        for name, dtype in NPZ_COLUMNS.items():
+            part = open(self.parts / f'{name}.bin', 'a+b')
+            part.truncate(self.rows * np.dtype(dtype).itemsize)
+            part.seek(0, os.SEEK_END)
+            self._files[name] = part
+
+    def write(self, result: ChunkResult) -> None:
+        for name, part in self._files.items():
+            part.write(result.payload[name].astype(NPZ_COLUMNS[name], copy=False).tobytes())
+            part.flush()
+        self.rows += result.rows
+
+    def state(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self) -> None:
+        for part in self._files.values():
+            part.close()
+        self._files = {}
+
+    def finish(self) -> None:
+        self.close()
+        with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for name, dtype in NPZ_COLUMNS.items():
+                if self.rows:
+                    column = np.memmap(self.parts / f'{name}.bin', dtype=dtype, mode='r', shape=(self.rows,))
+                else:
+                    column = np.empty(0, dtype=dtype)
+                # Copied from the part file in blocks, never loaded whole
+                with archive.open(f'{name}.npy', 'w', force_zip64=True) as member:
+                    np.lib.format.write_array(member, column)
+                del column
+            with archive.open('governorate_names.npy', 'w') as member:
+                np.lib.format.write_array(member, np.array(vectorized.GOVERNORATE_NAMES))
+        shutil.rmtree(self.parts)
+
+
+OUTPUTS = {
+    'csv': StreamOutput,
+    'ndjson': StreamOutput,
+    'npz': NPZOutput,
+}
+
+
+def progress_path(output) -> Path:
+    output = Path(output)
+    return output.with_name(output.name + '.progress')
+
+
+def load_progress(output) -> Optional[Dict[str, Any]]:
+    try:
+        with open(progress_path(output)) as progress_file:
+            return json.load(progress_file)
+    except FileNotFoundError:
+        return None
+
+
+def save_progress(output, state: Dict[str, Any]) -> None:
+    path = progress_path(output)
+    temporary = path.with_name(path.name + '.tmp')
+    with open(temporary, 'w') as progress_file:
+        json.dump(state, progress_file)
+    os.replace(temporary, path)
@@ -0,0 +1,119 @@
+"""
+Two-tier cache for extraction results.
+
+The first tier is a bounded in-process LRU, the second an optional shared tier backed
+by one of Django's CACHES so workers reuse each other's results. Invalid IDs are cached
+too, since validating them costs as much as extracting a valid one.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from core.utils.caching import LRUCache
+from core.utils.metrics import CACHE_LOOKUPS
+from .parsing import cached_today
+
+ExtractionResult = Tuple[Optional[Dict[str, Any]], Optional[list]]
+
+
+class ExtractionResultCache:
+    """
+    Cache of (data, errors) extraction results keyed by ID and calendar day, since
+    whether an ID is valid depends on today's date.
+    """
+    key_prefix = 'nid:extract'
+    max_shared_key_length = 32
+
+    def __init__(
+        self,
+        local_maxsize: int,
+        local_ttl: Optional[float] = None,
+        shared_alias: Optional[str] = None,
+        shared_ttl: Optional[float] = None,
+    ):
+        self.local = LRUCache(local_maxsize, local_ttl)
+        self.shared_alias = shared_alias
+        self.shared_ttl = shared_ttl
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    @classmethod
+    def from_settings(cls) -> 'ExtractionResultCache':
+        config = settings.NATIONAL_ID_RESULT_CACHE
+        return cls(
+            local_maxsize=config['LOCAL_MAXSIZE'],
+            local_ttl=config['LOCAL_TTL'],
+            shared_alias=config['SHARED_CACHE_ALIAS'],
+            shared_ttl=config['SHARED_TTL'],
+        )
+
+    def get_or_extract(self, id_value: str, extract: Callable[[str], ExtractionResult]) -> ExtractionResult:
+        day = cached_today().toordinal()
+        local_key = (day, id_value)
+
+        result = self.local.get(local_key)
+        CACHE_LOOKUPS.labels('result_local', 'miss' if result is None else 'hit').inc()
+        if result is not None:
+            return result
+
+        shared_key = self._shared_key(day, id_value)
+        if shared_key is not None:
+            result = caches[self.shared_alias].get(shared_key)
+            if result is not None:
+                self.shared_hits += 1
+                CACHE_LOOKUPS.labels('result_shared', 'hit').inc()
+                self.local.set(local_key, result)
+                return result
+            self.shared_misses += 1
+            CACHE_LOOKUPS.labels('result_shared', 'miss').inc()
+
+        result = extract(id_value)
+        self.local.set(local_key, result)
+        if shared_key is not None:
+            caches[self.shared_alias].set(shared_key, result, self.shared_ttl)
+        return result
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'local': self.local.stats(),
+            'shared': {
+                'alias': self.shared_alias,
+                'hits': self.shared_hits,
+                'misses': self.shared_misses,
+            },
+        }
+
+    def _shared_key(self, day: int, id_value: str) -> Optional[str]:
+        # Only plain alphanumeric IDs go to the shared tier so keys stay valid for every backend
+        if (
+            self.shared_alias is None
+            or len(id_value) > self.max_shared_key_length
+            or not id_value.isascii()
+            or not id_value.isalnum()
+        ):
+            return None
+        return f"{self.key_prefix}:{day}:{id_value}"
+
+
+_extraction_cache: Optional[ExtractionResultCache] = None
+
+
+def get_extraction_cache() -> ExtractionResultCache:
+    """Return the process-wide extraction cache, configured from settings on first use."""
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = ExtractionResultCache.from_settings()
+    return _extraction_cache
+
+
+@receiver(setting_changed)
+def _reset_extraction_cache(setting, **kwargs):
+    global _extraction_cache
+    if setting == 'NATIONAL_ID_RESULT_CACHE':
+        _extraction_cache = None
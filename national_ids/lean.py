@@ -0,0 +1,115 @@
+"""
+Single-ID extraction as a plain Django view, without DRF's per-request machinery.
+
+The common request (a JSON POST carrying an API key and a string `national_id`,
+accepting JSON) is authenticated, throttled, charged, logged and answered here, with
+the same body and headers as EgyptianIDExtractorAPIView. Anything else (other
+methods or content types, a missing or invalid key, other payloads, the browsable
+API) is handed to EgyptianIDExtractorAPIView before any side effect, so it gets
+exactly the response it always did.
+"""
+import logging
+
+import orjson
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+
+from core.base.renderers import Envelope, FastJSONRenderer
+from core.utils.custom_authentication import APIKeyAuthentication
+from core.utils.custom_throttles import EgyptianIDThrottle
+from core.utils.tracing import stage
+from national_ids.services import extract_national_id_cached
+from national_ids.views import INSUFFICIENT_TOKENS, APIUsageMixin, EgyptianIDExtractorAPIView
+from users.leasing import charge_tokens, has_tokens
+
+logger = logging.getLogger(__name__)
+
+JSON_ACCEPT = {'', '*/*', 'application/json'}
+
+renderer = FastJSONRenderer()
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class EgyptianIDExtractorLeanView(APIUsageMixin, View):
+    fallback = staticmethod(EgyptianIDExtractorAPIView.as_view())
+    success_message = EgyptianIDExtractorAPIView.success_message
+    error_message = EgyptianIDExtractorAPIView.error_message
+    # The headers DRF adds to every response of the view: Allow, and Vary when it has
+    # more than one renderer
+    headers = EgyptianIDExtractorAPIView().default_response_headers
+
+    def dispatch(self, request, *args, **kwargs):
+        id_value = self._national_id(request)
+        if id_value is None:
+            return self.fallback(request, *args, **kwargs)
+        try:
+            request.user, request.auth = APIKeyAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return self.fallback(request, *args, **kwargs)
+
+        throttle = EgyptianIDThrottle()
+        if not throttle.allow_request(request, self):
+            exc = Throttled(throttle.wait())
+            response = self._response({'detail': exc.detail}, status.HTTP_429_TOO_MANY_REQUESTS)
+            if exc.wait:
+                response['Retry-After'] = '%d' % exc.wait
+            return response
+
+        try:
+            with stage('extract'):
+                extracted_data, errors = extract_national_id_cached(id_value)
+            if errors:
+                # Same order as EgyptianIDExtractorAPIView: out of tokens beats an invalid ID
+                if not has_tokens(request.user, 1):
+                    self._log_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                    return self._response(INSUFFICIENT_TOKENS, status.HTTP_402_PAYMENT_REQUIRED)
+                self._log_usage(request, 0, status.HTTP_400_BAD_REQUEST)
+                return self._response(errors, status.HTTP_400_BAD_REQUEST)
+
+            if not charge_tokens(request.user, 1):
+                self._log_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                return self._response(INSUFFICIENT_TOKENS, status.HTTP_402_PAYMENT_REQUIRED)
+
+            self._log_usage(request, 1, status.HTTP_200_OK)
+            return self._response(extracted_data, status.HTTP_200_OK)
+
+        except Exception as e:
+            self._log_usage(request, 0, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.error(f"Error extracting ID: {e}")
+            return self._response(
+                {"success": False, "message": str(e), "data": None, "errors": [str(e)]},
+                status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def _national_id(self, request):
+        """The ID of a request this view answers itself, None for any other request."""
+        if (
+            request.method != 'POST'
+            or request.content_type != 'application/json'
+            or request.content_params.get('charset', 'utf-8').lower() != 'utf-8'
+            or request.headers.get('Accept', '') not in JSON_ACCEPT
+            or not request.headers.get('X-API-Key')
+            # Stored responses of idempotent requests are served by the DRF view
+            or 'Idempotency-Key' in request.headers
+        ):
+            return None
+        try:
+            payload = orjson.loads(request.body)
+        except orjson.JSONDecodeError:
+            return None
+        id_value = payload.get('national_id') if type(payload) is dict else None
+        return id_value if isinstance(id_value, str) else None
+
+    def _response(self, payload, status_code: int) -> HttpResponse:
+        is_success = status_code == status.HTTP_200_OK
+        content = renderer.render(Envelope({
+            'success': is_success,
+            'message': self.success_message if is_success else self.error_message,
+            'data': payload if is_success else None,
+            'errors': payload if not is_success else None,
+        }))
+        return HttpResponse(content, status=status_code, content_type='application/json', headers=self.headers)
@@ -0,0 +1,117 @@
+"""
+Precomputed date lookup table for Egyptian national IDs.
+
+Every century + YYMMDD prefix (the first seven digits of an ID) maps to a status
+byte, and valid prefixes also map to their `date` object. Validation then becomes a
+table lookup instead of building a `date` and catching exceptions for every ID.
+"""
+import threading
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from .constants import EGYPTIAN_GOVERNORATE_CODES
+
+STATUS_OK = 0
+STATUS_INVALID_YEAR = 1
+STATUS_INVALID_MONTH = 2
+STATUS_INVALID_DAY = 3
+STATUS_INVALID_DATE_OF_BIRTH = 4
+
+CENTURY_BASE_YEARS = {2: 1900, 3: 2000}
+FIRST_CENTURY_DIGIT = min(CENTURY_BASE_YEARS)
+CENTURY_SIZE = 1_000_000
+
+# Two-digit governorate code -> governorate name, None for unknown codes
+GOVERNORATE_TABLE: Tuple[Optional[str], ...] = tuple(
+    EGYPTIAN_GOVERNORATE_CODES.get(f"{code:02d}") for code in range(100)
+)
+
+
+class DateTable:
+    """
+    Status and date of birth for every valid century digit and YYMMDD combination.
+    Entries are indexed by the integer value of the first seven ID digits. A table
+    is never modified once built, so lookups in flight keep a consistent view while
+    the next day's table replaces it.
+    """
+
+    def __init__(self, today: date):
+        self.today = today
+        self.status = bytearray([STATUS_INVALID_MONTH]) * (CENTURY_SIZE * len(CENTURY_BASE_YEARS))
+        self.dates: Dict[int, date] = {}
+        for century in CENTURY_BASE_YEARS:
+            for year_part in range(100):
+                self._fill_year(century, year_part)
+
+    def lookup(self, prefix: int) -> int:
+        """Return the status of a seven digit century + YYMMDD prefix."""
+        return self.status[prefix - FIRST_CENTURY_DIGIT * CENTURY_SIZE]
+
+    def date_of_birth(self, prefix: int) -> Optional[date]:
+        return self.dates.get(prefix)
+
+    def advance(self, today: date) -> 'DateTable':
+        """
+        Return the table for a new day. Only the years between the old and the new
+        date can change status, so the new table copies this one and rebuilds only
+        those blocks.
+        """
+        table = DateTable.__new__(DateTable)
+        table.today = today
+        table.status = bytearray(self.status)
+        table.dates = dict(self.dates)
+        for year in range(min(self.today.year, today.year), max(self.today.year, today.year) + 1):
+            for century, base_year in CENTURY_BASE_YEARS.items():
+                if 0 <= year - base_year < 100:
+                    table._fill_year(century, year - base_year)
+        return table
+
+    def _fill_year(self, century: int, year_part: int) -> None:
+        """Rebuild the 10,000 entries of one birth year, while the table is being built."""
+        year = CENTURY_BASE_YEARS[century] + year_part
+        start = (century - FIRST_CENTURY_DIGIT) * CENTURY_SIZE + year_part * 10_000
+        prefix = century * CENTURY_SIZE + year_part * 10_000
+        future_year = year > self.today.year
+        block = bytearray([STATUS_INVALID_YEAR if future_year else STATUS_INVALID_MONTH]) * 10_000
+        stale = []
+
+        for month in range(1, 13):
+            if not future_year:
+                block[month * 100:month * 100 + 100] = bytes([STATUS_INVALID_DAY]) * 100
+            for day in range(1, 32):
+                offset = month * 100 + day
+                try:
+                    date_of_birth = date(year, month, day)
+                except ValueError:
+                    date_of_birth = None
+                if future_year:
+                    stale.append(prefix + offset)
+                elif date_of_birth is None or date_of_birth > self.today:
+                    block[offset] = STATUS_INVALID_DATE_OF_BIRTH
+                    stale.append(prefix + offset)
+                else:
+                    block[offset] = STATUS_OK
+                    self.dates[prefix + offset] = date_of_birth
+
+        self.status[start:start + 10_000] = block
+        for key in stale:
+            self.dates.pop(key, None)
+
+
+_table: Optional[DateTable] = None
+_lock = threading.Lock()
+
+
+def get_date_table(today: date) -> DateTable:
+    """Return the process-wide table, building it on first use and advancing it on a new day."""
+    global _table
+    table = _table
+    if table is not None and table.today == today:
+        return table
+    with _lock:
+        if _table is None:
+            _table = DateTable(today)
+        elif _table.today != today:
+            # Published with one reference swap, once every block is rebuilt
+            _table = _table.advance(today)
+        return _table
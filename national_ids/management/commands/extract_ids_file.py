@@ -0,0 +1,143 @@
+import mmap
+import multiprocessing
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from national_ids.bulk import (
+    ENCODERS, INPUT_FORMATS, OUTPUTS, ChunkTask, check_offset, iter_chunks, load_progress, process_chunk,
+    progress_path, save_progress,
+)
+
+
+def _init_worker():
+    # Forked workers inherit the configured project, spawned ones set it up again
+    if not apps.ready:
+        django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Validate and extract every ID of a file, offline, across a pool of processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Newline-delimited (or single-column CSV) or fixed-width file of IDs')
+        parser.add_argument('output', help='File to write, its progress is kept next to it in OUTPUT.progress')
+        parser.add_argument(
+            '--format', choices=ENCODERS, dest='output_format',
+            help='Output format, defaults to the output extension (csv, ndjson or npz)',
+        )
+        parser.add_argument('--input-format', choices=INPUT_FORMATS, default='lines')
+        parser.add_argument(
+            '--record-width', type=int, default=15,
+            help='Bytes per record of a fixed-width input, separator included (default 15)',
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            '--chunk-size', type=int, default=4 * 1024 * 1024,
+            help='Input bytes per chunk, bounds the memory of each worker (default 4 MiB)',
+        )
+        parser.add_argument('--offset', type=int, default=0, help='Input byte offset to start from')
+        parser.add_argument('--resume', action='store_true', help='Continue an interrupted run from its progress file')
+        parser.add_argument('--progress-interval', type=float, default=5.0, help='Seconds between progress lines')
+
+    def handle(self, *args, **options):
+        input_path = Path(options['input']).resolve()
+        output = Path(options['output'])
+        output_format = options['output_format'] or output.suffix.lstrip('.')
+        if output_format not in ENCODERS:
+            raise CommandError(f"Unknown output format '{output_format}', pass --format")
+        if options['record_width'] < 1 or options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--record-width, --chunk-size and --workers must be positive')
+
+        settings = {
+            'input': str(input_path),
+            'input_size': input_path.stat().st_size,
+            'input_format': options['input_format'],
+            'record_width': options['record_width'],
+            'output_format': output_format,
+        }
+        state = None
+        if options['resume']:
+            state = load_progress(output)
+            if state is None:
+                raise CommandError(f'No progress to resume in {progress_path(output)}')
+            if {name: state.get(name) for name in settings} != settings:
+                raise CommandError('The progress file belongs to a run with another input or format')
+        start = state['input_offset'] if state else options['offset']
+
+        with open(input_path, 'rb') as input_file:
+            # mmap cannot map an empty file
+            data = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) if settings['input_size'] else b''
+            try:
+                problem = check_offset(data, start, options['input_format'], options['record_width'])
+                if problem:
+                    raise CommandError(problem)
+                chunks = list(iter_chunks(
+                    data, start, options['chunk_size'], options['input_format'], options['record_width']
+                ))
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
+        target = OUTPUTS[output_format](output, output_format)
+        target.open(state)
+        progress = {**settings, 'input_offset': start, 'rows': state['rows'] if state else 0}
+        try:
+            self._run(chunks, settings, options, target, progress, output)
+        finally:
+            target.close()
+        target.finish()
+        progress_path(output).unlink(missing_ok=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Extracted {progress['rows']} IDs from {input_path.name} into {output} ({output_format})"
+        ))
+
+    def _run(self, chunks, settings, options, target, progress, output):
+        tasks = (
+            ChunkTask(
+                settings['input'], settings['input_size'], chunk_start, chunk_end,
+                settings['input_format'], settings['record_width'], settings['output_format'],
+            )
+            for chunk_start, chunk_end in chunks
+        )
+        started = last_report = time.monotonic()
+        rows_at_start = progress['rows']
+
+        for result in self._process(tasks, options['workers']):
+            target.write(result)
+            progress.update(target.state(), input_offset=result.end, rows=progress['rows'] + result.rows)
+            save_progress(output, progress)
+
+            now = time.monotonic()
+            if now - last_report >= options['progress_interval']:
+                last_report = now
+                rate = (progress['rows'] - rows_at_start) / (now - started)
+                share = result.end / settings['input_size']
+                self.stdout.write(
+                    f"{result.end / 2 ** 20:.1f} of {settings['input_size'] / 2 ** 20:.1f} MiB ({share:.0%}), "
+                    f"{progress['rows']} IDs, {rate:,.0f} IDs/s"
+                )
+
+    def _process(self, tasks, workers):
+        """Results of the tasks in input order, with at most two chunks per worker in flight."""
+        if workers == 1:
+            yield from map(process_chunk, tasks)
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(process_chunk, (task,)))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
@@ -0,0 +1,119 @@
+"""
+Single-pass parser for Egyptian national IDs.
+
+The ID is read once and every field is derived from that read, so validation and
+extraction share the same work instead of slicing and converting the digits twice.
+"""
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, NamedTuple
+
+from .constants import EGYPTIAN_GOVERNORATE_CODES
+from .lookup_tables import (
+    CENTURY_BASE_YEARS,
+    GOVERNORATE_TABLE,
+    STATUS_INVALID_DATE_OF_BIRTH,
+    STATUS_INVALID_DAY,
+    STATUS_INVALID_MONTH,
+    STATUS_INVALID_YEAR,
+    STATUS_OK,
+    get_date_table,
+)
+
+ID_LENGTH = 14
+VALID_CENTURY_DIGITS = tuple(CENTURY_BASE_YEARS)
+
+_DATE_STATUS_MESSAGES = {
+    STATUS_INVALID_YEAR: "Invalid year",
+    STATUS_INVALID_MONTH: "Invalid month",
+    STATUS_INVALID_DAY: "Invalid day",
+    STATUS_INVALID_DATE_OF_BIRTH: "Invalid date of birth",
+}
+
+# (today, unix timestamp of the next local midnight)
+_today_cache = (date.min, 0.0)
+
+
+class InvalidNationalID(ValueError):
+    """Raised with the message EgyptianIDSerializer reports for the ID."""
+
+
+class ParsedNationalID(NamedTuple):
+    national_id: str
+    century: int
+    year: int
+    month: int
+    day: int
+    date_of_birth: date
+    governorate: str
+    gender: str
+
+    def as_data(self) -> Dict[str, Any]:
+        """Return the fields exposed by EgyptianIDExtractor.get_data()"""
+        return {
+            "national_id": self.national_id,
+            "date_of_birth": self.date_of_birth,
+            "governorate": self.governorate,
+            "gender": self.gender,
+        }
+
+
+def cached_today() -> date:
+    """Return today's date, only recomputing it once the calendar day has changed."""
+    global _today_cache
+    today, expires_at = _today_cache
+    if time.time() >= expires_at:
+        today = date.today()
+        expires_at = datetime.combine(today + timedelta(days=1), datetime.min.time()).timestamp()
+        _today_cache = (today, expires_at)
+    return today
+
+
+def parse_national_id(value: Any) -> ParsedNationalID:
+    """
+    Validate and extract an ID in one pass.
+    Raises InvalidNationalID with the first failing rule, in the serializer's order.
+    """
+    if not isinstance(value, str):
+        raise InvalidNationalID("ID value must be a string")
+
+    if not value.isdigit():
+        raise InvalidNationalID("ID value must be digits only")
+
+    if len(value) != ID_LENGTH:
+        raise InvalidNationalID(f"ID value must be {ID_LENGTH} digits")
+
+    try:
+        number = int(value)
+    except ValueError:
+        raise InvalidNationalID("ID value must be digits only")
+
+    century = number // 10_000_000_000_000
+    if century not in VALID_CENTURY_DIGITS:
+        raise InvalidNationalID("Invalid century digit")
+
+    prefix = number // 10_000_000
+    table = get_date_table(cached_today())
+    status = table.lookup(prefix)
+    if status != STATUS_OK:
+        raise InvalidNationalID(_DATE_STATUS_MESSAGES[status])
+    date_of_birth = table.date_of_birth(prefix)
+
+    if value.isascii():
+        governorate = GOVERNORATE_TABLE[number // 100_000 % 100]
+    else:
+        # Non-ASCII digits only match a governorate when its two digits are ASCII
+        governorate = EGYPTIAN_GOVERNORATE_CODES.get(value[7:9])
+    if governorate is None:
+        raise InvalidNationalID("Invalid governorate code")
+
+    return ParsedNationalID(
+        national_id=value,
+        century=century,
+        year=date_of_birth.year,
+        month=date_of_birth.month,
+        day=date_of_birth.day,
+        date_of_birth=date_of_birth,
+        governorate=governorate,
+        gender="male" if number // 10 % 2 != 0 else "female",
+    )
@@ -1,8 +1,9 @@
+from django.conf import settings
 from rest_framework import serializers
-from datetime import date
 
 from core.base.serializers import BaseSerializer
 from .constants import EGYPTIAN_GOVERNORATE_CODES
+from .parsing import InvalidNationalID, VALID_CENTURY_DIGITS, parse_national_id
 
 
 class EgyptianIDSerializer(BaseSerializer):
@@ -12,72 +13,40 @@ class EgyptianIDSerializer(BaseSerializer):
     national_id = serializers.CharField(max_length=14, min_length=14)
     
     GOVERNORATE_CODES = EGYPTIAN_GOVERNORATE_CODES
-    VALID_CENTURIES_DIGITS = [2, 3]
-
+    VALID_CENTURIES_DIGITS = list(VALID_CENTURY_DIGITS)
 
     def validate_national_id(self, value):
         """
-        Main validation method that orchestrates all validations.
+        Validate the ID in a single pass. The parsed fields are kept on
+        `parsed_national_id` so extraction does not have to parse the ID again.
         """
-        
-        if not isinstance(value, str):
-            raise serializers.ValidationError("ID value must be a string")
-        
-        if not value.isdigit():
-            raise serializers.ValidationError("ID value must be digits only")
-        
-        self._validate_century(value)
-        self._validate_year(value)
-        self._validate_month(value)
-        self._validate_day(value)
-        self._validate_date_of_birth(value)
-        self._validate_governorate(value)
-        
+        try:
+            self.parsed_national_id = parse_national_id(value)
+        except InvalidNationalID as e:
+            raise serializers.ValidationError(str(e))
         return value
 
-    def _validate_century(self, id_value):
-        """Validate century digit (first digit)"""
-        century_digit = int(id_value[0])
-        if century_digit not in self.VALID_CENTURIES_DIGITS:
-            raise serializers.ValidationError("Invalid century digit")
-
-    def _validate_year(self, id_value):
-        """Validate year (second and third digits)"""
-        century = int(id_value[0])
-        year_part = int(id_value[1:3])
-        full_year = (1900 if century == 2 else 2000) + year_part
-        
-        if full_year > date.today().year:
-            raise serializers.ValidationError("Invalid year")
 
-    def _validate_month(self, id_value):
-        """Validate month (fourth and fifth digits)"""
-        month = int(id_value[3:5])
-        if month not in range(1, 13):
-            raise serializers.ValidationError("Invalid month")
-
-    def _validate_day(self, id_value):
-        """Validate day (sixth and seventh digits)"""
-        day = int(id_value[5:7])
-        if day not in range(1, 32):
-            raise serializers.ValidationError("Invalid day")
+class EgyptianIDBatchSerializer(BaseSerializer):
+    """
+    Serializer for a batch of Egyptian national IDs.
+    Each ID is validated on its own so one bad ID does not fail the whole batch.
+    """
+    national_ids = serializers.ListField(allow_empty=False)
+
+    def validate_national_ids(self, value):
+        max_size = settings.NATIONAL_ID_BATCH_MAX_SIZE
+        if len(value) > max_size:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than {max_size} elements."
+            )
+        return value
 
-    def _validate_date_of_birth(self, id_value):
-        """Validate the complete date of birth (year, month, day)"""
-        try:
-            century = int(id_value[0])
-            year = (1900 if century == 2 else 2000) + int(id_value[1:3])
-            month = int(id_value[3:5])
-            day = int(id_value[5:7])
-            
-            date_of_birth = date(year, month, day)
-            if date_of_birth > date.today():
-                raise serializers.ValidationError("Invalid date of birth")
-        except ValueError:
-            raise serializers.ValidationError("Invalid date of birth")
 
-    def _validate_governorate(self, id_value):
-        """Validate governorate code (eighth and ninth digits)"""
-        governorate_code = id_value[7:9]
-        if governorate_code not in self.GOVERNORATE_CODES:
-            raise serializers.ValidationError("Invalid governorate code")
\ No newline at end of file
+class EgyptianIDAggregateSerializer(EgyptianIDBatchSerializer):
+    """
+    Serializer for a batch of Egyptian national IDs to aggregate, with the width
+    of the birth year buckets and whether to count invalid IDs by reason.
+    """
+    year_bucket = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    invalid_reasons = serializers.BooleanField(default=False)
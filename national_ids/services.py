@@ -1,11 +1,27 @@
 from core.base.national_id_extractors import BaseIDExtractor
+from core.utils.tracing import stage
 from .constants import EGYPTIAN_GOVERNORATE_CODES
+from .parsing import InvalidNationalID, ParsedNationalID, parse_national_id
+from .serializers import EgyptianIDSerializer
+from . import vectorized
+from .cache import get_extraction_cache
+from .vectorized import extract_columns
+from collections import Counter
 from datetime import date
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# First year an ID can hold, birth year buckets of aggregate_national_ids start from it
+FIRST_BIRTH_YEAR = 1900
 
 class EgyptianIDExtractor(BaseIDExtractor):
     GOVERNORATE_CODES = EGYPTIAN_GOVERNORATE_CODES
 
+    def __init__(self, id_value: str, parsed: Optional[ParsedNationalID] = None):
+        super().__init__(id_value)
+        self.parsed = parsed
+
     def _extract_century(self) -> int:
         """Extract century from ID (first digit)"""
         return int(self.id_value[0])
@@ -39,9 +55,172 @@ class EgyptianIDExtractor(BaseIDExtractor):
 
     def get_data(self) -> Dict[str, Any]:
         """Extract all data from ID (date of birth, governorate, gender)"""
+        parsed = self.parsed
+        if parsed is None:
+            try:
+                parsed = self.parsed = parse_national_id(self.id_value)
+            except InvalidNationalID:
+                # Unvalidated IDs keep the lenient per-field extraction
+                return self._extract_fields()
+        return parsed.as_data()
+
+    def _extract_fields(self) -> Dict[str, Any]:
         return {
             "national_id": self.id_value,
             "date_of_birth": self._extract_date_of_birth(),
             "governorate": self._extract_governorate(),
             "gender": self._extract_gender(),
         }
+
+
+def validate_and_extract(payload: Any) -> Tuple[Optional[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
+    """Validate a request payload holding a `national_id` and extract it, returning (data, errors)"""
+    serializer = EgyptianIDSerializer(data=payload)
+    with stage('validate'):
+        is_valid = serializer.is_valid()
+    if not is_valid:
+        return None, serializer._error_formatter(serializer.errors)
+    extractor = EgyptianIDExtractor(
+        serializer.validated_data['national_id'], parsed=serializer.parsed_national_id
+    )
+    return extractor.get_data(), None
+
+
+def extract_national_id(id_value: Any) -> Tuple[Optional[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
+    """Validate and extract a single ID, returning (data, errors)"""
+    return validate_and_extract({'national_id': id_value})
+
+
+def extract_national_id_cached(id_value: str) -> Tuple[Optional[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
+    """Same as extract_national_id, served from the extraction result cache when possible"""
+    return get_extraction_cache().get_or_extract(id_value, extract_national_id)
+
+
+def extract_national_ids(id_values: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Validate and extract many IDs, returning one result per ID in input order.
+    Identical IDs are only computed once, using the vectorized engine.
+    """
+    unique_ids, positions = _unique_ids(id_values)
+    columns = extract_columns(unique_ids)
+    computed = [
+        _build_result(id_value, code, year, month, day, governorate_index, is_male)
+        for id_value, code, year, month, day, governorate_index, is_male in zip(
+            unique_ids,
+            columns.error_code.tolist(),
+            columns.year.tolist(),
+            columns.month.tolist(),
+            columns.day.tolist(),
+            columns.governorate_index.tolist(),
+            columns.is_male.tolist(),
+        )
+    ]
+    return [computed[position] for position in positions]
+
+
+def aggregate_national_ids(
+    id_values: Iterable[Any], year_bucket: int = 10, invalid_reasons: bool = False
+) -> Dict[str, Any]:
+    """
+    Validate and extract many IDs and count the valid ones by governorate, birth
+    year bucket and gender, and the invalid ones by reason when asked. Counts are
+    taken with np.bincount over the engine's integer columns, weighted by how often
+    each distinct ID occurs, so no per-ID result is built.
+    """
+    unique_ids, positions = _unique_ids(id_values)
+    weights = np.bincount(np.asarray(positions, dtype=np.intp), minlength=len(unique_ids))
+    columns = extract_columns(unique_ids)
+    error_code = columns.error_code.copy()
+    year = columns.year.copy()
+    governorate_index = columns.governorate_index.astype(np.intp)
+    is_male = columns.is_male.astype(np.intp)
+    fallback_reasons = Counter()
+
+    # As in extract_national_ids, the serializer decides the rows the engine cannot read
+    for index in np.flatnonzero(error_code == vectorized.INVALID_FORMAT).tolist():
+        data, errors = extract_national_id(unique_ids[index])
+        if errors is None:
+            error_code[index] = vectorized.OK
+            year[index] = data['date_of_birth'].year
+            governorate_index[index] = vectorized.GOVERNORATE_NAMES.index(data['governorate'])
+            is_male[index] = data['gender'] == 'male'
+        else:
+            fallback_reasons['; '.join(error['message'] for error in errors)] += int(weights[index])
+
+    valid = error_code == vectorized.OK
+    valid_weights = weights[valid]
+    by_governorate = np.bincount(
+        governorate_index[valid], valid_weights, minlength=len(vectorized.GOVERNORATE_NAMES)
+    )
+    by_year = np.bincount((year[valid] - FIRST_BIRTH_YEAR) // year_bucket, valid_weights)
+    by_gender = np.bincount(is_male[valid], valid_weights, minlength=2)
+
+    total = int(weights.sum())
+    valid_count = int(valid_weights.sum())
+    aggregates = {
+        "total": total,
+        "valid": valid_count,
+        "invalid": total - valid_count,
+        "by_governorate": {
+            vectorized.GOVERNORATE_NAMES[index]: int(by_governorate[index])
+            for index in np.flatnonzero(by_governorate).tolist()
+        },
+        "by_birth_year": {
+            _year_bucket_label(FIRST_BIRTH_YEAR + index * year_bucket, year_bucket): int(by_year[index])
+            for index in np.flatnonzero(by_year).tolist()
+        },
+        "by_gender": {"male": int(by_gender[1]), "female": int(by_gender[0])},
+    }
+    if invalid_reasons:
+        by_code = np.bincount(error_code[~valid], weights[~valid], minlength=len(vectorized.ERROR_MESSAGES) + 1)
+        reasons = fallback_reasons + Counter({
+            vectorized.ERROR_MESSAGES[code]: int(by_code[code])
+            for code in np.flatnonzero(by_code).tolist()
+            if code != vectorized.INVALID_FORMAT
+        })
+        aggregates["invalid_reasons"] = dict(reasons.most_common())
+    return aggregates
+
+
+def _year_bucket_label(start: int, year_bucket: int) -> str:
+    return str(start) if year_bucket == 1 else f"{start}-{start + year_bucket - 1}"
+
+
+def _unique_ids(id_values: Iterable[Any]) -> Tuple[List[Any], List[int]]:
+    """The distinct IDs, and the position of each input ID among them. Non-strings are never merged."""
+    unique_ids = []
+    positions = []
+    seen = {}
+    for id_value in id_values:
+        if isinstance(id_value, str):
+            position = seen.get(id_value)
+            if position is None:
+                position = seen[id_value] = len(unique_ids)
+                unique_ids.append(id_value)
+        else:
+            position = len(unique_ids)
+            unique_ids.append(id_value)
+        positions.append(position)
+    return unique_ids, positions
+
+
+def _build_result(id_value, code, year, month, day, governorate_index, is_male) -> Dict[str, Any]:
+    data, errors = None, None
+    if code == vectorized.OK:
+        data = {
+            "national_id": id_value,
+            "date_of_birth": date(year, month, day),
+            "governorate": vectorized.GOVERNORATE_NAMES[governorate_index],
+            "gender": "male" if is_male else "female",
+        }
+    elif code == vectorized.INVALID_FORMAT:
+        data, errors = extract_national_id(id_value)
+    else:
+        errors = [{'field': 'national_id', 'message': vectorized.ERROR_MESSAGES[code]}]
+
+    return {
+        "national_id": id_value,
+        "valid": errors is None,
+        "data": data,
+        "errors": errors,
+    }
@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from rest_framework.utils.encoders import JSONEncoder
+
+# Longest line read from the request body at once, keeps memory bounded on bad input
+MAX_LINE_LENGTH = 1024
+CSV_HEADER = 'national_id'
+
+
+def read_national_ids(stream: Optional[Any], content_type: str) -> Iterator[str]:
+    """
+    Lazily read IDs from a request body, one per line.
+    Plain text / NDJSON bodies hold one ID per line; CSV bodies use the first column.
+    """
+    if stream is None:
+        return
+
+    lines = (line.decode('utf-8', errors='replace') for line in _read_lines(stream))
+
+    if content_type == 'text/csv':
+        for index, row in enumerate(csv.reader(lines)):
+            if not row:
+                continue
+            value = row[0].strip()
+            if index == 0 and value == CSV_HEADER:
+                continue
+            if value:
+                yield value
+    else:
+        for line in lines:
+            value = line.strip().strip('"')
+            if value:
+                yield value
+
+
+def _read_lines(stream: Any) -> Iterator[bytes]:
+    """
+    Lines of the stream, each cut to its first MAX_LINE_LENGTH bytes: the rest of a
+    longer line is skipped, so it yields one (invalid) ID rather than several.
+    """
+    while True:
+        line = stream.readline(MAX_LINE_LENGTH)
+        if not line:
+            return
+        if len(line) == MAX_LINE_LENGTH and not line.endswith(b'\n'):
+            rest = line
+            while rest and not rest.endswith(b'\n'):
+                rest = stream.readline(MAX_LINE_LENGTH)
+        yield line
+
+
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Split an iterable into lists of at most `size` items without materializing it."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class NDJSONWriter:
+    content_type = 'application/x-ndjson'
+
+    def header(self) -> str:
+        return ''
+
+    def rows(self, results: List[Dict[str, Any]]) -> str:
+        return ''.join(self._dumps(result) for result in results)
+
+    def error(self, message: str, detail: str) -> str:
+        return self._dumps({
+            "success": False,
+            "message": message,
+            "data": None,
+            "errors": [{"detail": detail}],
+        })
+
+    def _dumps(self, obj: Dict[str, Any]) -> str:
+        return json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class CSVWriter:
+    content_type = 'text/csv'
+    columns = ['national_id', 'valid', 'date_of_birth', 'governorate', 'gender', 'errors']
+
+    def header(self) -> str:
+        return self._write([self.columns])
+
+    def rows(self, results: List[Dict[str, Any]]) -> str:
+        return self._write(self._row(result) for result in results)
+
+    def error(self, message: str, detail: str) -> str:
+        return self._write([['', 'false', '', '', '', f"{message}: {detail}"]])
+
+    def _row(self, result: Dict[str, Any]) -> List[Any]:
+        if result['valid']:
+            data = result['data']
+            return [
+                result['national_id'], 'true', data['date_of_birth'].isoformat(),
+                data['governorate'], data['gender'], '',
+            ]
+        messages = '; '.join(error['message'] for error in result['errors'])
+        return [result['national_id'], 'false', '', '', '', messages]
+
+    def _write(self, rows: Iterable[List[Any]]) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+
+STREAM_WRITERS = {
+    'ndjson': NDJSONWriter,
+    'csv': CSVWriter,
+}
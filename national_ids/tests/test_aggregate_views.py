@@ -0,0 +1,87 @@
+import pytest
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from users.models import User, APIKey, APIUsage
+
+
+@pytest.mark.django_db
+class TestEgyptianIDAggregateAPIView(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=10
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.url = reverse('national_ids:extract-egyptian-id-aggregate')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+
+    def test_grouped_counts(self):
+        response = self.client.post(self.url, {
+            'national_ids': ['29001010123456', '30101011234567', '29001010123456', '123']
+        }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()['data']
+        assert data == {
+            'total': 4,
+            'valid': 3,
+            'invalid': 1,
+            'by_governorate': {'Cairo': 2, 'Dakahlia': 1},
+            'by_birth_year': {'1990-1999': 2, '2000-2009': 1},
+            'by_gender': {'male': 2, 'female': 1},
+            'tokens_used': 3,
+        }
+
+    def test_invalid_reasons_and_year_bucket(self):
+        response = self.client.post(self.url, {
+            'national_ids': ['29001010123456', '29013010123456', '29013010123456', '123'],
+            'year_bucket': 5,
+            'invalid_reasons': True,
+        }, format='json')
+
+        data = response.json()['data']
+        assert data['by_birth_year'] == {'1990-1994': 1}
+        assert data['invalid_reasons'] == {
+            'Invalid month': 2,
+            'Ensure this field has at least 14 characters.': 1,
+        }
+
+    def test_response_size_independent_of_input_size(self):
+        small = self.client.post(self.url, {'national_ids': ['29001010123456', '123']}, format='json')
+        User.objects.filter(pk=self.user.pk).update(tokens_balance=1000)
+        large = self.client.post(self.url, {'national_ids': ['29001010123456', '123'] * 400}, format='json')
+
+        assert large.json()['data']['total'] == 800
+        assert len(large.content) - len(small.content) < 20
+
+    def test_tokens_and_usage_per_id(self):
+        initial_count = APIUsage.objects.count()
+
+        self.client.post(self.url, {'national_ids': ['29001010123456', '123', '29001010123456']}, format='json')
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 8
+        assert APIUsage.objects.count() == initial_count + 3
+        statuses = sorted(APIUsage.objects.values_list('response_status', flat=True))
+        assert statuses == ['200', '200', '400']
+
+    def test_insufficient_tokens(self):
+        response = self.client.post(self.url, {'national_ids': ['29001010123456'] * 11}, format='json')
+
+        self.user.refresh_from_db()
+        assert response.status_code == status.HTTP_402_PAYMENT_REQUIRED
+        assert self.user.tokens_balance == 10
+
+    def test_invalid_year_bucket(self):
+        response = self.client.post(self.url, {
+            'national_ids': ['29001010123456'], 'year_bucket': 0
+        }, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()['errors'][0]['field'] == 'year_bucket'
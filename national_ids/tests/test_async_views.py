@@ -0,0 +1,198 @@
+import pytest
+from unittest.mock import patch
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.utils.custom_throttles import EgyptianIDThrottle
+from core.utils.rate_limiting import get_rate_limit_backend
+from national_ids.views import (
+    EgyptianIDAggregateAsyncAPIView, EgyptianIDBatchExtractorAsyncAPIView, EgyptianIDExtractorAsyncAPIView,
+)
+from users.models import APIKey, APIUsage, User
+
+# Mounts the async views under the names the sync views have in core.urls
+urlpatterns = [
+    path('api/v1/national-ids/', include(([
+        path('egyptian-id/extract/', EgyptianIDExtractorAsyncAPIView.as_view(), name='extract-egyptian-id'),
+        path(
+            'egyptian-id/extract/batch/',
+            EgyptianIDBatchExtractorAsyncAPIView.as_view(),
+            name='extract-egyptian-id-batch',
+        ),
+        path(
+            'egyptian-id/extract/aggregate/',
+            EgyptianIDAggregateAsyncAPIView.as_view(),
+            name='extract-egyptian-id-aggregate',
+        ),
+    ], 'national_ids'))),
+]
+
+ASYNC_URLS = 'national_ids.tests.test_async_views'
+
+
+@pytest.mark.django_db
+@override_settings(RATE_LIMITING={'BACKEND': 'local'})
+class TestAsyncExtractorParity(TestCase):
+    """The async views must answer exactly like the sync ones."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=100
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        get_rate_limit_backend().clear()
+
+    def _both(self, name, payload, **extra):
+        """POST the payload to the sync and the async view, with a fresh rate limit for each."""
+        responses = []
+        for urlconf in (None, ASYNC_URLS):
+            get_rate_limit_backend().clear()
+            with override_settings(ROOT_URLCONF=urlconf or 'core.urls'):
+                responses.append(self.client.post(reverse(f'national_ids:{name}'), payload, format='json', **extra))
+        return responses
+
+    def assert_same(self, sync_response, async_response):
+        assert async_response.status_code == sync_response.status_code
+        assert async_response['Content-Type'] == sync_response['Content-Type']
+        assert async_response.content == sync_response.content
+
+    def test_async_views_are_coroutines(self):
+        view = EgyptianIDExtractorAsyncAPIView.as_view()
+        assert EgyptianIDExtractorAsyncAPIView.view_is_async
+        assert view.csrf_exempt
+
+    def test_valid_id(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        sync_response, async_response = self._both('extract-egyptian-id', {'national_id': '29001010123456'})
+
+        assert sync_response.status_code == status.HTTP_200_OK
+        self.assert_same(sync_response, async_response)
+
+    def test_invalid_id(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        sync_response, async_response = self._both('extract-egyptian-id', {'national_id': '123'})
+
+        assert sync_response.status_code == status.HTTP_400_BAD_REQUEST
+        self.assert_same(sync_response, async_response)
+
+    def test_missing_api_key(self):
+        sync_response, async_response = self._both('extract-egyptian-id', {'national_id': '29001010123456'})
+
+        assert sync_response.status_code == status.HTTP_403_FORBIDDEN
+        self.assert_same(sync_response, async_response)
+
+    def test_unknown_api_key(self):
+        self.client.credentials(HTTP_X_API_KEY='nid_unknown')
+        sync_response, async_response = self._both('extract-egyptian-id', {'national_id': '29001010123456'})
+
+        assert sync_response.status_code == status.HTTP_403_FORBIDDEN
+        self.assert_same(sync_response, async_response)
+
+    def test_insufficient_tokens(self):
+        User.objects.filter(pk=self.user.pk).update(tokens_balance=0)
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        sync_response, async_response = self._both('extract-egyptian-id', {'national_id': '29001010123456'})
+
+        assert sync_response.status_code == status.HTTP_402_PAYMENT_REQUIRED
+        self.assert_same(sync_response, async_response)
+
+    def test_insufficient_tokens_before_invalid_id(self):
+        User.objects.filter(pk=self.user.pk).update(tokens_balance=0)
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        sync_response, async_response = self._both('extract-egyptian-id', {'national_id': '123'})
+
+        assert sync_response.status_code == status.HTTP_402_PAYMENT_REQUIRED
+        self.assert_same(sync_response, async_response)
+
+    def test_throttled(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        with patch.object(EgyptianIDThrottle, 'rate', '1/hour'):
+            responses = []
+            for urlconf in ('core.urls', ASYNC_URLS):
+                get_rate_limit_backend().clear()
+                with override_settings(ROOT_URLCONF=urlconf):
+                    url = reverse('national_ids:extract-egyptian-id')
+                    self.client.post(url, {'national_id': '29001010123456'}, format='json')
+                    responses.append(self.client.post(url, {'national_id': '29001010123456'}, format='json'))
+
+        sync_response, async_response = responses
+        assert sync_response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        self.assert_same(sync_response, async_response)
+        assert async_response['Retry-After'] == sync_response['Retry-After']
+
+    def test_batch(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        sync_response, async_response = self._both(
+            'extract-egyptian-id-batch', {'national_ids': ['29001010123456', '123']}
+        )
+
+        assert sync_response.status_code == status.HTTP_200_OK
+        self.assert_same(sync_response, async_response)
+
+    def test_batch_validation_error(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        sync_response, async_response = self._both('extract-egyptian-id-batch', {'national_ids': []})
+
+        assert sync_response.status_code == status.HTTP_400_BAD_REQUEST
+        self.assert_same(sync_response, async_response)
+
+    def test_aggregate(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        sync_response, async_response = self._both(
+            'extract-egyptian-id-aggregate', {'national_ids': ['29001010123456', '123'], 'invalid_reasons': True}
+        )
+
+        assert sync_response.status_code == status.HTTP_200_OK
+        self.assert_same(sync_response, async_response)
+
+    def test_billing_and_usage_match(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        self._both('extract-egyptian-id-batch', {'national_ids': ['29001010123456', '123', '29001020223446']})
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 96
+        assert APIUsage.objects.filter(api_key=self.api_key).count() == 6
+
+
+@pytest.mark.django_db
+@override_settings(ROOT_URLCONF=ASYNC_URLS, RATE_LIMITING={'BACKEND': 'local'})
+class TestAsyncExtractorAPIView(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=100
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.url = reverse('national_ids:extract-egyptian-id')
+        get_rate_limit_backend().clear()
+
+    async def test_served_by_asgi_handler(self):
+        response = await self.async_client.post(
+            self.url,
+            {'national_id': '29001010123456'},
+            content_type='application/json',
+            headers={'X-API-Key': self.plain_key},
+        )
+
+        assert isinstance(response, HttpResponse)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['data']['governorate'] == 'Cairo'
+        await self.user.arefresh_from_db()
+        assert self.user.tokens_balance == 99
+        assert await APIUsage.objects.filter(api_key=self.api_key, response_status='200').acount() == 1
+
+    async def test_method_not_allowed(self):
+        response = await self.async_client.get(self.url, headers={'X-API-Key': self.plain_key})
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert response.json()['success'] is False
@@ -0,0 +1,117 @@
+import pytest
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from unittest.mock import patch
+from national_ids import services
+from users.models import User, APIKey, APIUsage
+
+
+@pytest.mark.django_db
+class TestEgyptianIDBatchExtractorAPIView(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=10
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.url = reverse('national_ids:extract-egyptian-id-batch')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+
+    def test_results_returned_in_input_order(self):
+        response = self.client.post(self.url, {
+            'national_ids': ['29001010123456', '123', '29001020223446']
+        }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()['data']
+        assert [r['national_id'] for r in data['results']] == ['29001010123456', '123', '29001020223446']
+        assert [r['valid'] for r in data['results']] == [True, False, True]
+        assert data['results'][0]['data']['governorate'] == 'Cairo'
+        assert data['results'][1]['data'] is None
+        assert data['results'][1]['errors'][0]['field'] == 'national_id'
+        assert data['valid'] == 2
+        assert data['invalid'] == 1
+
+    def test_tokens_deducted_for_valid_ids_only(self):
+        response = self.client.post(self.url, {
+            'national_ids': ['29001010123456', '123', '29001010123456']
+        }, format='json')
+
+        self.user.refresh_from_db()
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['data']['tokens_used'] == 2
+        assert self.user.tokens_balance == 8
+
+    def test_usage_logged_per_id(self):
+        initial_count = APIUsage.objects.count()
+
+        self.client.post(self.url, {
+            'national_ids': ['29001010123456', '123']
+        }, format='json')
+
+        assert APIUsage.objects.count() == initial_count + 2
+        statuses = sorted(APIUsage.objects.values_list('response_status', flat=True))
+        assert statuses == ['200', '400']
+
+    def test_duplicate_ids_extracted_once(self):
+        with patch.object(services, 'extract_columns', wraps=services.extract_columns) as mock_extract:
+            response = self.client.post(self.url, {
+                'national_ids': ['29001010123456'] * 5
+            }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert mock_extract.call_args.args[0] == ['29001010123456']
+        assert len(response.json()['data']['results']) == 5
+
+    def test_insufficient_tokens(self):
+        response = self.client.post(self.url, {
+            'national_ids': ['29001010123456'] * 11
+        }, format='json')
+
+        self.user.refresh_from_db()
+        assert response.status_code == status.HTTP_402_PAYMENT_REQUIRED
+        assert self.user.tokens_balance == 10
+
+    def test_charged_with_one_conditional_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {
+                'national_ids': ['29001010123456', '29001020223446']
+            }, format='json')
+
+        user_table = User._meta.db_table
+        updates = [query['sql'] for query in queries if query['sql'].startswith(f'UPDATE "{user_table}"')]
+        # A read-modify-write save() could overdraw under concurrent batches
+        assert len(updates) == 1
+        assert '"tokens_balance" >=' in updates[0]
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 8
+
+    @override_settings(NATIONAL_ID_BATCH_MAX_SIZE=2)
+    def test_batch_size_limit(self):
+        response = self.client.post(self.url, {
+            'national_ids': ['29001010123456'] * 3
+        }, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()['errors'][0]['field'] == 'national_ids'
+
+    def test_empty_batch(self):
+        response = self.client.post(self.url, {'national_ids': []}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_missing_api_key(self):
+        self.client.credentials()
+        response = self.client.post(self.url, {
+            'national_ids': ['29001010123456']
+        }, format='json')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,80 @@
+import pytest
+from unittest.mock import MagicMock
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from national_ids.cache import ExtractionResultCache, get_extraction_cache
+from national_ids.services import extract_national_id
+from users.models import APIKey, User
+
+
+class TestExtractionResultCache:
+
+    def test_valid_result_computed_once(self):
+        result_cache = ExtractionResultCache(local_maxsize=10)
+        extract = MagicMock(side_effect=extract_national_id)
+
+        first = result_cache.get_or_extract('29001010123456', extract)
+        second = result_cache.get_or_extract('29001010123456', extract)
+
+        assert first == second
+        assert first[0]['governorate'] == 'Cairo'
+        assert extract.call_count == 1
+
+    def test_invalid_result_cached(self):
+        result_cache = ExtractionResultCache(local_maxsize=10)
+        extract = MagicMock(side_effect=extract_national_id)
+
+        result_cache.get_or_extract('29013010123456', extract)
+        data, errors = result_cache.get_or_extract('29013010123456', extract)
+
+        assert data is None
+        assert errors == [{'field': 'national_id', 'message': 'Invalid month'}]
+        assert extract.call_count == 1
+
+    def test_shared_tier_used_by_other_workers(self):
+        cache.clear()
+        worker_a = ExtractionResultCache(local_maxsize=10, shared_alias='default', shared_ttl=60)
+        worker_b = ExtractionResultCache(local_maxsize=10, shared_alias='default', shared_ttl=60)
+        extract = MagicMock(side_effect=extract_national_id)
+
+        worker_a.get_or_extract('29001010123456', extract)
+        worker_b.get_or_extract('29001010123456', extract)
+
+        assert extract.call_count == 1
+        assert worker_b.stats()['shared']['hits'] == 1
+        cache.clear()
+
+    def test_unusual_ids_skip_shared_tier(self):
+        result_cache = ExtractionResultCache(local_maxsize=10, shared_alias='default')
+        assert result_cache._shared_key(1, '2900 1010123456') is None
+        assert result_cache._shared_key(1, '29001010123456') is not None
+
+
+@pytest.mark.django_db
+class TestCachedResultBilling(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=10
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        get_extraction_cache().clear()
+
+    def test_cached_result_still_billed(self):
+        for _ in range(2):
+            response = self.client.post(reverse('national_ids:extract-egyptian-id'), {
+                'national_id': '29001010123456'
+            })
+            assert response.status_code == status.HTTP_200_OK
+            assert response.json()['data']['governorate'] == 'Cairo'
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 8
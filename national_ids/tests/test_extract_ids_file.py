@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+import numpy as np
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from national_ids.bulk import ChunkTask, iter_chunks, process_chunk, progress_path, save_progress
+from national_ids.services import extract_national_ids
+from national_ids.streaming import CSVWriter, NDJSONWriter
+
+IDS = [
+    '29001010123456',
+    '30101011234567',
+    '123',
+    '2900101012345X',
+    '39901010123456',
+    '29002300123456',
+    '29001019923456',
+    '29001010123456',
+    'not an id, with a comma',
+]
+
+
+class TestExtractIdsFile:
+
+    def setup_method(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = self._write('ids.txt', 'national_id\n' + '\n'.join(IDS) + '\n\n')
+
+    def _write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as input_file:
+            input_file.write(content)
+        return path
+
+    def _run(self, output_name, *args, **options):
+        output = os.path.join(self.directory, output_name)
+        call_command('extract_ids_file', self.input, output, *args, chunk_size=40, stdout=StringIO(), **options)
+        return output
+
+    def test_csv_matches_streaming_endpoint(self):
+        output = self._run('out.csv', workers=1)
+
+        writer = CSVWriter()
+        with open(output, newline='') as output_file:
+            assert output_file.read() == writer.header() + writer.rows(extract_national_ids(IDS))
+        assert not os.path.exists(progress_path(output))
+
+    def test_ndjson_with_worker_pool(self):
+        output = self._run('out.ndjson', workers=2)
+
+        expected = NDJSONWriter().rows(extract_national_ids(IDS)).splitlines()
+        with open(output) as output_file:
+            assert [json.loads(line) for line in output_file] == [json.loads(line) for line in expected]
+
+    def test_npz_columns(self):
+        output = self._run('out.npz', workers=1)
+
+        columns = np.load(output)
+        results = extract_national_ids(IDS)
+        assert columns['valid'].tolist() == [result['valid'] for result in results]
+        assert columns['national_id'][0] == b'29001010123456'
+        assert str(columns['date_of_birth'][1]) == '2001-01-01'
+        assert columns['governorate_names'][columns['governorate'][0]] == 'Cairo'
+        assert columns['is_male'][:2].tolist() == [True, False]
+        assert np.isnat(columns['date_of_birth'][2]) and columns['governorate'][2] == -1
+        assert not os.path.exists(output + '.parts')
+
+    def test_fixed_width_input(self):
+        self.input = self._write('ids.fixed', ''.join(id_value[:14].ljust(14) + '\n' for id_value in IDS))
+        output = self._run('out.csv', input_format='fixed', workers=1)
+
+        writer = CSVWriter()
+        with open(output, newline='') as output_file:
+            assert output_file.read() == writer.header() + writer.rows(
+                extract_national_ids([id_value[:14].strip() for id_value in IDS])
+            )
+
+    def test_resume_after_interruption(self):
+        expected_path = self._run('expected.csv', workers=1)
+        output = os.path.join(self.directory, 'out.csv')
+
+        # The state of a run killed while writing its second chunk
+        size = os.path.getsize(self.input)
+        first_start, first_end = next(iter_chunks(open(self.input, 'rb').read(), 0, 40, 'lines', 15))
+        first = process_chunk(ChunkTask(self.input, size, first_start, first_end, 'lines', 15, 'csv'))
+        written = CSVWriter().header().encode() + first.payload
+        with open(output, 'wb') as output_file:
+            output_file.write(written + b'2900101,partial')
+        save_progress(output, {
+            'input': self.input, 'input_size': size, 'input_format': 'lines', 'record_width': 15,
+            'output_format': 'csv', 'input_offset': first.end, 'rows': first.rows, 'output_offset': len(written),
+        })
+
+        call_command('extract_ids_file', self.input, output, resume=True, chunk_size=40, workers=1, stdout=StringIO())
+
+        with open(output) as output_file, open(expected_path) as expected_file:
+            assert output_file.read() == expected_file.read()
+        assert not os.path.exists(progress_path(output))
+
+    def test_invalid_offsets(self):
+        with pytest.raises(CommandError, match='start of a line'):
+            self._run('out.csv', offset=3)
+        with pytest.raises(CommandError, match='No progress'):
+            self._run('other.csv', resume=True)
@@ -0,0 +1,185 @@
+import pytest
+from unittest.mock import patch
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.utils.custom_throttles import EgyptianIDThrottle
+from core.utils.idempotency import get_idempotency_store
+from core.utils.rate_limiting import get_rate_limit_backend
+from national_ids.lean import EgyptianIDExtractorLeanView
+from national_ids.views import EgyptianIDExtractorAPIView
+from users.models import APIKey, APIUsage, User
+
+# Mounts the lean view under the name the DRF view has in core.urls
+urlpatterns = [
+    path('api/v1/national-ids/', include(([
+        path('egyptian-id/extract/', EgyptianIDExtractorLeanView.as_view(), name='extract-egyptian-id'),
+    ], 'national_ids'))),
+]
+
+LEAN_URLS = 'national_ids.tests.test_lean_view'
+
+
+@pytest.mark.django_db
+@override_settings(RATE_LIMITING={'BACKEND': 'local'})
+class TestLeanExtractorParity(TestCase):
+    """The lean view must answer exactly like the DRF view."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=100
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        get_rate_limit_backend().clear()
+        caches[get_idempotency_store().alias].clear()
+
+    def _both(self, method='post', *args, **kwargs):
+        """Send the same request to the DRF and the lean view, with a fresh rate limit for each."""
+        responses = []
+        for urlconf in ('core.urls', LEAN_URLS):
+            get_rate_limit_backend().clear()
+            with override_settings(ROOT_URLCONF=urlconf):
+                url = reverse('national_ids:extract-egyptian-id')
+                responses.append(getattr(self.client, method)(url, *args, **kwargs))
+        return responses
+
+    def assert_same(self, drf_response, lean_response):
+        assert lean_response.status_code == drf_response.status_code
+        assert lean_response.content == drf_response.content
+        for header in ('Content-Type', 'Allow', 'Vary', 'Retry-After'):
+            assert lean_response.get(header) == drf_response.get(header)
+
+    def test_valid_id_is_served_without_drf(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        with patch.object(EgyptianIDExtractorLeanView, 'fallback') as fallback:
+            with override_settings(ROOT_URLCONF=LEAN_URLS):
+                response = self.client.post(
+                    reverse('national_ids:extract-egyptian-id'), {'national_id': '29001010123456'}, format='json'
+                )
+
+        assert response.status_code == status.HTTP_200_OK
+        fallback.assert_not_called()
+
+    def test_valid_id(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        drf_response, lean_response = self._both('post', {'national_id': '29001010123456'}, format='json')
+
+        assert drf_response.status_code == status.HTTP_200_OK
+        self.assert_same(drf_response, lean_response)
+
+    def test_invalid_ids(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        for id_value in ['123', '2900101012345a', '19001010123456', '29013010123456', '']:
+            drf_response, lean_response = self._both('post', {'national_id': id_value}, format='json')
+
+            assert drf_response.status_code == status.HTTP_400_BAD_REQUEST
+            self.assert_same(drf_response, lean_response)
+
+    def test_missing_and_unknown_api_key(self):
+        drf_response, lean_response = self._both('post', {'national_id': '29001010123456'}, format='json')
+        assert drf_response.status_code == status.HTTP_403_FORBIDDEN
+        self.assert_same(drf_response, lean_response)
+
+        self.client.credentials(HTTP_X_API_KEY='nid_unknown')
+        drf_response, lean_response = self._both('post', {'national_id': '29001010123456'}, format='json')
+        assert drf_response.status_code == status.HTTP_403_FORBIDDEN
+        self.assert_same(drf_response, lean_response)
+
+    def test_insufficient_tokens(self):
+        User.objects.filter(pk=self.user.pk).update(tokens_balance=0)
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        drf_response, lean_response = self._both('post', {'national_id': '29001010123456'}, format='json')
+
+        assert drf_response.status_code == status.HTTP_402_PAYMENT_REQUIRED
+        self.assert_same(drf_response, lean_response)
+
+    def test_insufficient_tokens_before_invalid_id(self):
+        User.objects.filter(pk=self.user.pk).update(tokens_balance=0)
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        drf_response, lean_response = self._both('post', {'national_id': '123'}, format='json')
+
+        assert drf_response.status_code == status.HTTP_402_PAYMENT_REQUIRED
+        self.assert_same(drf_response, lean_response)
+
+    def test_throttled(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        with patch.object(EgyptianIDThrottle, 'rate', '1/hour'):
+            responses = []
+            for urlconf in ('core.urls', LEAN_URLS):
+                get_rate_limit_backend().clear()
+                with override_settings(ROOT_URLCONF=urlconf):
+                    url = reverse('national_ids:extract-egyptian-id')
+                    self.client.post(url, {'national_id': '29001010123456'}, format='json')
+                    responses.append(self.client.post(url, {'national_id': '29001010123456'}, format='json'))
+
+        drf_response, lean_response = responses
+        assert drf_response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        self.assert_same(drf_response, lean_response)
+
+    def test_extraction_error(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        with patch('national_ids.views.extract_national_id_cached', side_effect=RuntimeError('boom')), \
+                patch('national_ids.lean.extract_national_id_cached', side_effect=RuntimeError('boom')):
+            drf_response, lean_response = self._both('post', {'national_id': '29001010123456'}, format='json')
+
+        assert drf_response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        self.assert_same(drf_response, lean_response)
+
+    def test_requests_handed_to_drf(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        cases = [
+            ('get', (), {}),
+            ('options', (), {}),
+            ('post', ({'national_id': '29001010123456'},), {}),
+            ('post', ('{"national_id": ',), {'content_type': 'application/json'}),
+            ('post', ('["29001010123456"]',), {'content_type': 'application/json'}),
+            ('post', ({'national_id': 29001010123456},), {'format': 'json'}),
+            ('post', ({'national_id': None},), {'format': 'json'}),
+        ]
+        for method, args, kwargs in cases:
+            drf_response, lean_response = self._both(method, *args, **kwargs)
+            self.assert_same(drf_response, lean_response)
+
+    def test_idempotent_requests_handed_to_drf(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        with override_settings(ROOT_URLCONF=LEAN_URLS):
+            url = reverse('national_ids:extract-egyptian-id')
+            first, retry = [
+                self.client.post(url, {'national_id': '29001010123456'}, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+                for _ in range(2)
+            ]
+
+        self.user.refresh_from_db()
+        assert retry.content == first.content
+        assert retry['Idempotent-Replayed'] == 'true'
+        assert self.user.tokens_balance == 99
+
+    def test_browsable_api_handed_to_drf(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        drf_response, lean_response = self._both(
+            'post', {'national_id': '29001010123456'}, format='json', HTTP_ACCEPT='text/html'
+        )
+
+        # The page embeds a fresh CSRF token, so only the status and type can match
+        assert lean_response.status_code == drf_response.status_code == status.HTTP_200_OK
+        assert lean_response['Content-Type'] == drf_response['Content-Type'] == 'text/html; charset=utf-8'
+
+    def test_billing_and_usage_match(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        self._both('post', {'national_id': '29001010123456'}, format='json', HTTP_USER_AGENT='Lean/1.0')
+        self._both('post', {'national_id': '123'}, format='json', HTTP_USER_AGENT='Lean/1.0')
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 98
+        usage = APIUsage.objects.filter(api_key=self.api_key, user_agent='Lean/1.0')
+        assert sorted(usage.values_list('response_status', flat=True)) == ['200', '200', '400', '400']
+
+    def test_fallback_is_the_drf_view(self):
+        assert EgyptianIDExtractorLeanView.fallback.cls is EgyptianIDExtractorAPIView
@@ -0,0 +1,60 @@
+import pytest
+from datetime import date
+from national_ids.lookup_tables import (
+    GOVERNORATE_TABLE,
+    STATUS_INVALID_DATE_OF_BIRTH,
+    STATUS_INVALID_DAY,
+    STATUS_INVALID_MONTH,
+    STATUS_INVALID_YEAR,
+    STATUS_OK,
+    DateTable,
+)
+
+
+@pytest.fixture(scope='module')
+def table():
+    return DateTable(date(2025, 6, 15))
+
+
+class TestDateTable:
+
+    @pytest.mark.parametrize('prefix, status', [
+        (2900101, STATUS_OK),
+        (3000229, STATUS_OK),
+        (3010229, STATUS_INVALID_DATE_OF_BIRTH),
+        (2901301, STATUS_INVALID_MONTH),
+        (2900100, STATUS_INVALID_DAY),
+        (2900132, STATUS_INVALID_DAY),
+        (3250616, STATUS_INVALID_DATE_OF_BIRTH),
+        (3260101, STATUS_INVALID_YEAR),
+        (3261301, STATUS_INVALID_YEAR),
+    ])
+    def test_lookup(self, table, prefix, status):
+        assert table.lookup(prefix) == status
+
+    def test_date_of_birth(self, table):
+        assert table.date_of_birth(2900101) == date(1990, 1, 1)
+        assert table.date_of_birth(3260101) is None
+
+    def test_advance_within_year(self):
+        old = DateTable(date(2025, 6, 15))
+        table = old.advance(date(2025, 6, 16))
+        assert table.lookup(3250616) == STATUS_OK
+        assert table.date_of_birth(3250616) == date(2025, 6, 16)
+        assert (table.today, old.today) == (date(2025, 6, 16), date(2025, 6, 15))
+        assert old.lookup(3250616) == STATUS_INVALID_DATE_OF_BIRTH
+        assert old.date_of_birth(3250616) is None
+
+    def test_advance_across_year(self):
+        table = DateTable(date(2025, 12, 31)).advance(date(2026, 1, 1))
+        assert table.lookup(3260101) == STATUS_OK
+        assert table.lookup(3260102) == STATUS_INVALID_DATE_OF_BIRTH
+        assert table.lookup(3270101) == STATUS_INVALID_YEAR
+
+
+class TestGovernorateTable:
+
+    def test_known_and_unknown_codes(self):
+        assert GOVERNORATE_TABLE[1] == 'Cairo'
+        assert GOVERNORATE_TABLE[88] == 'Foreign Born'
+        assert GOVERNORATE_TABLE[99] is None
@@ -0,0 +1,52 @@
+import pytest
+from datetime import date
+from unittest.mock import patch
+from national_ids import parsing
+from national_ids.parsing import InvalidNationalID, cached_today, parse_national_id
+
+
+class TestParseNationalID:
+
+    def test_parses_all_fields(self):
+        parsed = parse_national_id('29001010123456')
+        assert parsed.century == 2
+        assert parsed.year == 1990
+        assert parsed.month == 1
+        assert parsed.day == 1
+        assert parsed.date_of_birth == date(1990, 1, 1)
+        assert parsed.governorate == 'Cairo'
+        assert parsed.gender == 'male'
+
+    def test_as_data_matches_extractor_output(self):
+        assert parse_national_id('29001020223446').as_data() == {
+            'national_id': '29001020223446',
+            'date_of_birth': date(1990, 1, 2),
+            'governorate': 'Alexandria',
+            'gender': 'female',
+        }
+
+    @pytest.mark.parametrize('id_value, message', [
+        (29001010123456, 'ID value must be a string'),
+        ('2900101012345a', 'ID value must be digits only'),
+        ('19001010123456', 'Invalid century digit'),
+        ('39901010123456', 'Invalid year'),
+        ('29013010123456', 'Invalid month'),
+        ('29001320123456', 'Invalid day'),
+        ('29002300123456', 'Invalid date of birth'),
+        ('29001099123456', 'Invalid governorate code'),
+    ])
+    def test_error_messages(self, id_value, message):
+        with pytest.raises(InvalidNationalID) as exc_info:
+            parse_national_id(id_value)
+        assert str(exc_info.value) == message
+
+
+class TestCachedToday:
+
+    def test_reuses_cached_date_until_midnight(self):
+        with patch.object(parsing, '_today_cache', (date(2000, 1, 1), float('inf'))):
+            assert cached_today() == date(2000, 1, 1)
+
+    def test_refreshes_when_day_changes(self):
+        with patch.object(parsing, '_today_cache', (date(2000, 1, 1), 0.0)):
+            assert cached_today() == date.today()
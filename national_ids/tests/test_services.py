@@ -1,6 +1,6 @@
 import pytest
 from datetime import date
-from national_ids.services import EgyptianIDExtractor
+from national_ids.services import EgyptianIDExtractor, aggregate_national_ids, extract_national_ids
 
 
 class TestEgyptianIDExtractor:
@@ -61,4 +61,49 @@ class TestEgyptianIDExtractor:
         assert data['date_of_birth'] == date(1990, 1, 1)
         assert data['governorate'] == 'Cairo'
         assert data['gender'] == 'male'
-        assert len(data) == 4 
\ No newline at end of file
+        assert len(data) == 4 
+
+class TestExtractNationalIDs:
+
+    def test_results_in_input_order(self):
+        results = extract_national_ids(['29001020223446', '29001010123456'])
+        assert [r['national_id'] for r in results] == ['29001020223446', '29001010123456']
+        assert all(r['valid'] for r in results)
+
+    def test_invalid_id_has_errors(self):
+        results = extract_national_ids(['29013010123456'])
+        assert results[0]['valid'] is False
+        assert results[0]['data'] is None
+        assert results[0]['errors'] == [{'field': 'national_id', 'message': 'Invalid month'}]
+
+    def test_non_string_id(self):
+        results = extract_national_ids([None])
+        assert results[0]['valid'] is False
+
+
+class TestAggregateNationalIDs:
+
+    def test_counts_by_group(self):
+        aggregates = aggregate_national_ids([
+            '29001010123456', '29001010123456', '30101011234567', '28501020223446', '123',
+        ])
+        assert aggregates['total'] == 5
+        assert aggregates['valid'] == 4
+        assert aggregates['invalid'] == 1
+        assert aggregates['by_governorate'] == {'Cairo': 2, 'Alexandria': 1, 'Dakahlia': 1}
+        assert aggregates['by_birth_year'] == {'1980-1989': 1, '1990-1999': 2, '2000-2009': 1}
+        assert aggregates['by_gender'] == {'male': 2, 'female': 2}
+        assert 'invalid_reasons' not in aggregates
+
+    def test_matches_per_id_results(self):
+        id_values = ['29001010123456', ' 29001010123456', '29013010123456', None, '2900101012345X', '123']
+        aggregates = aggregate_national_ids(id_values, year_bucket=1, invalid_reasons=True)
+        results = extract_national_ids(id_values)
+
+        valid = [result['data'] for result in results if result['valid']]
+        assert aggregates['valid'] == len(valid) == 2
+        assert aggregates['by_birth_year'] == {'1990': 2}
+        assert aggregates['invalid_reasons'] == {
+            '; '.join(error['message'] for error in result['errors']): 1
+            for result in results if not result['valid']
+        }
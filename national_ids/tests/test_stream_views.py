@@ -0,0 +1,91 @@
+import json
+import pytest
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from users.models import User, APIKey, APIUsage
+
+
+@pytest.mark.django_db
+class TestEgyptianIDStreamExtractorAPIView(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=10
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.url = reverse('national_ids:extract-egyptian-id-stream')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+
+    def _post(self, body, content_type='text/plain', output=None):
+        url = f"{self.url}?output={output}" if output else self.url
+        return self.client.post(url, data=body, content_type=content_type)
+
+    def test_ndjson_output(self):
+        response = self._post('29001010123456\n123\n\n29001020223446\n')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        results = [json.loads(line) for line in lines]
+        assert [r['national_id'] for r in results] == ['29001010123456', '123', '29001020223446']
+        assert [r['valid'] for r in results] == [True, False, True]
+        assert results[0]['data']['date_of_birth'] == '1990-01-01'
+
+    def test_overlong_line_is_one_invalid_id(self):
+        response = self._post('29001010123456\n' + '2' * 5000 + '\n29001020223446\n')
+
+        results = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        assert [r['valid'] for r in results] == [True, False, True]
+        assert results[2]['national_id'] == '29001020223446'
+
+    def test_csv_input_and_output(self):
+        response = self._post('national_id\r\n29001010123456\r\n29013010123456\r\n', 'text/csv', 'csv')
+
+        assert response['Content-Type'] == 'text/csv'
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        assert lines[0] == 'national_id,valid,date_of_birth,governorate,gender,errors'
+        assert lines[1] == '29001010123456,true,1990-01-01,Cairo,male,'
+        assert lines[2] == '29013010123456,false,,,,Invalid month'
+
+    def test_tokens_and_usage_billed_after_delivery(self):
+        b''.join(self._post('29001010123456\n123\n').streaming_content)
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 9
+        assert APIUsage.objects.filter(api_key=self.api_key).count() == 2
+
+    @override_settings(NATIONAL_ID_STREAM_CHUNK_SIZE=1)
+    def test_dropped_connection_only_bills_delivered_chunks(self):
+        response = self._post('29001010123456\n29001020223446\n29001010123456\n')
+        content = iter(response.streaming_content)
+        next(content)
+        next(content)
+        response.close()
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 9
+        assert APIUsage.objects.filter(api_key=self.api_key).count() == 1
+
+    @override_settings(NATIONAL_ID_STREAM_CHUNK_SIZE=2)
+    def test_stops_when_tokens_run_out(self):
+        self.user.tokens_balance = 2
+        self.user.save()
+
+        lines = b''.join(self._post('29001010123456\n' * 4).streaming_content).decode().splitlines()
+
+        self.user.refresh_from_db()
+        assert len(lines) == 3
+        assert json.loads(lines[-1])['message'] == 'Insufficient tokens'
+        assert self.user.tokens_balance == 0
+
+    def test_unsupported_output_format(self):
+        response = self._post('29001010123456\n', output='xml')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()['errors'][0]['field'] == 'output'
@@ -0,0 +1,74 @@
+import random
+import pytest
+from datetime import date
+from national_ids import vectorized
+from national_ids.services import extract_national_id
+from national_ids.vectorized import extract_columns
+
+
+class TestExtractColumns:
+
+    def test_extracts_fields(self):
+        columns = extract_columns(['29001010123456', '30102280223464'])
+        assert columns.century.tolist() == [2, 3]
+        assert columns.year.tolist() == [1990, 2001]
+        assert columns.month.tolist() == [1, 2]
+        assert columns.day.tolist() == [1, 28]
+        assert columns.is_male.tolist() == [True, False]
+        assert [vectorized.GOVERNORATE_NAMES[i] for i in columns.governorate_index.tolist()] == ['Cairo', 'Alexandria']
+
+    def test_error_codes(self):
+        columns = extract_columns([
+            '29001010123456',
+            '123',
+            '2900101012345a',
+            '19001010123456',
+            '33013010123456',
+            '29013010123456',
+            '29001320123456',
+            '29002300123456',
+            '29001019923456',
+        ], today=date(2025, 1, 1))
+        assert columns.error_code.tolist() == [
+            vectorized.OK,
+            vectorized.INVALID_FORMAT,
+            vectorized.INVALID_DIGITS,
+            vectorized.INVALID_CENTURY,
+            vectorized.INVALID_YEAR,
+            vectorized.INVALID_MONTH,
+            vectorized.INVALID_DAY,
+            vectorized.INVALID_DATE_OF_BIRTH,
+            vectorized.INVALID_GOVERNORATE,
+        ]
+
+    def test_letters_in_lookup_positions(self):
+        columns = extract_columns(['abcdefghijklmn', '2900101ab23456'])
+        assert columns.error_code.tolist() == [vectorized.INVALID_DIGITS, vectorized.INVALID_DIGITS]
+
+    def test_leap_day_and_future_date(self):
+        columns = extract_columns(['30002290123456', '30102290123456', '32501020123456'], today=date(2025, 1, 1))
+        assert columns.valid_date.tolist() == [True, False, False]
+
+    def test_empty_input(self):
+        columns = extract_columns([])
+        assert len(columns.error_code) == 0
+
+    def test_matches_serializer_rules(self):
+        rng = random.Random(0)
+        id_values = [
+            ''.join(rng.choice('0123456789') for _ in range(14))
+            for _ in range(300)
+        ] + [
+            f"{rng.choice('23')}{rng.randint(0, 99):02d}{rng.randint(1, 12):02d}{rng.randint(1, 31):02d}"
+            f"{rng.choice(['01', '21', '88', '99'])}{rng.randint(0, 99999):05d}"
+            for _ in range(300)
+        ]
+
+        columns = extract_columns(id_values)
+
+        for id_value, code in zip(id_values, columns.error_code.tolist()):
+            data, errors = extract_national_id(id_value)
+            if code == vectorized.OK:
+                assert errors is None, id_value
+            else:
+                assert errors[0]['message'] == vectorized.ERROR_MESSAGES[code], id_value
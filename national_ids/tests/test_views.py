@@ -1,9 +1,9 @@
 import pytest
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from users.models import User, APIKey
+from users.models import User, APIKey, TokenLease
 from unittest.mock import patch
 
 
@@ -74,6 +74,18 @@ class TestEgyptianIDExtractorAPIView(TestCase):
         data = response.json()
         assert data['success'] is False
 
+    def test_insufficient_tokens_before_invalid_id(self):
+        self.user.tokens_balance = 0
+        self.user.save()
+
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+
+        response = self.client.post(self.url, {
+            'national_id': '123'
+        })
+
+        assert response.status_code == status.HTTP_402_PAYMENT_REQUIRED
+
     def test_tokens_deducted_on_success(self):
         initial_balance = self.user.tokens_balance
         self.client.credentials(HTTP_X_API_KEY=self.plain_key)
@@ -103,4 +115,35 @@ class TestEgyptianIDExtractorAPIView(TestCase):
         
         response = self.client.post(self.url, {})
         
-        assert response.status_code == status.HTTP_400_BAD_REQUEST 
\ No newline at end of file
+        assert response.status_code == status.HTTP_400_BAD_REQUEST 
+
+    @override_settings(TOKEN_LEASING={
+        'ENABLED': True, 'MIN_SIZE': 5, 'MAX_SIZE': 5, 'TARGET_SECONDS': 1.0, 'TTL': 30, 'CHECKPOINT_INTERVAL': 1.0,
+    })
+    def test_leased_tokens_billed(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+
+        for _ in range(3):
+            response = self.client.post(self.url, {
+                'national_id': '29001010123456'
+            })
+            assert response.status_code == status.HTTP_200_OK
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 5
+        assert TokenLease.objects.get(user=self.user).tokens == 5
+
+    @override_settings(TOKEN_LEASING={
+        'ENABLED': True, 'MIN_SIZE': 5, 'MAX_SIZE': 5, 'TARGET_SECONDS': 1.0, 'TTL': 30, 'CHECKPOINT_INTERVAL': 1.0,
+    })
+    def test_leased_tokens_count_for_invalid_id(self):
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        self.client.post(self.url, {'national_id': '29001010123456'})
+        # Every other token now sits in this worker's lease
+        User.objects.filter(pk=self.user.pk).update(tokens_balance=0)
+
+        response = self.client.post(self.url, {
+            'national_id': '123'
+        })
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
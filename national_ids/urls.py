@@ -1,9 +1,31 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import EgyptianIDExtractorAPIView
+from .views import (
+    EgyptianIDAggregateAPIView,
+    EgyptianIDAggregateAsyncAPIView,
+    EgyptianIDExtractorAPIView,
+    EgyptianIDExtractorAsyncAPIView,
+    EgyptianIDBatchExtractorAPIView,
+    EgyptianIDBatchExtractorAsyncAPIView,
+    EgyptianIDStreamExtractorAPIView,
+)
 
 app_name = 'national_ids'
 
+if settings.NATIONAL_ID_ASYNC_VIEWS:
+    extract_view, batch_view = EgyptianIDExtractorAsyncAPIView, EgyptianIDBatchExtractorAsyncAPIView
+    aggregate_view = EgyptianIDAggregateAsyncAPIView
+else:
+    extract_view, batch_view = EgyptianIDExtractorAPIView, EgyptianIDBatchExtractorAPIView
+    aggregate_view = EgyptianIDAggregateAPIView
+
+if settings.NATIONAL_ID_LEAN_VIEW:
+    from .lean import EgyptianIDExtractorLeanView as extract_view
+
 urlpatterns = [
-    path('egyptian-id/extract/', EgyptianIDExtractorAPIView.as_view(), name='extract-egyptian-id'),
-]
\ No newline at end of file
+    path('egyptian-id/extract/', extract_view.as_view(), name='extract-egyptian-id'),
+    path('egyptian-id/extract/batch/', batch_view.as_view(), name='extract-egyptian-id-batch'),
+    path('egyptian-id/extract/aggregate/', aggregate_view.as_view(), name='extract-egyptian-id-aggregate'),
+    path('egyptian-id/extract/stream/', EgyptianIDStreamExtractorAPIView.as_view(), name='extract-egyptian-id-stream'),
+]
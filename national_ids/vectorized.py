@@ -0,0 +1,151 @@
+"""
+Vectorized extraction engine for arrays of Egyptian national IDs.
+
+IDs are viewed as a fixed-width uint8 digit matrix so every field is computed
+with whole-array operations instead of per-ID string slicing and int() calls.
+"""
+from datetime import date
+from typing import Any, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .constants import EGYPTIAN_GOVERNORATE_CODES
+from .parsing import cached_today
+
+ID_LENGTH = 14
+
+# Per-row error codes, listed in the order EgyptianIDSerializer applies its checks
+OK = 0
+INVALID_FORMAT = 1
+INVALID_DIGITS = 2
+INVALID_CENTURY = 3
+INVALID_YEAR = 4
+INVALID_MONTH = 5
+INVALID_DAY = 6
+INVALID_DATE_OF_BIRTH = 7
+INVALID_GOVERNORATE = 8
+
+# INVALID_FORMAT covers anything that is not a plain 14 character ASCII string
+# (wrong length, surrounding whitespace, non-strings...). Its message depends on the
+# field-level checks of the serializer, so callers re-run the serializer for those rows.
+ERROR_MESSAGES = {
+    INVALID_DIGITS: "ID value must be digits only",
+    INVALID_CENTURY: "Invalid century digit",
+    INVALID_YEAR: "Invalid year",
+    INVALID_MONTH: "Invalid month",
+    INVALID_DAY: "Invalid day",
+    INVALID_DATE_OF_BIRTH: "Invalid date of birth",
+    INVALID_GOVERNORATE: "Invalid governorate code",
+}
+
+GOVERNORATE_CODES = tuple(sorted(EGYPTIAN_GOVERNORATE_CODES))
+GOVERNORATE_NAMES = tuple(EGYPTIAN_GOVERNORATE_CODES[code] for code in GOVERNORATE_CODES)
+
+# Two-digit governorate code -> index into GOVERNORATE_NAMES, -1 when unknown
+_GOVERNORATE_INDEX = np.full(100, -1, dtype=np.int16)
+for _index, _code in enumerate(GOVERNORATE_CODES):
+    _GOVERNORATE_INDEX[int(_code)] = _index
+
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int16)
+_PLACEHOLDER_ID = '0' * ID_LENGTH
+
+
+class ExtractedColumns(NamedTuple):
+    """Columnar extraction result, one entry per input ID."""
+    century: np.ndarray
+    year: np.ndarray
+    month: np.ndarray
+    day: np.ndarray
+    valid_date: np.ndarray
+    governorate_index: np.ndarray
+    is_male: np.ndarray
+    error_code: np.ndarray
+
+    @property
+    def valid(self) -> np.ndarray:
+        return self.error_code == OK
+
+
+def _is_well_formed(id_value: Any) -> bool:
+    return (
+        isinstance(id_value, str)
+        and len(id_value) == ID_LENGTH
+        and id_value.isascii()
+        and not id_value[0].isspace()
+        and not id_value[-1].isspace()
+        and '\x00' not in id_value
+    )
+
+
+def digit_matrix(id_values: Sequence[Any]) -> tuple:
+    """
+    Build an (n, 14) uint8 digit matrix from the IDs.
+    Rows that are not well-formed 14 character strings are zero-filled and flagged.
+    """
+    well_formed = np.fromiter(
+        (_is_well_formed(id_value) for id_value in id_values), dtype=bool, count=len(id_values)
+    )
+    buffer = ''.join(
+        id_value if ok else _PLACEHOLDER_ID for id_value, ok in zip(id_values, well_formed)
+    ).encode('ascii')
+    raw = np.frombuffer(buffer, dtype=np.uint8).reshape(-1, ID_LENGTH)
+    is_digit = ((raw >= 48) & (raw <= 57)).all(axis=1)
+    return raw - 48, well_formed, is_digit
+
+
+def extract_columns(id_values: Sequence[Any], today: Optional[date] = None) -> ExtractedColumns:
+    """Validate and extract all IDs at once with the rules of EgyptianIDSerializer."""
+    today = today or cached_today()
+    digits, well_formed, is_digit = digit_matrix(id_values)
+    digits = digits.astype(np.int32)
+    # Letters would index past the lookup tables, their rows fail as INVALID_DIGITS anyway
+    digits[~is_digit] = 0
+
+    century = digits[:, 0]
+    year = np.where(century == 2, 1900, 2000) + digits[:, 1] * 10 + digits[:, 2]
+    month = digits[:, 3] * 10 + digits[:, 4]
+    day = digits[:, 5] * 10 + digits[:, 6]
+    governorate_index = _GOVERNORATE_INDEX[digits[:, 7] * 10 + digits[:, 8]]
+    is_male = digits[:, 12] % 2 != 0
+
+    month_ok = (month >= 1) & (month <= 12)
+    day_ok = (day >= 1) & (day <= 31)
+    is_leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    days_in_month = _DAYS_IN_MONTH[np.where(month_ok, month, 0)] + ((month == 2) & is_leap)
+    not_future = (year * 10000 + month * 100 + day) <= (today.year * 10000 + today.month * 100 + today.day)
+    valid_date = month_ok & day_ok & (day <= days_in_month) & not_future
+
+    error_code = np.select(
+        [
+            ~well_formed,
+            ~is_digit,
+            (century != 2) & (century != 3),
+            year > today.year,
+            ~month_ok,
+            ~day_ok,
+            ~valid_date,
+            governorate_index < 0,
+        ],
+        [
+            INVALID_FORMAT,
+            INVALID_DIGITS,
+            INVALID_CENTURY,
+            INVALID_YEAR,
+            INVALID_MONTH,
+            INVALID_DAY,
+            INVALID_DATE_OF_BIRTH,
+            INVALID_GOVERNORATE,
+        ],
+        default=OK,
+    ).astype(np.uint8)
+
+    return ExtractedColumns(
+        century=century,
+        year=year,
+        month=month,
+        day=day,
+        valid_date=valid_date,
+        governorate_index=governorate_index,
+        is_male=is_male,
+        error_code=error_code,
+    )
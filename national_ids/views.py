@@ -1,86 +1,105 @@
 import logging
-from django.db import transaction
+from typing import Any, Dict, Iterable, Iterator, List
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from national_ids.services import EgyptianIDExtractor
+from national_ids.services import (
+    aggregate_national_ids, extract_national_id_cached, extract_national_ids, validate_and_extract,
+)
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
-from rest_framework.exceptions import ValidationError
-from users.models import APIUsage
-from core.base.views import UnifiedResponseAPIView
-from national_ids.serializers import EgyptianIDSerializer
+from users.leasing import acharge_tokens, ahas_tokens, charge_tokens, has_tokens, refund_tokens
+from users.usage import UsageEvent, get_usage_sink
+from core.base.renderers import PreEncodedDict
+from core.base.views import AsyncUnifiedResponseAPIView, UnifiedResponseAPIView
+from national_ids.serializers import EgyptianIDAggregateSerializer, EgyptianIDBatchSerializer
+from national_ids.streaming import STREAM_WRITERS, chunked, read_national_ids
 from core.utils.custom_throttles import EgyptianIDThrottle
+from core.utils.idempotency import idempotent
+from core.utils.tracing import stage
 
 logger = logging.getLogger(__name__)
 
-class EgyptianIDExtractorAPIView(UnifiedResponseAPIView):
-    success_message = 'ID validation completed successfully'
-    error_message = 'ID validation failed'
-    throttle_classes = [EgyptianIDThrottle]
-    
-    def post(self, request):
-        try:
-            with transaction.atomic():
-                user = request.user
-                
-                if not user.has_sufficient_tokens(1):
-                    self._log_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
-                    return Response(
-                        {
-                            "success": False,
-                            "message": "Insufficient tokens",
-                            "data": None,
-                            "errors": [{"detail": "Not enough tokens to process this request"}]
-                        },
-                        status=status.HTTP_402_PAYMENT_REQUIRED
-                    )
-                
-                serializer = EgyptianIDSerializer(data=request.data)
-                serializer.is_valid(raise_exception=True)
-                
-                id_value = serializer.validated_data['national_id']
-                extractor = EgyptianIDExtractor(id_value)
-                extracted_data = extractor.get_data()
-                
-                self._log_usage(request, 1, status.HTTP_200_OK)
-                user.deduct_tokens(1)
-                
-                return Response(extracted_data, status=status.HTTP_200_OK)
-                
-        except ValidationError as e:
-            self._log_usage(request, 0, status.HTTP_400_BAD_REQUEST)
-            return Response(
-                serializer._error_formatter(serializer.errors),
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        except Exception as e:
-            self._log_usage(request, 0, status.HTTP_500_INTERNAL_SERVER_ERROR)
-            logger.error(f"Error extracting ID: {e}")
-            return Response(
-                {
-                    "success": False,
-                    "message": str(e),
-                    "data": None,
-                    "errors": [str(e)]
-                },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-        
+INSUFFICIENT_TOKENS = PreEncodedDict({
+    "success": False,
+    "message": "Insufficient tokens",
+    "data": None,
+    "errors": [{"detail": "Not enough tokens to process this request"}]
+})
+
+
+class APIUsageMixin:
+    """
+    Mixin with the usage logging and billing helpers shared by the extraction views.
+    """
+
+    def _insufficient_tokens_response(self) -> Response:
+        return Response(INSUFFICIENT_TOKENS, status=status.HTTP_402_PAYMENT_REQUIRED)
+
+    def _error_response(self, e: Exception) -> Response:
+        return Response(
+            {
+                "success": False,
+                "message": str(e),
+                "data": None,
+                "errors": [str(e)]
+            },
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    def _build_usage(self, request: Request, tokens_used: int, response_status: int) -> UsageEvent:
+        api_key = getattr(request, 'auth', None)
+        return UsageEvent(
+            api_key_id=getattr(api_key, 'pk', None),
+            ip_address=self._get_client_ip(request),
+            user_agent=self._get_user_agent(request),
+            tokens_used=tokens_used,
+            response_status=str(response_status),
+            created_at=timezone.now(),
+        )
+
     def _log_usage(self, request: Request, tokens_used: int, response_status: int) -> None:
         """Log API usage for tracking and billing purposes."""
         try:
-            api_key = getattr(request, 'auth', None)
-            APIUsage.objects.create(
-                api_key=api_key,
-                ip_address=self._get_client_ip(request),
-                user_agent=self._get_user_agent(request),
-                tokens_used=tokens_used,
-                response_status=str(response_status),
+            with stage('usage'):
+                get_usage_sink().record(self._build_usage(request, tokens_used, response_status))
+        except Exception as e:
+            logger.error(f"Failed to log API usage: {e}")
+
+    def _build_batch_usage(self, request: Request, valid_flags: Iterable[bool]) -> List[UsageEvent]:
+        return [
+            self._build_usage(
+                request,
+                1 if valid else 0,
+                status.HTTP_200_OK if valid else status.HTTP_400_BAD_REQUEST,
             )
+            for valid in valid_flags
+        ]
+
+    def _log_batch_usage(self, request: Request, valid_flags: Iterable[bool]) -> None:
+        """Log one usage row per ID of a batch with a single write."""
+        try:
+            with stage('usage'):
+                get_usage_sink().record_many(self._build_batch_usage(request, valid_flags))
         except Exception as e:
             logger.error(f"Failed to log API usage: {e}")
-    
+
+    async def _alog_usage(self, request: Request, tokens_used: int, response_status: int) -> None:
+        try:
+            with stage('usage'):
+                await get_usage_sink().arecord(self._build_usage(request, tokens_used, response_status))
+        except Exception as e:
+            logger.error(f"Failed to log API usage: {e}")
+
+    async def _alog_batch_usage(self, request: Request, valid_flags: Iterable[bool]) -> None:
+        try:
+            with stage('usage'):
+                await get_usage_sink().arecord_many(self._build_batch_usage(request, valid_flags))
+        except Exception as e:
+            logger.error(f"Failed to log API usage: {e}")
+
     def _get_client_ip(self, request: Request) -> str:
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
@@ -94,4 +113,296 @@ class EgyptianIDExtractorAPIView(UnifiedResponseAPIView):
     
     def _get_user_agent(self, request: Request) -> str:
         return request.META.get('HTTP_USER_AGENT', 'Unknown')
+
+
+class EgyptianIDExtractorAPIView(APIUsageMixin, UnifiedResponseAPIView):
+    success_message = 'ID validation completed successfully'
+    error_message = 'ID validation failed'
+    throttle_classes = [EgyptianIDThrottle]
     
+    @idempotent
+    def post(self, request):
+        try:
+            extracted_data, errors = self._extract(request.data)
+            if errors:
+                # A user out of tokens gets 402 whatever the ID, only checked on this path
+                # so valid IDs stay at one query, the charge below
+                if not has_tokens(request.user, 1):
+                    self._log_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                    return self._insufficient_tokens_response()
+                self._log_usage(request, 0, status.HTTP_400_BAD_REQUEST)
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            # The conditional UPDATE is both the sufficiency check and the charge
+            if not charge_tokens(request.user, 1):
+                self._log_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                return self._insufficient_tokens_response()
+
+            self._log_usage(request, 1, status.HTTP_200_OK)
+            return Response(extracted_data, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            self._log_usage(request, 0, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.error(f"Error extracting ID: {e}")
+            return self._error_response(e)
+
+    def _extract(self, payload):
+        """Serve plain string IDs from the result cache, anything else goes through the serializer."""
+        id_value = payload.get('national_id') if hasattr(payload, 'get') else None
+        with stage('extract'):
+            if isinstance(id_value, str):
+                return extract_national_id_cached(id_value)
+            return validate_and_extract(payload)
+
+
+class EgyptianIDBatchExtractorAPIView(APIUsageMixin, UnifiedResponseAPIView):
+    """
+    Extract many IDs in one request. Every valid ID costs one token, and the whole
+    batch is charged and logged at once.
+    """
+    success_message = 'Batch ID validation completed successfully'
+    error_message = 'Batch ID validation failed'
+    throttle_classes = [EgyptianIDThrottle]
+
+    @idempotent
+    def post(self, request):
+        serializer = EgyptianIDBatchSerializer(data=request.data)
+        with stage('validate'):
+            is_valid = serializer.is_valid()
+        if not is_valid:
+            self._log_usage(request, 0, status.HTTP_400_BAD_REQUEST)
+            return Response(
+                serializer._error_formatter(serializer.errors),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with stage('extract'):
+                results = extract_national_ids(serializer.validated_data['national_ids'])
+            tokens_required = sum(1 for result in results if result['valid'])
+
+            if tokens_required and not charge_tokens(request.user, tokens_required):
+                self._log_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                return self._insufficient_tokens_response()
+            self._log_batch_usage(request, (result['valid'] for result in results))
+
+            return self._batch_response(results, tokens_required)
+        except Exception as e:
+            self._log_usage(request, 0, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.error(f"Error extracting ID batch: {e}")
+            return self._error_response(e)
+
+    def _batch_response(self, results: List[Dict[str, Any]], tokens_required: int) -> Response:
+        return Response(
+            {
+                "results": results,
+                "total": len(results),
+                "valid": tokens_required,
+                "invalid": len(results) - tokens_required,
+                "tokens_used": tokens_required,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class EgyptianIDExtractorAsyncAPIView(EgyptianIDExtractorAPIView, AsyncUnifiedResponseAPIView):
+    """
+    EgyptianIDExtractorAPIView for ASGI: the key lookup, token charge and usage
+    write go through the async ORM instead of blocking a thread per request.
+    """
+
+    @idempotent
+    async def post(self, request):
+        try:
+            extracted_data, errors = self._extract(request.data)
+            if errors:
+                if not await ahas_tokens(request.user, 1):
+                    await self._alog_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                    return self._insufficient_tokens_response()
+                await self._alog_usage(request, 0, status.HTTP_400_BAD_REQUEST)
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            if not await acharge_tokens(request.user, 1):
+                await self._alog_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                return self._insufficient_tokens_response()
+
+            await self._alog_usage(request, 1, status.HTTP_200_OK)
+            return Response(extracted_data, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            await self._alog_usage(request, 0, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.error(f"Error extracting ID: {e}")
+            return self._error_response(e)
+
+
+class EgyptianIDBatchExtractorAsyncAPIView(EgyptianIDBatchExtractorAPIView, AsyncUnifiedResponseAPIView):
+    """EgyptianIDBatchExtractorAPIView for ASGI, see EgyptianIDExtractorAsyncAPIView."""
+
+    @idempotent
+    async def post(self, request):
+        serializer = EgyptianIDBatchSerializer(data=request.data)
+        with stage('validate'):
+            is_valid = serializer.is_valid()
+        if not is_valid:
+            await self._alog_usage(request, 0, status.HTTP_400_BAD_REQUEST)
+            return Response(
+                serializer._error_formatter(serializer.errors),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with stage('extract'):
+                results = extract_national_ids(serializer.validated_data['national_ids'])
+            tokens_required = sum(1 for result in results if result['valid'])
+
+            if tokens_required and not await acharge_tokens(request.user, tokens_required):
+                await self._alog_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                return self._insufficient_tokens_response()
+            await self._alog_batch_usage(request, (result['valid'] for result in results))
+
+            return self._batch_response(results, tokens_required)
+        except Exception as e:
+            await self._alog_usage(request, 0, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.error(f"Error extracting ID batch: {e}")
+            return self._error_response(e)
+
+
+class EgyptianIDAggregateAPIView(APIUsageMixin, UnifiedResponseAPIView):
+    """
+    Count a batch of IDs by governorate, birth year bucket and gender instead of
+    returning them, so the response only grows with the number of groups. Billed
+    and logged like the batch endpoint.
+    """
+    success_message = 'ID aggregation completed successfully'
+    error_message = 'ID aggregation failed'
+    throttle_classes = [EgyptianIDThrottle]
+
+    @idempotent
+    def post(self, request):
+        serializer = EgyptianIDAggregateSerializer(data=request.data)
+        with stage('validate'):
+            is_valid = serializer.is_valid()
+        if not is_valid:
+            self._log_usage(request, 0, status.HTTP_400_BAD_REQUEST)
+            return Response(
+                serializer._error_formatter(serializer.errors),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with stage('extract'):
+                aggregates = self._aggregate(serializer.validated_data)
+            tokens_required = aggregates['valid']
+
+            if tokens_required and not charge_tokens(request.user, tokens_required):
+                self._log_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                return self._insufficient_tokens_response()
+            self._log_batch_usage(request, self._valid_flags(aggregates))
+
+            return Response({**aggregates, "tokens_used": tokens_required}, status=status.HTTP_200_OK)
+        except Exception as e:
+            self._log_usage(request, 0, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.error(f"Error aggregating IDs: {e}")
+            return self._error_response(e)
+
+    def _aggregate(self, validated_data: Dict[str, Any]) -> Dict[str, Any]:
+        return aggregate_national_ids(
+            validated_data['national_ids'],
+            year_bucket=validated_data['year_bucket'],
+            invalid_reasons=validated_data['invalid_reasons'],
+        )
+
+    def _valid_flags(self, aggregates: Dict[str, Any]) -> List[bool]:
+        return [True] * aggregates['valid'] + [False] * aggregates['invalid']
+
+
+class EgyptianIDAggregateAsyncAPIView(EgyptianIDAggregateAPIView, AsyncUnifiedResponseAPIView):
+    """EgyptianIDAggregateAPIView for ASGI, see EgyptianIDExtractorAsyncAPIView."""
+
+    @idempotent
+    async def post(self, request):
+        serializer = EgyptianIDAggregateSerializer(data=request.data)
+        with stage('validate'):
+            is_valid = serializer.is_valid()
+        if not is_valid:
+            await self._alog_usage(request, 0, status.HTTP_400_BAD_REQUEST)
+            return Response(
+                serializer._error_formatter(serializer.errors),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with stage('extract'):
+                aggregates = self._aggregate(serializer.validated_data)
+            tokens_required = aggregates['valid']
+
+            if tokens_required and not await acharge_tokens(request.user, tokens_required):
+                await self._alog_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                return self._insufficient_tokens_response()
+            await self._alog_batch_usage(request, self._valid_flags(aggregates))
+
+            return Response({**aggregates, "tokens_used": tokens_required}, status=status.HTTP_200_OK)
+        except Exception as e:
+            await self._alog_usage(request, 0, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.error(f"Error aggregating IDs: {e}")
+            return self._error_response(e)
+
+
+class EgyptianIDStreamExtractorAPIView(APIUsageMixin, UnifiedResponseAPIView):
+    """
+    Extract IDs from a newline-delimited or single-column CSV upload, streaming
+    the results back as NDJSON or CSV. The body is read and answered chunk by chunk,
+    and each chunk is billed only once it has been handed to the client.
+    """
+    success_message = 'ID stream processed successfully'
+    error_message = 'ID stream processing failed'
+    throttle_classes = [EgyptianIDThrottle]
+
+    def post(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in STREAM_WRITERS:
+            self._log_usage(request, 0, status.HTTP_400_BAD_REQUEST)
+            return Response(
+                [{'field': 'output', 'message': f"Unsupported output format, use one of: {', '.join(STREAM_WRITERS)}"}],
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        writer = STREAM_WRITERS[output]()
+        content_type = (request.content_type or '').split(';')[0].strip()
+        id_values = read_national_ids(request.stream, content_type)
+
+        response = StreamingHttpResponse(
+            self._stream_results(request, id_values, writer),
+            content_type=writer.content_type,
+        )
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _stream_results(self, request: Request, id_values: Iterator[str], writer) -> Iterator[str]:
+        header = writer.header()
+        if header:
+            yield header
+
+        for chunk in chunked(id_values, settings.NATIONAL_ID_STREAM_CHUNK_SIZE):
+            try:
+                results = extract_national_ids(chunk)
+                tokens_required = sum(1 for result in results if result['valid'])
+                if tokens_required and not charge_tokens(request.user, tokens_required):
+                    self._log_usage(request, 0, status.HTTP_402_PAYMENT_REQUIRED)
+                    yield writer.error("Insufficient tokens", "Not enough tokens to process this request")
+                    return
+            except Exception as e:
+                self._log_usage(request, 0, status.HTTP_500_INTERNAL_SERVER_ERROR)
+                logger.error(f"Error extracting ID stream: {e}")
+                yield writer.error(str(e), str(e))
+                return
+
+            try:
+                yield writer.rows(results)
+            except GeneratorExit:
+                # The client went away before this chunk was delivered, so it is not billed
+                if tokens_required:
+                    refund_tokens(request.user, tokens_required)
+                raise
+
+            self._log_batch_usage(request, (result['valid'] for result in results))
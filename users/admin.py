@@ -1,5 +1,6 @@
 from django.contrib import admin
-from users.models import User, APIKey
+from users.leasing import reclaim_lease
+from users.models import User, APIKey, APIUsageHourly, TokenLease
 
 # Register your models here.
 class APIKeyAdmin(admin.ModelAdmin):
@@ -15,5 +16,43 @@ class APIKeyAdmin(admin.ModelAdmin):
         else:
             super().save_model(request, obj, form, change)
 
+class TokenLeaseAdmin(admin.ModelAdmin):
+    """Outstanding token leases. Deleting one refunds its checkpointed unused tokens."""
+    list_display = ('user', 'worker', 'tokens', 'remaining', 'created_at', 'expires_at', 'expired')
+    list_filter = ('worker',)
+    search_fields = ('user__email', 'worker')
+    readonly_fields = ('user', 'worker', 'tokens', 'remaining', 'created_at', 'expires_at')
+
+    def delete_model(self, request, obj):
+        reclaim_lease(obj.pk)
+
+    def delete_queryset(self, request, queryset):
+        for lease_id in queryset.values_list('pk', flat=True):
+            reclaim_lease(lease_id)
+
+    @admin.display(boolean=True)
+    def expired(self, obj):
+        return obj.is_expired()
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class APIUsageHourlyAdmin(admin.ModelAdmin):
+    list_display = ('api_key', 'hour', 'response_status', 'requests', 'tokens_used')
+    list_filter = ('response_status',)
+    search_fields = ('api_key__user__email', 'api_key__name')
+    date_hierarchy = 'hour'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 admin.site.register(APIKey, APIKeyAdmin)
+admin.site.register(APIUsageHourly, APIUsageHourlyAdmin)
+admin.site.register(TokenLease, TokenLeaseAdmin)
 admin.site.register(User)
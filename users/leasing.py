@@ -0,0 +1,446 @@
+"""
+Per-worker token leasing.
+
+With TOKEN_LEASING['ENABLED'], a worker charges requests against a block of tokens it
+reserved from the user's balance in one atomic UPDATE, instead of writing the users
+row on every request. Leased tokens are already gone from tokens_balance, so workers
+together can never spend more than the user had.
+
+Unused tokens go back to the balance when the worker releases a lease: when it is
+replaced, when it expires (a keeper thread releases expired leases of idle users),
+or when the worker exits. A worker that dies without exiting cleanly (SIGKILL, OOM
+killer, gunicorn timeout) cannot release its leases, so every worker also writes
+what each lease has left to its TokenLease row at most every CHECKPOINT_INTERVAL
+seconds, and reclaim_leases() returns the checkpointed tokens of leases left behind:
+gunicorn's master reclaims the leases of a worker as soon as it is gone, and
+`manage.py reclaim_token_leases` those of any lease long expired. Charges made after
+a dead worker's last checkpoint are refunded with the rest.
+"""
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.utils.metrics import TOKEN_DEDUCTION_FAILURES
+from core.utils.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+
+class _LocalLease:
+    """Worker-side state of the lease held for one user."""
+    __slots__ = ('lock', 'lease_id', 'granted', 'remaining', 'granted_at', 'expires_at', 'checkpointed', 'checkpoint_at')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lease_id: Optional[int] = None
+        self.granted = 0
+        self.remaining = 0
+        self.granted_at = 0.0
+        self.expires_at = 0.0
+        # `remaining` as last written to the TokenLease row, and when to write it next
+        self.checkpointed = 0
+        self.checkpoint_at = 0.0
+
+
+def worker_name(pid: Optional[int] = None) -> str:
+    """The `worker` of the TokenLease rows of a process of this host."""
+    return f"{socket.gethostname()}:{os.getpid() if pid is None else pid}"
+
+
+class TokenLeasePool:
+    """
+    Leases held by this worker process, one per user. Each new lease is sized to cover
+    about `target_seconds` of the user's request rate, measured over the previous lease.
+    With `autostart`, a keeper thread started with the first lease runs maintain()
+    every `checkpoint_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        min_size: int,
+        max_size: int,
+        target_seconds: float,
+        ttl: float,
+        checkpoint_interval: float = 1.0,
+        autostart: bool = True,
+    ):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.target_seconds = target_seconds
+        self.ttl = ttl
+        self.checkpoint_interval = checkpoint_interval
+        self.autostart = autostart
+        self.pid = os.getpid()
+        self.worker = worker_name(self.pid)
+        self.acquired = 0
+        self.released = 0
+        self.local_charges = 0
+        self._leases: Dict[Any, _LocalLease] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_settings(cls) -> 'TokenLeasePool':
+        config = settings.TOKEN_LEASING
+        return cls(
+            min_size=config['MIN_SIZE'],
+            max_size=config['MAX_SIZE'],
+            target_seconds=config['TARGET_SECONDS'],
+            ttl=config['TTL'],
+            checkpoint_interval=config['CHECKPOINT_INTERVAL'],
+        )
+
+    def charge(self, user_id: Any, amount: int) -> bool:
+        """Spend tokens from the user's lease, reserving a new block when it runs out."""
+        if amount < 0:
+            raise ValueError("Cannot deduct negative tokens")
+        lease = self._lease_for(user_id)
+        with lease.lock:
+            now = time.monotonic()
+            if lease.lease_id is not None and now < lease.expires_at and lease.remaining >= amount:
+                lease.remaining -= amount
+                self.local_charges += 1
+                if now >= lease.checkpoint_at:
+                    self._checkpoint_safely(lease, now)
+                return True
+            return self._renew(user_id, lease, amount, now)
+
+    def charge_local(self, user_id: Any, amount: int) -> bool:
+        """
+        Spend tokens from the user's current lease if it covers them and no checkpoint
+        is due, without waiting for a lock or touching the database. False means
+        charge() has to be used.
+        """
+        if amount < 0:
+            raise ValueError("Cannot deduct negative tokens")
+        lease = self._leases.get(user_id)
+        if lease is None or not lease.lock.acquire(blocking=False):
+            return False
+        try:
+            now = time.monotonic()
+            if (
+                lease.lease_id is None
+                or now >= lease.expires_at
+                or now >= lease.checkpoint_at
+                or lease.remaining < amount
+            ):
+                return False
+            lease.remaining -= amount
+            self.local_charges += 1
+            return True
+        finally:
+            lease.lock.release()
+
+    def covers(self, user_id: Any, amount: int) -> bool:
+        """Whether the user's current lease has `amount` tokens left, without charging them."""
+        lease = self._leases.get(user_id)
+        return (
+            lease is not None
+            and lease.lease_id is not None
+            and time.monotonic() < lease.expires_at
+            and lease.remaining >= amount
+        )
+
+    def refund(self, user_id: Any, amount: int) -> None:
+        """Give back tokens charged for work that was not delivered."""
+        from users.models import User
+
+        lease = self._leases.get(user_id)
+        if lease is not None:
+            with lease.lock:
+                if lease.lease_id is not None:
+                    lease.remaining += amount
+                    return
+        User.objects.add_tokens(user_id, amount)
+
+    def release_all(self) -> None:
+        """Return every unused leased token to its user's balance."""
+        if self.pid != os.getpid():
+            # Forked children inherit the parent's leases but must never release them
+            return
+        self.stop()
+        with self._lock:
+            leases = list(self._leases.items())
+            self._leases.clear()
+        for user_id, lease in leases:
+            with lease.lock:
+                self._release_safely(user_id, lease)
+
+    def maintain(self) -> None:
+        """Checkpoint what each lease has left and release the expired ones, whether or not their users are active."""
+        now = time.monotonic()
+        with self._lock:
+            leases = list(self._leases.items())
+        for user_id, lease in leases:
+            if not lease.lock.acquire(blocking=False):
+                continue
+            try:
+                if lease.lease_id is None:
+                    continue
+                if now >= lease.expires_at:
+                    self._release_safely(user_id, lease)
+                else:
+                    self._checkpoint_safely(lease, now)
+            finally:
+                lease.lock.release()
+
+    def stop(self) -> None:
+        """Stop the keeper thread."""
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.checkpoint_interval + 5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            leases = [lease for lease in self._leases.values() if lease.lease_id is not None]
+        return {
+            'worker': self.worker,
+            'leases': len(leases),
+            'tokens_held': sum(lease.remaining for lease in leases),
+            'acquired': self.acquired,
+            'released': self.released,
+            'local_charges': self.local_charges,
+        }
+
+    def _lease_for(self, user_id: Any) -> _LocalLease:
+        lease = self._leases.get(user_id)
+        if lease is None:
+            with self._lock:
+                lease = self._leases.setdefault(user_id, _LocalLease())
+        return lease
+
+    def _next_size(self, lease: _LocalLease, now: float) -> int:
+        if lease.lease_id is None:
+            return self.min_size
+        rate = (lease.granted - lease.remaining) / max(now - lease.granted_at, 1e-3)
+        return int(min(self.max_size, max(self.min_size, rate * self.target_seconds)))
+
+    def _renew(self, user_id: Any, lease: _LocalLease, amount: int, now: float) -> bool:
+        from users.models import TokenLease, User
+
+        size = max(amount, self._next_size(lease, now))
+        with transaction.atomic():
+            self._release(user_id, lease)
+            if User.objects.deduct_tokens(user_id, size) is None:
+                # Not enough left for a block, charge just this request against the database
+                return size > amount and User.objects.deduct_tokens(user_id, amount) is not None
+            lease_row = TokenLease.objects.create(
+                user_id=user_id,
+                worker=self.worker,
+                tokens=size,
+                remaining=size - amount,
+                expires_at=timezone.now() + timedelta(seconds=self.ttl),
+            )
+
+        lease.lease_id = lease_row.pk
+        lease.granted = size
+        lease.remaining = lease.checkpointed = size - amount
+        lease.granted_at = now
+        lease.expires_at = now + self.ttl
+        lease.checkpoint_at = now + self.checkpoint_interval
+        self.acquired += 1
+        if self.autostart and self._thread is None:
+            self._start()
+        return True
+
+    def _release(self, user_id: Any, lease: _LocalLease) -> None:
+        from users.models import TokenLease, User
+
+        if lease.lease_id is None:
+            return
+        lease_id, remaining = lease.lease_id, lease.remaining
+        lease.lease_id = None
+        lease.remaining = 0
+        with transaction.atomic():
+            deleted, _ = TokenLease.objects.filter(pk=lease_id).delete()
+            if deleted and remaining:
+                User.objects.add_tokens(user_id, remaining)
+        if not deleted:
+            logger.warning(
+                f"Token lease {lease_id} of user {user_id} was reclaimed before this worker released it, "
+                f"its last checkpoint was refunded instead of the {remaining} tokens left here"
+            )
+        self.released += 1
+
+    def _checkpoint(self, lease: _LocalLease, now: float) -> None:
+        from users.models import TokenLease
+
+        lease.checkpoint_at = now + self.checkpoint_interval
+        if lease.remaining != lease.checkpointed:
+            TokenLease.objects.filter(pk=lease.lease_id).update(remaining=lease.remaining)
+            lease.checkpointed = lease.remaining
+
+    def _checkpoint_safely(self, lease: _LocalLease, now: float) -> None:
+        try:
+            self._checkpoint(lease, now)
+        except Exception as e:
+            logger.error(f"Failed to checkpoint token lease {lease.lease_id}: {e}")
+
+    def _release_safely(self, user_id: Any, lease: _LocalLease) -> None:
+        try:
+            self._release(user_id, lease)
+        except Exception as e:
+            logger.error(f"Failed to release token lease of user {user_id}: {e}")
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='token-lease-keeper', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.checkpoint_interval):
+            try:
+                self.maintain()
+            finally:
+                close_old_connections()
+
+
+def reclaim_lease(lease_id: int) -> Optional[int]:
+    """
+    Delete a lease and return its checkpointed tokens to its user. Returns the tokens
+    refunded, None when the lease was released meanwhile.
+    """
+    from users.models import TokenLease, User
+
+    with transaction.atomic():
+        row = TokenLease.objects.select_for_update().filter(pk=lease_id).values_list('user_id', 'remaining').first()
+        if row is None:
+            return None
+        user_id, remaining = row
+        TokenLease.objects.filter(pk=lease_id).delete()
+        if remaining > 0:
+            User.objects.add_tokens(user_id, remaining)
+    return max(remaining, 0)
+
+
+def reclaim_leases(expired_before=None, worker: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Reclaim the leases left behind by dead workers: those of `worker`, and/or those
+    that expired before `expired_before`. A live worker never charges an expired
+    lease, and finds it gone when it tries to release it. Returns (leases, tokens).
+    """
+    from users.models import TokenLease
+
+    queryset = TokenLease.objects.all()
+    if worker is not None:
+        queryset = queryset.filter(worker=worker)
+    if expired_before is not None:
+        queryset = queryset.filter(expires_at__lt=expired_before)
+
+    leases = tokens = 0
+    for lease_id in queryset.values_list('pk', flat=True).iterator():
+        refunded = reclaim_lease(lease_id)
+        if refunded is not None:
+            leases += 1
+            tokens += refunded
+    return leases, tokens
+
+
+_lease_pool: Optional[TokenLeasePool] = None
+_lease_pool_lock = threading.Lock()
+
+
+def get_lease_pool() -> TokenLeasePool:
+    """Return this process's lease pool, a forked worker gets its own."""
+    global _lease_pool
+    pool = _lease_pool
+    if pool is None or pool.pid != os.getpid():
+        # Concurrent first requests must not each reserve tokens in a pool of their own
+        with _lease_pool_lock:
+            if _lease_pool is None or _lease_pool.pid != os.getpid():
+                _lease_pool = TokenLeasePool.from_settings()
+                atexit.register(_lease_pool.release_all)
+            pool = _lease_pool
+    return pool
+
+
+def release_lease_pool() -> None:
+    """Return this process's leased tokens now, e.g. when a server worker exits."""
+    global _lease_pool
+    with _lease_pool_lock:
+        pool, _lease_pool = _lease_pool, None
+    if pool is not None:
+        pool.release_all()
+
+
+def charge_tokens(user, amount: int) -> bool:
+    """Charge through the worker's lease when leasing is enabled, else straight against the database."""
+    with stage('charge'):
+        if settings.TOKEN_LEASING['ENABLED']:
+            charged, mode = get_lease_pool().charge(user.pk, amount), 'lease'
+        else:
+            charged, mode = user.deduct_tokens(amount), 'database'
+    if not charged:
+        TOKEN_DEDUCTION_FAILURES.labels(mode).inc()
+    return charged
+
+
+async def acharge_tokens(user, amount: int) -> bool:
+    """charge_tokens for async views: lease hits stay on the event loop, renewals run in a thread."""
+    from users.models import User
+
+    with stage('charge'):
+        if settings.TOKEN_LEASING['ENABLED']:
+            pool = get_lease_pool()
+            if pool.charge_local(user.pk, amount):
+                return True
+            charged, mode = await sync_to_async(pool.charge)(user.pk, amount), 'lease'
+        else:
+            charged, mode = await User.objects.adeduct_tokens(user.pk, amount), 'database'
+    if not charged:
+        TOKEN_DEDUCTION_FAILURES.labels(mode).inc()
+    return charged
+
+
+def has_tokens(user, amount: int) -> bool:
+    """
+    Whether charging `amount` tokens would succeed now, without charging them. The
+    loaded user's balance is not trusted: it may come from the API key cache, or be
+    leased to this worker.
+    """
+    from users.models import User
+
+    if settings.TOKEN_LEASING['ENABLED'] and get_lease_pool().covers(user.pk, amount):
+        return True
+    return User.objects.filter(pk=user.pk, tokens_balance__gte=amount).exists()
+
+
+async def ahas_tokens(user, amount: int) -> bool:
+    """has_tokens for async views."""
+    from users.models import User
+
+    if settings.TOKEN_LEASING['ENABLED'] and get_lease_pool().covers(user.pk, amount):
+        return True
+    return await User.objects.filter(pk=user.pk, tokens_balance__gte=amount).aexists()
+
+
+def refund_tokens(user, amount: int) -> None:
+    if settings.TOKEN_LEASING['ENABLED']:
+        get_lease_pool().refund(user.pk, amount)
+    else:
+        user.add_tokens(amount)
+
+
+@receiver(setting_changed)
+def _reset_lease_pool(setting, **kwargs):
+    global _lease_pool
+    if setting == 'TOKEN_LEASING':
+        if _lease_pool is not None:
+            _lease_pool.release_all()
+        _lease_pool = None
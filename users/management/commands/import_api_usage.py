@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import APIUsage, APIUsageImport
+from users.rollups import add_to_rollups
+from users.usage import read_usage_file, rotated_usage_files
+
+
+class Command(BaseCommand):
+    help = 'Load rotated API usage JSONL files into APIUsage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Files to import, defaults to every rotated file in API_USAGE_LOGGING JSONL_DIR',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--keep', action='store_true', help='Keep files after importing them')
+
+    def handle(self, *args, **options):
+        paths = [Path(path) for path in options['paths']] or rotated_usage_files(
+            settings.API_USAGE_LOGGING['JSONL_DIR']
+        )
+        total = 0
+        for path in paths:
+            # One transaction per file, so a file is either fully imported or not at all.
+            # The file is recorded in it too: one whose import committed but that was
+            # not deleted (a crash, --keep) is skipped by later runs
+            with transaction.atomic():
+                record, created = APIUsageImport.objects.get_or_create(file_name=path.name)
+                count = 0
+                if created:
+                    batch = []
+                    for event in read_usage_file(path):
+                        batch.append(event)
+                        if len(batch) >= options['batch_size']:
+                            count += self._import(batch)
+                            batch = []
+                    if batch:
+                        count += self._import(batch)
+                    record.events = count
+                    record.save(update_fields=['events'])
+            if not options['keep']:
+                path.unlink()
+            total += count
+            if created:
+                self.stdout.write(f'{path.name}: {count} events')
+            else:
+                self.stdout.write(f'{path.name}: already imported {record.imported_at:%Y-%m-%d %H:%M:%S}, skipped')
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {total} API usage events from {len(paths)} files'))
+
+    def _import(self, events):
+        APIUsage.objects.bulk_create([event.to_model() for event in events])
+        # Events of hours that are already rolled up would otherwise be missing from reports
+        add_to_rollups(events)
+        return len(events)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users.rollups import prune_usage
+
+
+class Command(BaseCommand):
+    help = 'Delete rolled up APIUsage rows older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Retention in days (default API_USAGE_RETENTION DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per statement (default API_USAGE_RETENTION BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        deleted = prune_usage(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} API usage rows'))
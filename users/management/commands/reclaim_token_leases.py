@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.leasing import reclaim_leases
+
+
+class Command(BaseCommand):
+    help = 'Return the unused tokens of leases left behind by workers that died without releasing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help='Seconds a lease must have been expired for, live workers release theirs sooner (default 60)',
+        )
+        parser.add_argument('--worker', help='Reclaim every lease of this worker (host:pid) now, expired or not')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            leases, tokens = reclaim_leases(worker=options['worker'])
+        else:
+            leases, tokens = reclaim_leases(expired_before=timezone.now() - timedelta(seconds=options['grace']))
+        self.stdout.write(self.style.SUCCESS(f'Reclaimed {tokens} tokens of {leases} token leases'))
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.rollups import roll_up_usage
+
+
+class Command(BaseCommand):
+    help = 'Roll up complete hours of APIUsage into APIUsageHourly'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='ISO timestamp to roll up again from, e.g. after late events were imported',
+        )
+        parser.add_argument(
+            '--settle', type=int,
+            help='Seconds to wait after an hour ends before rolling it up (default API_USAGE_ROLLUP SETTLE_SECONDS)',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Invalid --since timestamp: {options['since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        settle = timedelta(seconds=options['settle']) if options['settle'] is not None else None
+
+        result = roll_up_usage(since=since, settle=settle)
+        if not result['hours']:
+            self.stdout.write('Nothing to roll up')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {result['hours']} hours from {result['start']:%Y-%m-%d %H:00} "
+            f"to {result['end']:%Y-%m-%d %H:00} into {result['rows']} rows"
+        ))
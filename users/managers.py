@@ -1,4 +1,8 @@
+from typing import Optional
 from django.contrib.auth.models import BaseUserManager
+from django.db import connections, models
+from django.db.models import F, Q
+from django.utils import timezone
 
 class UserManager(BaseUserManager):
     """Custom user manager for email-based authentication"""
@@ -15,4 +19,67 @@ class UserManager(BaseUserManager):
     def create_superuser(self, email, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
-        return self.create_user(email, password, **extra_fields)
\ No newline at end of file
+        return self.create_user(email, password, **extra_fields)
+
+    def add_tokens(self, user_id, amount: int) -> Optional[int]:
+        """Atomically credit tokens and return the new balance, None if the user is gone."""
+        if amount < 0:
+            raise ValueError("Cannot add negative tokens")
+        return self._update_balance(user_id, amount)
+
+    def deduct_tokens(self, user_id, amount: int) -> Optional[int]:
+        """
+        Atomically charge tokens with a single conditional UPDATE and return the new
+        balance, or None when the balance is too low. Concurrent charges cannot
+        overdraw the balance or overwrite each other.
+        """
+        if amount < 0:
+            raise ValueError("Cannot deduct negative tokens")
+        return self._update_balance(user_id, -amount, required=amount)
+
+    async def adeduct_tokens(self, user_id, amount: int) -> bool:
+        """Async ORM version of deduct_tokens, returning whether the tokens were charged."""
+        if amount < 0:
+            raise ValueError("Cannot deduct negative tokens")
+        updated = await self.using(self.db).filter(pk=user_id, tokens_balance__gte=amount).aupdate(
+            tokens_balance=F('tokens_balance') - amount
+        )
+        return bool(updated)
+
+    def _update_balance(self, user_id, delta: int, required: Optional[int] = None) -> Optional[int]:
+        connection = connections[self.db]
+        if connection.vendor == 'postgresql' or (
+            connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+        ):
+            quote = connection.ops.quote_name
+            opts = self.model._meta
+            column = quote(opts.get_field('tokens_balance').column)
+            sql = (
+                f"UPDATE {quote(opts.db_table)} SET {column} = {column} + %s "
+                f"WHERE {quote(opts.pk.column)} = %s"
+            )
+            params = [delta, user_id]
+            if required is not None:
+                sql += f" AND {column} >= %s"
+                params.append(required)
+            with connection.cursor() as cursor:
+                cursor.execute(f"{sql} RETURNING {column}", params)
+                row = cursor.fetchone()
+            return row[0] if row else None
+
+        # Backends without UPDATE ... RETURNING read the balance back in a second query
+        queryset = self.using(self.db).filter(pk=user_id)
+        if required is not None:
+            queryset = queryset.filter(tokens_balance__gte=required)
+        if not queryset.update(tokens_balance=F('tokens_balance') + delta):
+            return None
+        return self.using(self.db).filter(pk=user_id).values_list('tokens_balance', flat=True).first()
+
+
+class APIKeyQuerySet(models.QuerySet):
+    def active(self):
+        """Keys that are enabled and not expired"""
+        return self.filter(
+            Q(is_active=True) &
+            (Q(expires_at__gte=timezone.now()) | Q(expires_at__isnull=True))
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker', models.CharField(max_length=255)),
+                ('tokens', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='token_leases', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Token Lease',
+                'verbose_name_plural': 'Token Leases',
+                'db_table': 'token_leases',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user'], name='token_lease_user_id_a14344_idx'), models.Index(fields=['expires_at'], name='token_lease_expires_e30d16_idx')],
+            },
+        ),
+    ]
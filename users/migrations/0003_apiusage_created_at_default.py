@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_tokenlease'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='apiusage',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_apiusage_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIUsageHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('response_status', models.CharField(max_length=10)),
+                ('requests', models.IntegerField(default=0)),
+                ('tokens_used', models.BigIntegerField(default=0)),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.apikey')),
+            ],
+            options={
+                'verbose_name': 'API Usage (Hourly)',
+                'verbose_name_plural': 'API Usage (Hourly)',
+                'db_table': 'api_usage_hourly',
+                'ordering': ['-hour'],
+                'indexes': [models.Index(fields=['hour'], name='api_usage_h_hour_311c71_idx')],
+                'constraints': [models.UniqueConstraint(fields=('api_key', 'hour', 'response_status'), name='unique_api_usage_hourly')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_apiusagehourly'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apiusage',
+            index=models.Index(fields=['api_key', 'created_at', 'id'], name='api_usage_key_created_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='apiusage',
+            name='users_apius_api_key_0fda82_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_apiusage_key_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tokenlease',
+            name='remaining',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_tokenlease_remaining'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIUsageImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255, unique=True)),
+                ('events', models.IntegerField(default=0)),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'API Usage Import',
+                'verbose_name_plural': 'API Usage Imports',
+                'db_table': 'api_usage_imports',
+                'ordering': ['-imported_at'],
+            },
+        ),
+    ]
@@ -1,11 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
-from .managers import UserManager
+from .managers import APIKeyQuerySet, UserManager
 import secrets
 import hashlib
 import hmac
 from typing import Tuple
 from django.utils import timezone
+from core.utils.api_key_cache import get_api_key_cache
 
 class User(AbstractBaseUser, PermissionsMixin):
     first_name = models.CharField(max_length=100)
@@ -36,22 +37,21 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
     
     def add_tokens(self, amount: int) -> int:
-        if amount < 0:
-            raise ValueError("Cannot add negative tokens")
-        self.tokens_balance += amount
-        self.save(update_fields=['tokens_balance'])
+        balance = User.objects.add_tokens(self.pk, amount)
+        if balance is not None:
+            self.tokens_balance = balance
         return self.tokens_balance
     
     def deduct_tokens(self, amount: int) -> bool:
-        if amount < 0:
-            raise ValueError("Cannot deduct negative tokens")
-        if self.tokens_balance >= amount:
-            self.tokens_balance -= amount
-            self.save(update_fields=['tokens_balance'])
-            return True
-        return False
+        """Charge tokens in the database, the in-memory balance is only refreshed on success."""
+        balance = User.objects.deduct_tokens(self.pk, amount)
+        if balance is None:
+            return False
+        self.tokens_balance = balance
+        return True
     
     def has_sufficient_tokens(self, amount: int) -> bool:
+        """Advisory check on the loaded balance, deduct_tokens() is the authoritative one."""
         return self.tokens_balance >= amount
     
 
@@ -63,6 +63,8 @@ class APIKey(models.Model):
     expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = APIKeyQuerySet.as_manager()
     
     class Meta:
         db_table = 'api_keys'
@@ -97,6 +99,8 @@ class APIKey(models.Model):
             name=name,
             **kwargs
         )
+        # A recently rejected hash must never block the key that now owns it
+        get_api_key_cache().discard_rejection(hashed_key)
         return api_key, plain_key
     
     def is_expired(self) -> bool:
@@ -113,11 +117,84 @@ class APIUsage(models.Model):
     user_agent = models.TextField()
     tokens_used = models.IntegerField(default=1)
     response_status = models.CharField(max_length=10)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the caller so buffered and imported events keep the time of the request
+    created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         indexes = [
-            models.Index(fields=['api_key']),
+            # Serves per-key lookups and keyset pages ordered by (created_at, id)
+            models.Index(fields=['api_key', 'created_at', 'id'], name='api_usage_key_created_idx'),
             models.Index(fields=['created_at'])
-        ]
\ No newline at end of file
+        ]
+
+
+class APIUsageHourly(models.Model):
+    """Request count and tokens of one API key, hour and response status, rolled up from APIUsage."""
+    api_key = models.ForeignKey(APIKey, on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    response_status = models.CharField(max_length=10)
+    requests = models.IntegerField(default=0)
+    tokens_used = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'api_usage_hourly'
+        verbose_name = 'API Usage (Hourly)'
+        verbose_name_plural = 'API Usage (Hourly)'
+        ordering = ['-hour']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['api_key', 'hour', 'response_status'], name='unique_api_usage_hourly'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['hour'])
+        ]
+
+
+class APIUsageImport(models.Model):
+    """
+    A JSONL usage file loaded by `manage.py import_api_usage`, saved in the transaction
+    of its events, so a file is never imported twice even if it outlives its import.
+    """
+    file_name = models.CharField(max_length=255, unique=True)
+    events = models.IntegerField(default=0)
+    imported_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'api_usage_imports'
+        verbose_name = 'API Usage Import'
+        verbose_name_plural = 'API Usage Imports'
+        ordering = ['-imported_at']
+
+
+class TokenLease(models.Model):
+    """
+    Block of tokens reserved from a user's balance by one worker process. The tokens
+    are already deducted from tokens_balance and are spent in the worker's memory;
+    whatever is left goes back to the balance when the lease is released, or when
+    it is reclaimed after its worker died. `remaining` is the worker's last
+    checkpoint of the unspent tokens.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='token_leases')
+    worker = models.CharField(max_length=255)
+    tokens = models.IntegerField()
+    remaining = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'token_leases'
+        verbose_name = 'Token Lease'
+        verbose_name_plural = 'Token Leases'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user']),
+            models.Index(fields=['expires_at'])
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user.email} - {self.tokens} tokens ({self.worker})"
+
+    def is_expired(self) -> bool:
+        return timezone.now() > self.expires_at
@@ -0,0 +1,195 @@
+"""
+Hourly rollups and retention for APIUsage.
+
+Complete hours of raw APIUsage rows are aggregated into APIUsageHourly per API key
+and response status. Every hour before the watermark (the hour after the newest
+rollup) is served from rollups, so reporting only scans raw rows for the newest,
+not yet rolled up window. Raw rows are pruned only once they are both past the
+retention period and rolled up.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from users.models import APIUsage, APIUsageHourly
+
+HOUR = timedelta(hours=1)
+
+
+def truncate_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_watermark() -> Optional[datetime]:
+    """Start of the first hour that is not rolled up yet, None before the first rollup."""
+    last_hour = APIUsageHourly.objects.aggregate(last=Max('hour'))['last']
+    return last_hour + HOUR if last_hour is not None else None
+
+
+def retention_floor() -> Optional[datetime]:
+    """Raw rows before this hour may already be pruned, so their hours must not be recomputed."""
+    days = settings.API_USAGE_RETENTION['DAYS']
+    if not days:
+        return None
+    return truncate_hour(timezone.now() - timedelta(days=days)) + HOUR
+
+
+def rollup_hours(start: datetime, end: datetime) -> int:
+    """
+    Recompute the rollups of every hour in [start, end) from raw rows, replacing what
+    was there, and return the number of rollup rows written. Idempotent, so late
+    events are picked up by rolling their hours up again.
+    """
+    start, end = truncate_hour(start), truncate_hour(end)
+    rows = (
+        APIUsage.objects
+        .filter(created_at__gte=start, created_at__lt=end)
+        .annotate(bucket=TruncHour('created_at'))
+        .values('api_key_id', 'bucket', 'response_status')
+        .annotate(requests=Count('id'), tokens=Sum('tokens_used'))
+        .order_by()
+    )
+    rollups = [
+        APIUsageHourly(
+            api_key_id=row['api_key_id'],
+            hour=row['bucket'],
+            response_status=row['response_status'],
+            requests=row['requests'],
+            tokens_used=row['tokens'] or 0,
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        APIUsageHourly.objects.filter(hour__gte=start, hour__lt=end).delete()
+        APIUsageHourly.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def roll_up_usage(
+    since: Optional[datetime] = None,
+    settle: Optional[timedelta] = None,
+    chunk: timedelta = timedelta(days=1),
+) -> Dict[str, Any]:
+    """
+    Roll up every complete hour from the watermark (or `since`) up to the current hour,
+    minus a settle delay for events still buffered by the workers. Works through the
+    range in chunks so a long backlog is never aggregated in one query.
+    """
+    if settle is None:
+        settle = timedelta(seconds=settings.API_USAGE_ROLLUP['SETTLE_SECONDS'])
+    start = since or rollup_watermark()
+    if start is None:
+        start = APIUsage.objects.aggregate(first=Min('created_at'))['first']
+    end = truncate_hour(timezone.now() - settle)
+    if start is None or truncate_hour(start) >= end:
+        return {'start': start, 'end': end, 'hours': 0, 'rows': 0}
+
+    floor = retention_floor()
+    start = max(truncate_hour(start), floor) if floor is not None else truncate_hour(start)
+    if start >= end:
+        return {'start': start, 'end': end, 'hours': 0, 'rows': 0}
+    rows = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + chunk, end)
+        rows += rollup_hours(chunk_start, chunk_end)
+        chunk_start = chunk_end
+    return {'start': start, 'end': end, 'hours': int((end - start) / HOUR), 'rows': rows}
+
+
+def add_to_rollups(events: Iterable[Any]) -> int:
+    """
+    Add late events (anything with api_key_id, created_at, response_status and
+    tokens_used) to the rollups of hours before the watermark, which the next
+    rollup run would otherwise skip. Returns the number of events added.
+    """
+    watermark = rollup_watermark()
+    if watermark is None:
+        return 0
+    buckets: Dict[tuple, List[int]] = {}
+    for event in events:
+        if event.created_at >= watermark:
+            continue
+        key = (event.api_key_id, truncate_hour(event.created_at), event.response_status)
+        bucket = buckets.setdefault(key, [0, 0])
+        bucket[0] += 1
+        bucket[1] += event.tokens_used
+
+    with transaction.atomic():
+        for (api_key_id, hour, response_status), (requests, tokens) in buckets.items():
+            rollup, _ = APIUsageHourly.objects.select_for_update().get_or_create(
+                api_key_id=api_key_id, hour=hour, response_status=response_status
+            )
+            APIUsageHourly.objects.filter(pk=rollup.pk).update(
+                requests=F('requests') + requests, tokens_used=F('tokens_used') + tokens
+            )
+    return sum(requests for requests, _ in buckets.values())
+
+
+def prune_usage(days: Optional[int] = None, batch_size: Optional[int] = None) -> int:
+    """
+    Delete raw rows older than the retention period in batches of `batch_size`,
+    never touching hours that are not rolled up yet. Returns the number deleted.
+    """
+    config = settings.API_USAGE_RETENTION
+    days = config['DAYS'] if days is None else days
+    batch_size = batch_size or config['BATCH_SIZE']
+    watermark = rollup_watermark()
+    if not days or watermark is None:
+        return 0
+
+    cutoff = min(timezone.now() - timedelta(days=days), watermark)
+    deleted = 0
+    while True:
+        ids = list(
+            APIUsage.objects.filter(created_at__lt=cutoff).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += APIUsage.objects.filter(id__in=ids).delete()[0]
+
+
+def usage_totals(
+    start: datetime,
+    end: datetime,
+    api_key_ids: Optional[Iterable[int]] = None,
+    group_by: Iterable[str] = ('api_key_id', 'response_status'),
+) -> List[Dict[str, Any]]:
+    """
+    Requests and tokens between `start` and `end` grouped by `group_by` (any of
+    api_key_id, response_status and hour). Rolled up hours are read from
+    APIUsageHourly, at hour granularity; only the window after the watermark is
+    read from raw rows.
+    """
+    group_by = list(group_by)
+    watermark = rollup_watermark() or start
+    totals: Dict[tuple, Dict[str, Any]] = {}
+
+    def add(row: Dict[str, Any]) -> None:
+        key = tuple(row[field] for field in group_by)
+        total = totals.setdefault(key, {**{field: row[field] for field in group_by}, 'requests': 0, 'tokens_used': 0})
+        total['requests'] += row['requests']
+        total['tokens_used'] += row['tokens'] or 0
+
+    if start < watermark:
+        rollups = APIUsageHourly.objects.filter(hour__gte=truncate_hour(start), hour__lt=min(end, watermark))
+        if api_key_ids is not None:
+            rollups = rollups.filter(api_key_id__in=api_key_ids)
+        for row in rollups.values(*group_by).annotate(requests=Sum('requests'), tokens=Sum('tokens_used')).order_by():
+            add(row)
+
+    if end > watermark:
+        raw = APIUsage.objects.filter(created_at__gte=max(start, watermark), created_at__lt=end)
+        if api_key_ids is not None:
+            raw = raw.filter(api_key_id__in=api_key_ids)
+        if 'hour' in group_by:
+            raw = raw.annotate(hour=TruncHour('created_at'))
+        for row in raw.values(*group_by).annotate(requests=Count('id'), tokens=Sum('tokens_used')).order_by():
+            add(row)
+
+    return list(totals.values())
@@ -0,0 +1,64 @@
+import base64
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from core.base.serializers import BaseSerializer
+
+
+def encode_cursor(created_at: datetime, pk: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{pk}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(pk)
+
+
+class UsageQuerySerializer(BaseSerializer):
+    """
+    Filters and keyset cursor of the usage listing. The cursor points at the last
+    row of the previous page, so every page is an index range scan.
+    """
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    status = serializers.CharField(required=False, max_length=10)
+    limit = serializers.IntegerField(required=False, min_value=1, default=100)
+    cursor = serializers.CharField(required=False)
+
+    def validate_limit(self, value):
+        max_size = settings.USAGE_PAGE_MAX_SIZE
+        if value > max_size:
+            raise serializers.ValidationError(f"Ensure this value is less than or equal to {max_size}.")
+        return value
+
+    def validate_cursor(self, value):
+        try:
+            return decode_cursor(value)
+        except (ValueError, UnicodeDecodeError):
+            raise serializers.ValidationError("Invalid cursor")
+
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'start': ["Start must be before end"]})
+        return attrs
+
+
+class UsageSummaryQuerySerializer(BaseSerializer):
+    """Date range of the daily usage summary, the last 30 days by default."""
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    max_days = 366
+
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.now())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=30))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'start': ["Start must be before end"]})
+        if attrs['end'] - attrs['start'] > timedelta(days=self.max_days):
+            raise serializers.ValidationError({'start': [f"Ensure the range is at most {self.max_days} days."]})
+        return attrs
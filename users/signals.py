@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.utils.api_key_cache import get_api_key_cache
+from users.models import APIKey, User
+
+
+@receiver([post_save, post_delete], sender=APIKey)
+def invalidate_cached_api_key(sender, instance, **kwargs):
+    """Revocations, expiry edits and deletions must not be served from the cache"""
+    get_api_key_cache().invalidate_key(instance.key_hash)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user_keys(sender, instance, **kwargs):
+    """
+    Profile changes and deactivations make the cached user stale. Token balances are
+    updated in place with single statements and are always charged against the database.
+    """
+    get_api_key_cache().invalidate_user(instance.pk)
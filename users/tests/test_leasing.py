@@ -0,0 +1,216 @@
+import pytest
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from users.leasing import (
+    TokenLeasePool, acharge_tokens, charge_tokens, get_lease_pool, reclaim_lease, reclaim_leases, refund_tokens,
+)
+from users.models import TokenLease, User
+
+LEASING = {
+    'ENABLED': True, 'MIN_SIZE': 10, 'MAX_SIZE': 100, 'TARGET_SECONDS': 2.0, 'TTL': 30, 'CHECKPOINT_INTERVAL': 1.0,
+}
+
+
+@pytest.mark.django_db
+class TestTokenLeasePool(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=25
+        )
+        self.pool = TokenLeasePool(min_size=10, max_size=100, target_seconds=2.0, ttl=30, autostart=False)
+
+    def _balance(self):
+        return User.objects.values_list('tokens_balance', flat=True).get(pk=self.user.pk)
+
+    def test_first_charge_reserves_block(self):
+        assert self.pool.charge(self.user.pk, 1) is True
+
+        assert self._balance() == 15
+        lease = TokenLease.objects.get(user=self.user)
+        assert lease.tokens == 10
+        assert lease.worker == self.pool.worker
+        assert self.pool.stats()['tokens_held'] == 9
+
+    def test_charges_within_lease_skip_database(self):
+        self.pool.charge(self.user.pk, 1)
+
+        with self.assertNumQueries(0):
+            for _ in range(9):
+                assert self.pool.charge(self.user.pk, 1) is True
+
+    def test_cannot_spend_more_than_balance(self):
+        charged = sum(self.pool.charge(self.user.pk, 1) for _ in range(40))
+
+        assert charged == 25
+        assert self._balance() == 0
+
+    def test_release_returns_unused_tokens(self):
+        self.pool.charge(self.user.pk, 3)
+
+        self.pool.release_all()
+
+        assert self._balance() == 22
+        assert not TokenLease.objects.exists()
+
+    def test_reclaimed_lease_is_not_returned_twice(self):
+        self.pool.charge(self.user.pk, 1)
+        assert reclaim_lease(TokenLease.objects.get().pk) == 9
+
+        with self.assertLogs('users.leasing', 'WARNING'):
+            self.pool.release_all()
+
+        assert self._balance() == 24
+
+    def test_charge_local_only_spends_a_held_lease(self):
+        assert self.pool.charge_local(self.user.pk, 1) is False
+
+        self.pool.charge(self.user.pk, 1)
+        with self.assertNumQueries(0):
+            assert self.pool.charge_local(self.user.pk, 5) is True
+            assert self.pool.charge_local(self.user.pk, 5) is False
+
+        assert self.pool.stats()['tokens_held'] == 4
+
+    def test_lease_size_follows_request_rate(self):
+        self.user.add_tokens(1000)
+        with patch('users.leasing.time.monotonic', return_value=0.0):
+            for _ in range(10):
+                self.pool.charge(self.user.pk, 1)
+        with patch('users.leasing.time.monotonic', return_value=0.5):
+            self.pool.charge(self.user.pk, 1)
+
+        # 10 tokens in 0.5s is 20 tokens/s, so the next lease covers 2s of traffic
+        assert TokenLease.objects.get(user=self.user).tokens == 40
+
+    def test_expired_lease_is_replaced(self):
+        with patch('users.leasing.time.monotonic', return_value=0.0):
+            self.pool.charge(self.user.pk, 1)
+        with patch('users.leasing.time.monotonic', return_value=31.0):
+            self.pool.charge(self.user.pk, 1)
+
+        assert TokenLease.objects.count() == 1
+        assert self._balance() == 14
+
+    def test_checkpoint_writes_remaining_tokens(self):
+        with patch('users.leasing.time.monotonic', return_value=0.0):
+            self.pool.charge(self.user.pk, 1)
+        assert TokenLease.objects.get().remaining == 9
+
+        with patch('users.leasing.time.monotonic', return_value=0.5):
+            with self.assertNumQueries(0):
+                self.pool.charge(self.user.pk, 2)
+        with patch('users.leasing.time.monotonic', return_value=1.5):
+            self.pool.charge(self.user.pk, 1)
+
+        assert TokenLease.objects.get().remaining == 6
+
+    def test_charge_local_leaves_due_checkpoint_to_charge(self):
+        with patch('users.leasing.time.monotonic', return_value=0.0):
+            self.pool.charge(self.user.pk, 1)
+        with patch('users.leasing.time.monotonic', return_value=1.5):
+            assert self.pool.charge_local(self.user.pk, 1) is False
+
+    def test_maintain_releases_expired_lease_of_idle_user(self):
+        with patch('users.leasing.time.monotonic', return_value=0.0):
+            self.pool.charge(self.user.pk, 3)
+        with patch('users.leasing.time.monotonic', return_value=31.0):
+            self.pool.maintain()
+
+        assert self._balance() == 22
+        assert not TokenLease.objects.exists()
+
+    def test_maintain_checkpoints_without_charges(self):
+        with patch('users.leasing.time.monotonic', return_value=0.0):
+            self.pool.charge(self.user.pk, 1)
+            self.pool.charge(self.user.pk, 4)
+            self.pool.maintain()
+
+        assert TokenLease.objects.get().remaining == 5
+
+    def test_tokens_of_dead_worker_are_reclaimed(self):
+        with patch('users.leasing.time.monotonic', return_value=0.0):
+            self.pool.charge(self.user.pk, 1)
+        with patch('users.leasing.time.monotonic', return_value=1.5):
+            self.pool.charge(self.user.pk, 3)
+        # The worker is killed: release_all never runs and its lease outlives it
+        self.pool = None
+        assert self._balance() == 15
+
+        output = StringIO()
+        call_command('reclaim_token_leases', stdout=output)
+        assert TokenLease.objects.exists()
+
+        TokenLease.objects.update(expires_at=timezone.now() - timedelta(minutes=5))
+        call_command('reclaim_token_leases', stdout=output)
+
+        assert self._balance() == 21
+        assert not TokenLease.objects.exists()
+        assert 'Reclaimed 6 tokens of 1 token leases' in output.getvalue()
+
+    def test_leases_of_exited_worker_are_reclaimed_at_once(self):
+        self.pool.charge(self.user.pk, 2)
+
+        assert reclaim_leases(worker='other-host:1') == (0, 0)
+        assert reclaim_leases(worker=self.pool.worker) == (1, 8)
+        assert self._balance() == 23
+
+    def test_refund_goes_back_to_lease(self):
+        self.pool.charge(self.user.pk, 5)
+
+        self.pool.refund(self.user.pk, 5)
+
+        assert self.pool.stats()['tokens_held'] == 10
+
+
+@pytest.mark.django_db
+class TestChargeTokens(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=25
+        )
+
+    def test_per_request_deduction_by_default(self):
+        assert charge_tokens(self.user, 2) is True
+        refund_tokens(self.user, 1)
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 24
+        assert not TokenLease.objects.exists()
+
+    @override_settings(TOKEN_LEASING=LEASING)
+    def test_leasing_charges_through_pool(self):
+        assert charge_tokens(self.user, 2) is True
+
+        self.user.refresh_from_db()
+        assert self.user.tokens_balance == 15
+        assert get_lease_pool().stats()['tokens_held'] == 8
+
+    async def test_async_charge_deducts_from_database(self):
+        assert await acharge_tokens(self.user, 20) is True
+        assert await acharge_tokens(self.user, 20) is False
+
+        await self.user.arefresh_from_db()
+        assert self.user.tokens_balance == 5
+
+    @override_settings(TOKEN_LEASING=LEASING)
+    async def test_async_charge_uses_lease(self):
+        assert await acharge_tokens(self.user, 2) is True
+        assert await acharge_tokens(self.user, 2) is True
+
+        await self.user.arefresh_from_db()
+        assert self.user.tokens_balance == 15
+        assert get_lease_pool().stats()['tokens_held'] == 6
+        await sync_to_async(get_lease_pool().release_all)()
@@ -1,5 +1,7 @@
 import pytest
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from django.db import OperationalError, close_old_connections
+from django.test import TestCase, TransactionTestCase
 from users.models import User, APIKey, APIUsage
 from django.utils import timezone
 from datetime import timedelta
@@ -60,6 +62,34 @@ class TestUserModel(TestCase):
         assert user.has_sufficient_tokens(50) is True
         assert user.has_sufficient_tokens(150) is False
 
+    def test_deduct_tokens_from_stale_instances(self):
+        user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=10
+        )
+        stale = User.objects.get(pk=user.pk)
+
+        assert user.deduct_tokens(6) is True
+        assert stale.deduct_tokens(6) is False
+        assert stale.deduct_tokens(4) is True
+        assert stale.tokens_balance == 0
+
+        user.refresh_from_db()
+        assert user.tokens_balance == 0
+
+    def test_manager_deduct_tokens_returns_balance(self):
+        user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=10
+        )
+        assert User.objects.deduct_tokens(user.pk, 3) == 7
+        assert User.objects.deduct_tokens(user.pk, 8) is None
+        assert User.objects.add_tokens(user.pk, 5) == 12
+
 
 @pytest.mark.django_db
 class TestAPIKeyModel(TestCase):
@@ -128,4 +158,34 @@ class TestAPIKeyModel(TestCase):
             last_name='User'
         )
         api_key, _ = APIKey.create_key(user, 'Test Key', is_active=False)
-        assert api_key.is_valid() is False 
\ No newline at end of file
+        assert api_key.is_valid() is False 
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentTokenDeduction(TransactionTestCase):
+
+    def test_parallel_deductions_never_overdraw(self):
+        user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=50
+        )
+
+        def charge(_):
+            try:
+                while True:
+                    try:
+                        return User.objects.get(pk=user.pk).deduct_tokens(1)
+                    except OperationalError as e:
+                        # The in-memory SQLite test database rejects concurrent writers instead of waiting
+                        if 'locked' not in str(e):
+                            raise
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(charge, range(80)))
+
+        user.refresh_from_db()
+        assert results.count(True) == 50
+        assert user.tokens_balance == 0
@@ -0,0 +1,159 @@
+import pytest
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from users.models import APIKey, APIUsage, APIUsageHourly, User
+from users.rollups import (
+    prune_usage,
+    roll_up_usage,
+    rollup_watermark,
+    truncate_hour,
+    usage_totals,
+)
+from users.usage import BufferedUsageSink, JSONLUsageSink, UsageEvent
+
+
+@pytest.mark.django_db
+class TestUsageRollups(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User'
+        )
+        self.api_key, _ = APIKey.create_key(self.user, 'Test Key')
+        self.now = timezone.now()
+        self.current_hour = truncate_hour(self.now)
+
+    def _usage(self, hours_ago, response_status='200', tokens_used=1):
+        return APIUsage.objects.create(
+            api_key=self.api_key,
+            ip_address='127.0.0.1',
+            user_agent='TestAgent/1.0',
+            tokens_used=tokens_used,
+            response_status=response_status,
+            created_at=self.now - timedelta(hours=hours_ago),
+        )
+
+    def _totals(self, **kwargs):
+        rows = usage_totals(self.current_hour - timedelta(days=7), self.now + timedelta(minutes=1), **kwargs)
+        return sorted((row['response_status'], row['requests'], row['tokens_used']) for row in rows)
+
+    def test_complete_hours_rolled_up(self):
+        self._usage(2)
+        self._usage(2)
+        self._usage(2, response_status='400', tokens_used=0)
+        self._usage(1)
+        self._usage(0)
+
+        result = roll_up_usage(settle=timedelta(0))
+
+        assert result['hours'] == 2
+        hourly = APIUsageHourly.objects.get(hour=self.current_hour - timedelta(hours=2), response_status='200')
+        assert (hourly.requests, hourly.tokens_used) == (2, 2)
+        assert APIUsageHourly.objects.count() == 3
+        assert rollup_watermark() == self.current_hour
+
+    def test_rollup_is_incremental_and_idempotent(self):
+        self._usage(2)
+        roll_up_usage(settle=timedelta(0))
+        self._usage(1)
+
+        roll_up_usage(settle=timedelta(0))
+        roll_up_usage(since=self.current_hour - timedelta(hours=5), settle=timedelta(0))
+
+        assert list(APIUsageHourly.objects.order_by('hour').values_list('requests', flat=True)) == [1, 1]
+
+    def test_totals_combine_rollups_and_newest_raw_rows(self):
+        self._usage(2)
+        self._usage(2, response_status='400', tokens_used=0)
+        roll_up_usage(settle=timedelta(0))
+        self._usage(0)
+        APIUsage.objects.filter(created_at__lt=self.current_hour).delete()
+
+        assert self._totals() == [('200', 2, 2), ('400', 1, 0)]
+
+    def test_totals_by_hour(self):
+        self._usage(1)
+        roll_up_usage(settle=timedelta(0))
+        self._usage(0)
+
+        rows = usage_totals(self.current_hour - timedelta(days=1), self.now + timedelta(minutes=1), group_by=['hour'])
+
+        assert sorted(row['hour'] for row in rows) == [self.current_hour - timedelta(hours=1), self.current_hour]
+
+    def test_prune_deletes_old_rows_in_batches(self):
+        for _ in range(3):
+            self._usage(24 * 3)
+        self._usage(1)
+        roll_up_usage(settle=timedelta(0))
+
+        assert prune_usage(days=2, batch_size=2) == 3
+        assert APIUsage.objects.count() == 1
+        assert self._totals() == [('200', 4, 4)]
+
+    def test_prune_keeps_rows_after_watermark(self):
+        self._usage(24 * 3)
+
+        assert prune_usage(days=1) == 0
+        assert APIUsage.objects.count() == 1
+
+    def test_imported_late_events_added_to_rollups(self):
+        self._usage(2)
+        roll_up_usage(settle=timedelta(0))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        sink = JSONLUsageSink(directory)
+        sink.record(UsageEvent(
+            api_key_id=self.api_key.pk,
+            ip_address='127.0.0.1',
+            user_agent='TestAgent/1.0',
+            tokens_used=1,
+            response_status='200',
+            created_at=self.current_hour - timedelta(hours=2),
+        ))
+        sink.close()
+
+        with override_settings(API_USAGE_LOGGING={'SINK': 'sync', 'JSONL_DIR': directory}):
+            call_command('import_api_usage', stdout=StringIO())
+
+        assert APIUsageHourly.objects.get().requests == 2
+
+    def test_late_buffered_events_added_to_rollups(self):
+        self._usage(2)
+        roll_up_usage(settle=timedelta(0))
+        sink = BufferedUsageSink(autostart=False)
+        sink.record(UsageEvent(
+            api_key_id=self.api_key.pk,
+            ip_address='127.0.0.1',
+            user_agent='TestAgent/1.0',
+            tokens_used=1,
+            response_status='200',
+            created_at=self.current_hour - timedelta(hours=2),
+        ))
+        sink.record(UsageEvent(
+            api_key_id=self.api_key.pk,
+            ip_address='127.0.0.1',
+            user_agent='TestAgent/1.0',
+            tokens_used=1,
+            response_status='200',
+            created_at=self.now,
+        ))
+
+        sink.flush()
+
+        assert APIUsageHourly.objects.get().requests == 2
+        assert self._totals() == [('200', 3, 3)]
+
+    def test_rollup_command(self):
+        self._usage(2)
+        out = StringIO()
+
+        call_command('rollup_api_usage', settle=0, stdout=out)
+
+        assert 'into 1 rows' in out.getvalue()
@@ -0,0 +1,158 @@
+import pytest
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import APIKey, APIUsage, User
+from users.usage import (
+    BufferedUsageSink,
+    JSONLUsageSink,
+    UsageEvent,
+    get_usage_sink,
+    rotated_usage_files,
+)
+
+
+@pytest.mark.django_db
+class UsageSinkTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User',
+            tokens_balance=10
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+
+    def _event(self, **kwargs):
+        fields = {
+            'api_key_id': self.api_key.pk,
+            'ip_address': '127.0.0.1',
+            'user_agent': 'TestAgent/1.0',
+            'tokens_used': 1,
+            'response_status': '200',
+            'created_at': timezone.now() - timedelta(minutes=5),
+        }
+        fields.update(kwargs)
+        return UsageEvent(**fields)
+
+
+class TestBufferedUsageSink(UsageSinkTestCase):
+
+    def test_events_written_on_flush(self):
+        sink = BufferedUsageSink(buffer_size=10, autostart=False)
+        event = self._event()
+
+        sink.record(event)
+        assert APIUsage.objects.count() == 0
+
+        sink.flush()
+        usage = APIUsage.objects.get()
+        assert usage.created_at == event.created_at
+        assert sink.stats()['written'] == 1
+
+    def test_full_queue_drops_and_counts(self):
+        sink = BufferedUsageSink(max_pending=2, autostart=False)
+
+        sink.record_many([self._event() for _ in range(3)])
+        sink.flush()
+
+        stats = sink.stats()
+        assert APIUsage.objects.count() == 2
+        assert stats['dropped'] == 1
+        assert stats['pending'] == 0
+
+    def test_failed_flush_keeps_events(self):
+        sink = BufferedUsageSink(autostart=False)
+        sink.record(self._event())
+
+        with patch('users.models.APIUsage.objects.bulk_create', side_effect=Exception('Database error')):
+            sink.flush()
+
+        stats = sink.stats()
+        assert stats['pending'] == 1
+        assert stats['failed_flushes'] == 1
+        assert stats['oldest_pending_seconds'] >= 300
+
+        sink.close()
+        assert APIUsage.objects.count() == 1
+
+
+class TestJSONLUsageSink(UsageSinkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_rotation_and_import(self):
+        sink = JSONLUsageSink(self.directory, max_bytes=1)
+
+        sink.record(self._event())
+        sink.record(self._event(tokens_used=0, response_status='400'))
+
+        assert sink.rotations == 2
+        assert len(rotated_usage_files(self.directory)) == 2
+        assert APIUsage.objects.count() == 0
+
+        with override_settings(API_USAGE_LOGGING={'SINK': 'sync', 'JSONL_DIR': self.directory}):
+            call_command('import_api_usage', stdout=StringIO())
+
+        assert sorted(APIUsage.objects.values_list('response_status', flat=True)) == ['200', '400']
+        assert rotated_usage_files(self.directory) == []
+
+    def test_file_left_after_its_import_is_not_imported_again(self):
+        sink = JSONLUsageSink(self.directory)
+        sink.record(self._event())
+        sink.close()
+        [path] = rotated_usage_files(self.directory)
+
+        # The import commits, then the process dies before deleting the file
+        with override_settings(API_USAGE_LOGGING={'SINK': 'sync', 'JSONL_DIR': self.directory}):
+            with patch.object(Path, 'unlink', side_effect=KeyboardInterrupt):
+                with pytest.raises(KeyboardInterrupt):
+                    call_command('import_api_usage', stdout=StringIO())
+            assert path.exists()
+            out = StringIO()
+            call_command('import_api_usage', stdout=out)
+
+        assert APIUsage.objects.count() == 1
+        assert 'already imported' in out.getvalue()
+        assert rotated_usage_files(self.directory) == []
+
+    def test_active_file_rotated_on_close(self):
+        sink = JSONLUsageSink(self.directory)
+        sink.record(self._event())
+        assert rotated_usage_files(self.directory) == []
+
+        sink.close()
+
+        assert len(rotated_usage_files(self.directory)) == 1
+        assert sink.stats()['written'] == 1
+
+
+class TestUsageLoggingSettings(UsageSinkTestCase):
+
+    @override_settings(API_USAGE_LOGGING={
+        'SINK': 'buffered', 'BUFFER_SIZE': 100, 'FLUSH_INTERVAL': 60, 'MAX_PENDING': 1000,
+    })
+    def test_view_usage_is_buffered(self):
+        client = APIClient()
+        client.credentials(HTTP_X_API_KEY=self.plain_key)
+
+        response = client.post(reverse('national_ids:extract-egyptian-id'), {
+            'national_id': '29001010123456'
+        })
+
+        assert response.status_code == 200
+        assert APIUsage.objects.count() == 0
+        get_usage_sink().flush()
+        assert APIUsage.objects.get().tokens_used == 1
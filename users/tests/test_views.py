@@ -0,0 +1,149 @@
+import pytest
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from users.models import APIKey, APIUsage, User
+from users.rollups import roll_up_usage
+
+
+@pytest.mark.django_db
+class UsageViewTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            first_name='Test',
+            last_name='User'
+        )
+        self.api_key, self.plain_key = APIKey.create_key(self.user, 'Test Key')
+        self.client.credentials(HTTP_X_API_KEY=self.plain_key)
+        self.now = timezone.now()
+
+    def _usage(self, created_at, api_key=None, response_status='200', tokens_used=1):
+        return APIUsage.objects.create(
+            api_key=api_key or self.api_key,
+            ip_address='127.0.0.1',
+            user_agent='TestAgent/1.0',
+            tokens_used=tokens_used,
+            response_status=response_status,
+            created_at=created_at,
+        )
+
+
+class TestUsageListAPIView(UsageViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('users:usage-list')
+
+    def test_pages_follow_cursor_without_gaps(self):
+        # Rows sharing a timestamp are ordered by id, so none is skipped between pages
+        same_time = self.now - timedelta(minutes=5)
+        created = [self._usage(same_time) for _ in range(3)] + [self._usage(self.now - timedelta(minutes=1))]
+
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(self.url, params).json()['data']
+            seen += [row['id'] for row in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        assert seen == [created[3].id, created[2].id, created[1].id, created[0].id]
+
+    def test_one_usage_query_per_page(self):
+        keys = [self.api_key] + [APIKey.create_key(self.user, f'Key {number}')[0] for number in range(3)]
+        created = [self._usage(self.now - timedelta(minutes=minutes), api_key=keys[minutes % 4]) for minutes in range(8)]
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(self.url, {'limit': 3}).json()['data']
+
+        assert [row['id'] for row in data['results']] == [row.id for row in created[:3]]
+        assert data['next_cursor'] is not None
+        usage_table = APIUsage._meta.db_table
+        assert len([query for query in queries if f'FROM "{usage_table}"' in query['sql']]) == 1
+
+    def test_only_callers_usage_listed(self):
+        other = User.objects.create_user(email='other@example.com', first_name='Other', last_name='User')
+        other_key, _ = APIKey.create_key(other, 'Other Key')
+        self._usage(self.now, api_key=other_key)
+        mine = self._usage(self.now)
+
+        data = self.client.get(self.url).json()['data']
+
+        assert [row['id'] for row in data['results']] == [mine.id]
+
+    def test_filters(self):
+        self._usage(self.now - timedelta(days=2))
+        recent_error = self._usage(self.now - timedelta(hours=1), response_status='400', tokens_used=0)
+        self._usage(self.now - timedelta(hours=1))
+
+        response = self.client.get(self.url, {
+            'start': (self.now - timedelta(days=1)).isoformat(),
+            'status': '400',
+        })
+
+        results = response.json()['data']['results']
+        assert [row['id'] for row in results] == [recent_error.id]
+        assert results[0]['tokens_used'] == 0
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()['errors'] == [{'field': 'cursor', 'message': 'Invalid cursor'}]
+
+    def test_limit_capped(self):
+        response = self.client.get(self.url, {'limit': 100000})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+
+        response = self.client.get(self.url)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestUsageSummaryAPIView(UsageViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('users:usage-summary')
+
+    def test_daily_totals_from_rollups_and_raw_rows(self):
+        yesterday = self.now - timedelta(days=1)
+        self._usage(yesterday)
+        self._usage(yesterday, response_status='400', tokens_used=0)
+        roll_up_usage(settle=timedelta(0))
+        self._usage(self.now)
+
+        data = self.client.get(self.url).json()['data']
+
+        assert data['days'][0] == {
+            'date': yesterday.date().isoformat(),
+            'requests': 2,
+            'tokens_used': 1,
+            'statuses': {'200': 1, '400': 1},
+        }
+        assert data['days'][-1]['date'] == self.now.date().isoformat()
+        assert data['total_requests'] == 3
+        assert data['total_tokens_used'] == 2
+
+    def test_range_limited(self):
+        response = self.client.get(self.url, {
+            'start': (self.now - timedelta(days=400)).isoformat(),
+        })
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
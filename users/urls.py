@@ -0,0 +1,10 @@
+from django.urls import path
+
+from .views import UsageListAPIView, UsageSummaryAPIView
+
+app_name = 'users'
+
+urlpatterns = [
+    path('usage/', UsageListAPIView.as_view(), name='usage-list'),
+    path('usage/summary/', UsageSummaryAPIView.as_view(), name='usage-summary'),
+]
@@ -0,0 +1,398 @@
+"""
+API usage recording pipeline.
+
+Views hand usage events to the sink chosen by API_USAGE_LOGGING['SINK']:
+
+- ``sync``: one INSERT per event, inside the request (the default)
+- ``buffered``: events are queued in memory and written with bulk_create by a
+  background thread, once BUFFER_SIZE events are pending or every FLUSH_INTERVAL seconds.
+  Events flushed into hours that are already rolled up are added to the rollups
+- ``jsonl``: events are appended to a local JSON lines file, rotated at MAX_BYTES and
+  loaded into APIUsage later with ``manage.py import_api_usage``
+
+Every sink counts what it recorded, wrote and dropped, so billing can reconcile the
+events a worker saw with the rows that reached the database. Queued events are
+flushed when the process exits gracefully.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.utils.metrics import USAGE_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class UsageEvent(NamedTuple):
+    api_key_id: Optional[int]
+    ip_address: str
+    user_agent: str
+    tokens_used: int
+    response_status: str
+    created_at: datetime
+
+    def to_model(self):
+        from users.models import APIUsage
+
+        return APIUsage(**self._asdict())
+
+    def to_json(self) -> str:
+        data = self._asdict()
+        data['created_at'] = self.created_at.isoformat()
+        return json.dumps(data, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, line: str) -> 'UsageEvent':
+        data = json.loads(line)
+        data['created_at'] = datetime.fromisoformat(data['created_at'])
+        return cls(**data)
+
+
+class SyncUsageSink:
+    """Write every event straight to the database."""
+    name = 'sync'
+
+    def __init__(self, batch_size: int = 1000):
+        self.batch_size = batch_size
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def record(self, event: UsageEvent) -> None:
+        from users.models import APIUsage
+
+        try:
+            with USAGE_WRITE_SECONDS.labels(self.name).time():
+                APIUsage.objects.create(**event._asdict())
+        except Exception:
+            self._count(recorded=1, dropped=1)
+            raise
+        self._count(recorded=1, written=1)
+
+    def record_many(self, events: List[UsageEvent]) -> None:
+        from users.models import APIUsage
+
+        try:
+            with USAGE_WRITE_SECONDS.labels(self.name).time():
+                APIUsage.objects.bulk_create([event.to_model() for event in events], batch_size=self.batch_size)
+        except Exception:
+            self._count(recorded=len(events), dropped=len(events))
+            raise
+        self._count(recorded=len(events), written=len(events))
+
+    async def arecord(self, event: UsageEvent) -> None:
+        from users.models import APIUsage
+
+        try:
+            with USAGE_WRITE_SECONDS.labels(self.name).time():
+                await APIUsage.objects.acreate(**event._asdict())
+        except Exception:
+            self._count(recorded=1, dropped=1)
+            raise
+        self._count(recorded=1, written=1)
+
+    async def arecord_many(self, events: List[UsageEvent]) -> None:
+        from users.models import APIUsage
+
+        try:
+            with USAGE_WRITE_SECONDS.labels(self.name).time():
+                await APIUsage.objects.abulk_create([event.to_model() for event in events], batch_size=self.batch_size)
+        except Exception:
+            self._count(recorded=len(events), dropped=len(events))
+            raise
+        self._count(recorded=len(events), written=len(events))
+
+    def _count(self, recorded: int = 0, written: int = 0, dropped: int = 0) -> None:
+        with self._lock:
+            self.recorded += recorded
+            self.written += written
+            self.dropped += dropped
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sink': self.name,
+            'recorded': self.recorded,
+            'written': self.written,
+            'dropped': self.dropped,
+            'pending': self.recorded - self.written - self.dropped,
+        }
+
+
+class BufferedUsageSink(SyncUsageSink):
+    """
+    Queue events in memory and write them with bulk_create from a background thread.
+    Events beyond `max_pending` are dropped and counted; a failed write keeps its
+    events queued for the next flush.
+    """
+    name = 'buffered'
+
+    def __init__(
+        self,
+        buffer_size: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 100_000,
+        batch_size: int = 1000,
+        autostart: bool = True,
+    ):
+        super().__init__(batch_size)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.autostart = autostart
+        self.failed_flushes = 0
+        self._queue: deque = deque()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, event: UsageEvent) -> None:
+        self.record_many([event])
+
+    async def arecord(self, event: UsageEvent) -> None:
+        self.record_many([event])
+
+    async def arecord_many(self, events: List[UsageEvent]) -> None:
+        # Only queues the events, so there is nothing to wait for
+        self.record_many(events)
+
+    def record_many(self, events: List[UsageEvent]) -> None:
+        with self._lock:
+            self.recorded += len(events)
+            room = max(0, self.max_pending - len(self._queue))
+            if room < len(events):
+                self.dropped += len(events) - room
+                logger.error(f"API usage queue full, dropped {len(events) - room} events")
+                events = events[:room]
+            self._queue.extend(events)
+            pending = len(self._queue)
+        if self.autostart and self._thread is None:
+            self._start()
+        if pending >= self.buffer_size:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        """Write every queued event, keeping them queued if the database refuses them."""
+        from users.models import APIUsage
+        from users.rollups import add_to_rollups
+
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._queue)
+                self._queue.clear()
+            if not events:
+                return
+            try:
+                with USAGE_WRITE_SECONDS.labels(self.name).time(), transaction.atomic():
+                    APIUsage.objects.bulk_create([event.to_model() for event in events], batch_size=self.batch_size)
+                    # Events held back past the settle delay (e.g. by failed flushes) belong
+                    # to hours that are already rolled up
+                    add_to_rollups(events)
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.error(f"Failed to flush {len(events)} API usage events: {e}")
+                with self._lock:
+                    self._queue.extendleft(reversed(events))
+                return
+            with self._lock:
+                self.written += len(events)
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = self._queue[0].created_at if self._queue else None
+        stats = super().stats()
+        stats['failed_flushes'] = self.failed_flushes
+        stats['oldest_pending_seconds'] = (timezone.now() - oldest).total_seconds() if oldest else 0.0
+        return stats
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='api-usage-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+class JSONLUsageSink(SyncUsageSink):
+    """
+    Append events to a per-process JSON lines file. The file is rotated once it
+    reaches `max_bytes` and when the process exits, and only rotated files are picked
+    up by the importer.
+    """
+    name = 'jsonl'
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024, prefix: str = 'api_usage'):
+        super().__init__()
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.rotations = 0
+        self._file = None
+        self._size = 0
+
+    @property
+    def active_path(self) -> Path:
+        return self.directory / f"{self.prefix}-{os.getpid()}.jsonl"
+
+    def record(self, event: UsageEvent) -> None:
+        self.record_many([event])
+
+    async def arecord(self, event: UsageEvent) -> None:
+        self.record_many([event])
+
+    async def arecord_many(self, events: List[UsageEvent]) -> None:
+        # A buffered append to a local file, done on the event loop like the buffered queue
+        self.record_many(events)
+
+    def record_many(self, events: List[UsageEvent]) -> None:
+        data = ''.join(f"{event.to_json()}\n" for event in events).encode()
+        with self._lock:
+            self.recorded += len(events)
+            try:
+                with USAGE_WRITE_SECONDS.labels(self.name).time():
+                    if self._file is None:
+                        self._open()
+                    self._file.write(data)
+                    self._file.flush()
+            except OSError as e:
+                self.dropped += len(events)
+                logger.error(f"Failed to append {len(events)} API usage events: {e}")
+                return
+            self.written += len(events)
+            self._size += len(data)
+            if self._size >= self.max_bytes:
+                self._rotate()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._rotate()
+
+    def _open(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.active_path, 'ab')
+        self._size = self._file.tell()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        stamp = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        self.active_path.rename(self.directory / f"{self.prefix}-{os.getpid()}-{stamp}.jsonl")
+        self.rotations += 1
+
+
+def rotated_usage_files(directory: str, prefix: str = 'api_usage') -> List[Path]:
+    """Closed JSONL files ready to be imported, oldest first."""
+    return sorted(Path(directory).glob(f"{prefix}-*-*.jsonl"))
+
+
+def read_usage_file(path: Path) -> Iterator[UsageEvent]:
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield UsageEvent.from_json(line)
+
+
+def build_usage_sink() -> SyncUsageSink:
+    config = settings.API_USAGE_LOGGING
+    sink = config['SINK']
+    if sink == 'sync':
+        return SyncUsageSink()
+    if sink == 'buffered':
+        return BufferedUsageSink(
+            buffer_size=config['BUFFER_SIZE'],
+            flush_interval=config['FLUSH_INTERVAL'],
+            max_pending=config['MAX_PENDING'],
+        )
+    if sink == 'jsonl':
+        return JSONLUsageSink(config['JSONL_DIR'], max_bytes=config['JSONL_MAX_BYTES'])
+    raise ValueError(f"Unknown API usage sink: {sink}")
+
+
+_usage_sink: Optional[SyncUsageSink] = None
+_usage_sink_pid: Optional[int] = None
+_usage_sink_lock = threading.Lock()
+_closed_sinks = set()
+
+
+def get_usage_sink() -> SyncUsageSink:
+    """Return this process's usage sink, a forked worker gets its own."""
+    global _usage_sink, _usage_sink_pid
+    sink = _usage_sink
+    if sink is None or _usage_sink_pid != os.getpid():
+        with _usage_sink_lock:
+            if _usage_sink is None or _usage_sink_pid != os.getpid():
+                _usage_sink = build_usage_sink()
+                _usage_sink_pid = os.getpid()
+                atexit.register(_close_sink, _usage_sink, _usage_sink_pid)
+            sink = _usage_sink
+    return sink
+
+
+def close_usage_sink() -> None:
+    """Flush and close this process's sink now, e.g. when a server worker exits."""
+    global _usage_sink
+    with _usage_sink_lock:
+        sink, pid = _usage_sink, _usage_sink_pid
+        _usage_sink = None
+    if sink is not None:
+        _close_sink(sink, pid)
+
+
+def _close_sink(sink: SyncUsageSink, pid: int) -> None:
+    if pid != os.getpid() or sink in _closed_sinks:
+        return
+    _closed_sinks.add(sink)
+    sink.close()
+    stats = sink.stats()
+    log = logger.error if stats['dropped'] or stats['pending'] else logger.info
+    log(f"API usage sink closed: {stats}")
+
+
+@receiver(setting_changed)
+def _reset_usage_sink(setting, **kwargs):
+    global _usage_sink
+    if setting == 'API_USAGE_LOGGING':
+        if _usage_sink is not None:
+            _usage_sink.close()
+        _usage_sink = None
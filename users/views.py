@@ -1,3 +1,100 @@
-from django.shortcuts import render
+from collections import defaultdict
 
-# Create your views here.
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.base.views import UnifiedResponseAPIView
+from users.models import APIKey, APIUsage
+from users.rollups import usage_totals
+from users.serializers import UsageQuerySerializer, UsageSummaryQuerySerializer, encode_cursor
+
+USAGE_FIELDS = ('id', 'api_key_id', 'created_at', 'response_status', 'tokens_used', 'ip_address', 'user_agent')
+
+
+class UsageListAPIView(UnifiedResponseAPIView):
+    """
+    The caller's API usage across all of their keys, newest first, with keyset
+    pagination on (created_at, id). Each page continues from the cursor of the
+    previous one instead of an OFFSET, so deep pages cost the same as the first.
+    """
+    success_message = 'Usage retrieved successfully'
+    error_message = 'Usage retrieval failed'
+
+    def get(self, request):
+        serializer = UsageQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer._error_formatter(serializer.errors), status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+
+        usage = APIUsage.objects.all()
+        if 'start' in params:
+            usage = usage.filter(created_at__gte=params['start'])
+        if 'end' in params:
+            usage = usage.filter(created_at__lt=params['end'])
+        if 'status' in params:
+            usage = usage.filter(response_status=params['status'])
+        if 'cursor' in params:
+            created_at, pk = params['cursor']
+            # The leading created_at <= bound is what lets the index seek straight to the page
+            usage = usage.filter(Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk)))
+
+        # One query per page: each key is read in (api_key, created_at, id) order and
+        # cut at limit + 1 rows by its row number, and only those are merged and sorted
+        limit = params['limit']
+        usage = usage.filter(
+            api_key_id__in=APIKey.objects.filter(user=request.user).values('id')
+        ).annotate(
+            key_row=Window(RowNumber(), partition_by=F('api_key_id'), order_by=(F('created_at').desc(), F('id').desc()))
+        ).filter(key_row__lte=limit + 1)
+        rows = list(usage.order_by('-created_at', '-id').values(*USAGE_FIELDS)[:limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+        return Response({'results': rows, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+
+class UsageSummaryAPIView(UnifiedResponseAPIView):
+    """Requests and tokens of the caller per UTC day, read from the hourly rollups."""
+    success_message = 'Usage summary retrieved successfully'
+    error_message = 'Usage summary retrieval failed'
+
+    def get(self, request):
+        serializer = UsageSummaryQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer._error_formatter(serializer.errors), status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+
+        api_key_ids = list(APIKey.objects.filter(user=request.user).values_list('id', flat=True))
+        rows = usage_totals(
+            params['start'], params['end'], api_key_ids=api_key_ids, group_by=['hour', 'response_status']
+        )
+
+        days = defaultdict(lambda: {'requests': 0, 'tokens_used': 0, 'statuses': defaultdict(int)})
+        for row in rows:
+            day = days[row['hour'].date()]
+            day['requests'] += row['requests']
+            day['tokens_used'] += row['tokens_used']
+            day['statuses'][row['response_status']] += row['requests']
+
+        return Response(
+            {
+                'start': params['start'],
+                'end': params['end'],
+                'days': [
+                    {
+                        'date': date,
+                        'requests': day['requests'],
+                        'tokens_used': day['tokens_used'],
+                        'statuses': dict(day['statuses']),
+                    }
+                    for date, day in sorted(days.items())
+                ],
+                'total_requests': sum(day['requests'] for day in days.values()),
+                'total_tokens_used': sum(day['tokens_used'] for day in days.values()),
+            },
+            status=status.HTTP_200_OK
+        )